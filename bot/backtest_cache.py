@@ -0,0 +1,225 @@
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import ConfigOverride
+from bot.logger import setup_logger
+
+logger = setup_logger('BacktestCache')
+
+# Config fields that never change a backtest result (deployment, UI, live-only settings)
+CACHE_IGNORED_PREFIXES = (
+    'TELEGRAM_', 'WEBHOOK_', 'FREE_TIER_', 'TICK_LOG_', 'AUTHORIZED_', 'SHADOW_', 'CHART_', 'WS_',
+    'DATABASE_', 'DRY_RUN', 'HEALTH_CHECK_', 'BACKTEST_CACHE_', 'STRATEGY_RULE_PROFILING',
+    'SIGNAL_COOLDOWN_', 'CLOCK_', 'REPLAY_'
+)
+
+# Modules whose code determines backtest results; editing any of them invalidates the cache
+CODE_VERSION_MODULES = ('backtester.py', 'indicators.py', 'strategy.py', 'signal_rules.py', 'position_engine.py')
+
+_code_version: Optional[str] = None
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+def code_version() -> str:
+    """Hash of the source files listed in CODE_VERSION_MODULES (computed once per process)"""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        bot_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in CODE_VERSION_MODULES:
+            with open(os.path.join(bot_dir, name), 'rb') as f:
+                digest.update(name.encode())
+                digest.update(f.read())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+def config_fingerprint(config) -> str:
+    """Hash of every Config value that can influence a backtest, overrides included"""
+    names = set()
+    base = config
+    while isinstance(base, ConfigOverride):
+        names.update(base.__dict__['_overrides'])
+        base = base.__dict__['_base']
+    names.update(name for name in dir(base) if name.isupper())
+    
+    values = {name: getattr(config, name) for name in sorted(names)
+              if not name.startswith(CACHE_IGNORED_PREFIXES)}
+    
+    rules_file = values.get('STRATEGY_RULES_FILE')
+    if rules_file and os.path.exists(rules_file):
+        with open(rules_file, 'rb') as f:
+            values['STRATEGY_RULES_FILE'] = hashlib.sha256(f.read()).hexdigest()
+    
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=_json_default).encode()).hexdigest()
+
+def fingerprint_arrays(arrays: Dict[str, np.ndarray], index=None) -> str:
+    """Hash of the candle columns (and DatetimeIndex, tz included) a backtest reads"""
+    digest = hashlib.blake2b(digest_size=20)
+    for key in ('open', 'high', 'low', 'close', 'volume'):
+        if key in arrays:
+            values = np.ascontiguousarray(arrays[key], dtype=np.float64)
+            digest.update(key.encode())
+            digest.update(memoryview(values).cast('B'))
+    if isinstance(index, pd.DatetimeIndex):
+        digest.update(str(index.tz).encode())
+        digest.update(memoryview(np.ascontiguousarray(index.as_unit('ns').asi8)).cast('B'))
+    return digest.hexdigest()
+
+def fingerprint_candles(df: pd.DataFrame) -> str:
+    return fingerprint_arrays({key: df[key].to_numpy() for key in df.columns if key in
+                               ('open', 'high', 'low', 'close', 'volume')}, df.index)
+
+def write_npz(path: str, arrays: Dict[str, np.ndarray], meta: Dict) -> int:
+    """Atomically write arrays plus a JSON metadata blob as one .npz, returning its size"""
+    buffer = io.BytesIO()
+    meta_bytes = np.frombuffer(json.dumps(meta, default=_json_default).encode(), dtype=np.uint8)
+    np.savez(buffer, __meta__=meta_bytes, **arrays)
+    
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    os.replace(tmp_path, path)
+    return buffer.getbuffer().nbytes
+
+def read_npz(path: str) -> Tuple[Dict[str, np.ndarray], Dict]:
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != '__meta__'}
+        meta = json.loads(data['__meta__'].tobytes().decode())
+    return arrays, meta
+
+class BacktestCache:
+    """Content-addressed store of backtest results on disk
+    
+    Entries are .npz files (numeric arrays + a JSON metadata blob) named by the hash of
+    their key parts, written atomically. Reads refresh an entry's mtime, so eviction
+    drops expired entries first and then the least recently used ones until the cache
+    fits in max_bytes.
+    """
+    
+    def __init__(self, directory: str, max_bytes: int, max_age_seconds: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._entries: Optional[Dict[str, Tuple[float, int]]] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @classmethod
+    def from_config(cls, config) -> Optional['BacktestCache']:
+        if not getattr(config, 'BACKTEST_CACHE_ENABLED', False):
+            return None
+        return cls(
+            config.BACKTEST_CACHE_DIR,
+            config.BACKTEST_CACHE_MAX_MB * 1024 * 1024,
+            config.BACKTEST_CACHE_MAX_AGE_HOURS * 3600
+        )
+    
+    @staticmethod
+    def make_key(*parts) -> str:
+        payload = json.dumps([code_version()] + list(parts), default=_json_default)
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.npz')
+    
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        if self._entries is None:
+            self._entries = {}
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith('.npz'):
+                        stat = entry.stat()
+                        self._entries[entry.path] = (stat.st_mtime, stat.st_size)
+        return self._entries
+    
+    def _remove(self, path: str):
+        self._scan().pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def get(self, key: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+        """(arrays, meta) stored under key, or None on a miss or expired entry"""
+        path = self._path(key)
+        try:
+            mtime = os.path.getmtime(path)
+            if time.time() - mtime > self.max_age_seconds:
+                self._remove(path)
+                self.misses += 1
+                return None
+            arrays, meta = read_npz(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+            entries = self._scan()
+            if path in entries:
+                entries[path] = (now, entries[path][1])
+        except OSError:
+            pass
+        self.hits += 1
+        return arrays, meta
+    
+    def put(self, key: str, arrays: Dict[str, np.ndarray], meta: Dict):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(key)
+            size = write_npz(path, arrays, meta)
+            self._scan()[path] = (time.time(), size)
+        except Exception as e:
+            logger.warning(f"Failed to write backtest cache entry: {e}")
+            return
+        self.evict()
+    
+    def evict(self):
+        """Remove expired entries, then least recently used ones above max_bytes"""
+        entries = self._scan()
+        now = time.time()
+        for path, (mtime, _) in list(entries.items()):
+            if now - mtime > self.max_age_seconds:
+                self._remove(path)
+                self.evictions += 1
+        
+        total = sum(size for _, size in entries.values())
+        if total <= self.max_bytes:
+            return
+        for path, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+    
+    def clear(self):
+        for path in list(self._scan()):
+            self._remove(path)
+    
+    def get_stats(self) -> Dict:
+        entries = self._scan()
+        return {
+            'entries': len(entries),
+            'size_bytes': sum(size for _, size in entries.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -1,3 +1,4 @@
+import math
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -6,12 +7,62 @@ import pytz
 from bot.logger import setup_logger
 from bot.indicators import IndicatorEngine
 from bot.strategy import TradingStrategy
+from bot.backtest_cache import BacktestCache, config_fingerprint, fingerprint_candles
+from bot import position_engine
 
 logger = setup_logger('Backtester')
 
+def _to_ns(times) -> np.ndarray:
+    """datetime-likes (naive = UTC) as int64 ns since epoch"""
+    index = pd.DatetimeIndex(times)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.as_unit('ns').asi8
+
+def _from_ns(ns: np.ndarray, tz: Optional[str]) -> pd.DatetimeIndex:
+    index = pd.DatetimeIndex(ns.view('datetime64[ns]'))
+    return index.tz_localize('UTC').tz_convert(tz) if tz else index
+
+def trades_to_arrays(trades: List['BacktestTrade']) -> Tuple[Dict[str, np.ndarray], Optional[str]]:
+    """Column arrays of a trade list plus the timezone of its timestamps"""
+    n = len(trades)
+    arrays = {'symbol': np.array([t.symbol for t in trades], dtype='U16'),
+              'signal_type': np.array([t.signal_type for t in trades], dtype='U4'),
+              'result': np.array([t.result or '' for t in trades], dtype='U7'),
+              'entry_time': _to_ns([t.entry_time for t in trades]),
+              'exit_time': _to_ns([t.exit_time for t in trades])}
+    for name in ('entry_price', 'stop_loss', 'take_profit', 'exit_price', 'profit_loss', 'duration',
+                 'lot_size', 'costs'):
+        arrays[name] = np.fromiter((np.nan if getattr(t, name) is None else getattr(t, name) for t in trades),
+                                   dtype=np.float64, count=n)
+    tz = getattr(trades[0].entry_time, 'tzinfo', None) if trades else None
+    return arrays, str(tz) if tz is not None else None
+
+def trades_from_arrays(arrays: Dict[str, np.ndarray], tz: Optional[str]) -> List['BacktestTrade']:
+    columns = {name: values.tolist() for name, values in arrays.items() if name not in ('entry_time', 'exit_time')}
+    entry_times = list(_from_ns(arrays['entry_time'], tz))
+    exit_times = list(_from_ns(arrays['exit_time'], tz))
+    trades = []
+    for i in range(len(entry_times)):
+        trade = BacktestTrade(columns['signal_type'][i], columns['entry_price'][i], entry_times[i],
+                              columns['stop_loss'][i], columns['take_profit'][i],
+                              columns['symbol'][i], columns['lot_size'][i])
+        exit_price = columns['exit_price'][i]
+        duration = columns['duration'][i]
+        trade.exit_price = None if math.isnan(exit_price) else exit_price
+        trade.exit_time = None if exit_times[i] is pd.NaT else exit_times[i]
+        trade.profit_loss = columns['profit_loss'][i]
+        trade.costs = columns['costs'][i]
+        trade.result = columns['result'][i] or None
+        trade.duration = None if math.isnan(duration) else duration
+        trades.append(trade)
+    return trades
+
 class BacktestTrade:
     def __init__(self, signal_type: str, entry_price: float, entry_time: datetime,
-                 stop_loss: float, take_profit: float):
+                 stop_loss: float, take_profit: float, symbol: str = 'XAUUSD', lot_size: float = 0.01):
+        self.symbol = symbol
+        self.lot_size = lot_size
         self.signal_type = signal_type
         self.entry_price = entry_price
         self.entry_time = entry_time
@@ -22,8 +73,10 @@ class BacktestTrade:
         self.profit_loss = 0.0
         self.result = None
         self.duration = None
+        self.costs = 0.0
     
-    def close_trade(self, exit_price: float, exit_time: datetime, pip_value: float = 10.0):
+    def close_trade(self, exit_price: float, exit_time: datetime, pip_value: float = 10.0, costs: float = 0.0):
+        """Close at exit_price; costs (spread, commission, swap in $) are deducted from the P/L"""
         self.exit_price = exit_price
         self.exit_time = exit_time
         self.duration = (exit_time - self.entry_time).total_seconds() / 60
@@ -34,7 +87,8 @@ class BacktestTrade:
             price_diff = self.entry_price - exit_price
         
         pips = price_diff * pip_value
-        self.profit_loss = pips * 0.01
+        self.costs = costs
+        self.profit_loss = pips * self.lot_size - costs
         
         if exit_price >= self.take_profit and self.signal_type == 'BUY':
             self.result = 'WIN'
@@ -49,6 +103,7 @@ class BacktestTrade:
     
     def to_dict(self) -> Dict:
         return {
+            'symbol': self.symbol,
             'signal_type': self.signal_type,
             'entry_price': self.entry_price,
             'entry_time': self.entry_time.isoformat() if self.entry_time else None,
@@ -58,7 +113,9 @@ class BacktestTrade:
             'exit_time': self.exit_time.isoformat() if self.exit_time else None,
             'profit_loss': self.profit_loss,
             'result': self.result,
-            'duration': self.duration
+            'duration': self.duration,
+            'lot_size': self.lot_size,
+            'costs': self.costs
         }
 
 class BacktestResult:
@@ -81,98 +138,152 @@ class BacktestResult:
         self.avg_loss = 0.0
         self.avg_trade_duration = 0.0
         self.sharpe_ratio = 0.0
+        self.sortino_ratio = 0.0
+        self.calmar_ratio = 0.0
+        self.expectancy = 0.0
+        self.time_under_water_pct = 0.0
+        self.max_time_under_water = 0.0
     
     def calculate_metrics(self):
         if not self.trades:
             return
         
-        self.total_trades = len(self.trades)
+        n = len(self.trades)
+        profit_loss = np.fromiter((t.profit_loss for t in self.trades), dtype=np.float64, count=n)
+        results = np.array([t.result or '' for t in self.trades])
+        durations = np.fromiter((t.duration or 0.0 for t in self.trades), dtype=np.float64, count=n)
+        entry_times = _to_ns([t.entry_time for t in self.trades])
+        exit_times = _to_ns([t.exit_time if t.exit_time is not None else t.entry_time for t in self.trades])
+        self.calculate_metrics_from_arrays(profit_loss, results, durations, entry_times, exit_times)
+    
+    def calculate_metrics_from_arrays(self, profit_loss: np.ndarray, results: np.ndarray,
+                                      durations: Optional[np.ndarray] = None,
+                                      entry_times: Optional[np.ndarray] = None,
+                                      exit_times: Optional[np.ndarray] = None):
+        """All metrics from per-trade arrays in trade order
+        
+        results holds 'WIN'/'LOSS'/other strings, durations are minutes and the times
+        are int64 ns since epoch. Every metric is a vectorized NumPy pass, so this also
+        serves callers that never build BacktestTrade objects.
+        """
+        profit_loss = np.asarray(profit_loss, dtype=np.float64)
+        results = np.asarray(results)
+        self.total_trades = len(profit_loss)
+        if self.total_trades == 0:
+            return
         
-        wins = [t for t in self.trades if t.result == 'WIN']
-        losses = [t for t in self.trades if t.result == 'LOSS']
+        is_win = results == 'WIN'
+        is_loss = results == 'LOSS'
         
-        self.winning_trades = len(wins)
-        self.losing_trades = len(losses)
-        self.win_rate = (self.winning_trades / self.total_trades * 100) if self.total_trades > 0 else 0
+        self.winning_trades = int(is_win.sum())
+        self.losing_trades = int(is_loss.sum())
+        self.win_rate = self.winning_trades / self.total_trades * 100
         
-        self.total_profit = sum([t.profit_loss for t in wins])
-        self.total_loss = abs(sum([t.profit_loss for t in losses]))
+        self.total_profit = float(profit_loss[is_win].sum())
+        self.total_loss = float(abs(profit_loss[is_loss].sum()))
         self.net_profit = self.total_profit - self.total_loss
         
         self.profit_factor = (self.total_profit / self.total_loss) if self.total_loss > 0 else 0
         
         self.avg_win = (self.total_profit / self.winning_trades) if self.winning_trades > 0 else 0
         self.avg_loss = (self.total_loss / self.losing_trades) if self.losing_trades > 0 else 0
+        self.expectancy = self.net_profit / self.total_trades
         
-        durations = [t.duration for t in self.trades if t.duration]
-        self.avg_trade_duration = np.mean(durations) if durations else 0
+        if durations is not None:
+            durations = np.asarray(durations, dtype=np.float64)
+            durations = durations[(durations != 0) & ~np.isnan(durations)]
+            self.avg_trade_duration = float(durations.mean()) if len(durations) else 0
         
-        self._calculate_drawdown()
-        self._calculate_consecutive_streaks()
-        self._calculate_sharpe_ratio()
+        self._calculate_drawdown(profit_loss, entry_times, exit_times)
+        self._calculate_consecutive_streaks(is_win, is_loss)
+        self._calculate_sharpe_ratio(profit_loss)
+        self._calculate_calmar_ratio(entry_times, exit_times)
         
         self.final_balance = self.initial_balance + self.net_profit
     
-    def _calculate_drawdown(self):
-        if not self.trades:
+    def _calculate_drawdown(self, profit_loss: np.ndarray, entry_times: Optional[np.ndarray] = None,
+                            exit_times: Optional[np.ndarray] = None):
+        """Max drawdown (% of peak) and time under water, from the running balance peak"""
+        balance = np.cumsum(np.concatenate(([self.initial_balance], profit_loss)))
+        peak = np.maximum.accumulate(balance)[1:]
+        balance = balance[1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(peak > 0, (peak - balance) / peak * 100, 0.0)
+        self.max_drawdown = max(0.0, float(drawdown.max()))
+        
+        under_water = balance < peak
+        self.time_under_water_pct = float(under_water.mean() * 100)
+        self.max_time_under_water = 0.0
+        if not under_water.any() or entry_times is None or exit_times is None:
             return
         
-        balance = self.initial_balance
-        peak = balance
-        max_dd = 0
-        
-        for trade in self.trades:
-            balance += trade.profit_loss
-            
-            if balance > peak:
-                peak = balance
-            
-            drawdown = ((peak - balance) / peak * 100) if peak > 0 else 0
-            
-            if drawdown > max_dd:
-                max_dd = drawdown
-        
-        self.max_drawdown = max_dd
+        # Each stretch runs from the exit of the last peak trade (or the first entry)
+        # to the exit of the trade that recovers it (or the last trade)
+        n = len(balance)
+        idx = np.arange(n)
+        last_peak = np.maximum.accumulate(np.where(under_water, -1, idx))
+        peak_time = np.where(last_peak >= 0, exit_times[np.maximum(last_peak, 0)], entry_times[0])
+        next_recovery = np.minimum.accumulate(np.where(under_water, n, idx)[::-1])[::-1]
+        end_time = exit_times[np.minimum(next_recovery, n - 1)]
+        stretch = (end_time - peak_time)[under_water]
+        self.max_time_under_water = float(stretch.max()) / 60e9
     
-    def _calculate_consecutive_streaks(self):
-        if not self.trades:
+    def _calculate_consecutive_streaks(self, is_win: np.ndarray, is_loss: np.ndarray):
+        """Longest WIN/LOSS runs by run-length encoding; other results do not break a streak"""
+        outcome = is_win.view(np.int8) - is_loss.view(np.int8)
+        outcome = outcome[outcome != 0]
+        self.max_consecutive_wins = 0
+        self.max_consecutive_losses = 0
+        if len(outcome) == 0:
             return
         
-        max_wins = 0
-        max_losses = 0
-        current_wins = 0
-        current_losses = 0
-        
-        for trade in self.trades:
-            if trade.result == 'WIN':
-                current_wins += 1
-                current_losses = 0
-                max_wins = max(max_wins, current_wins)
-            elif trade.result == 'LOSS':
-                current_losses += 1
-                current_wins = 0
-                max_losses = max(max_losses, current_losses)
-        
-        self.max_consecutive_wins = max_wins
-        self.max_consecutive_losses = max_losses
+        run_starts = np.flatnonzero(np.concatenate(([True], outcome[1:] != outcome[:-1])))
+        run_lengths = np.diff(np.concatenate((run_starts, [len(outcome)])))
+        run_values = outcome[run_starts]
+        if (run_values == 1).any():
+            self.max_consecutive_wins = int(run_lengths[run_values == 1].max())
+        if (run_values == -1).any():
+            self.max_consecutive_losses = int(run_lengths[run_values == -1].max())
     
-    def _calculate_sharpe_ratio(self):
-        if not self.trades:
-            return
-        
-        returns = [t.profit_loss / self.initial_balance for t in self.trades]
+    def _calculate_sharpe_ratio(self, profit_loss: np.ndarray):
+        returns = profit_loss / self.initial_balance
         
         if len(returns) < 2:
             self.sharpe_ratio = 0
+            self.sortino_ratio = 0
             return
         
-        avg_return = np.mean(returns)
-        std_return = np.std(returns)
+        avg_return = returns.mean()
+        std_return = returns.std()
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
         
-        if std_return > 0:
-            self.sharpe_ratio = (avg_return / std_return) * np.sqrt(252)
-        else:
-            self.sharpe_ratio = 0
+        self.sharpe_ratio = float((avg_return / std_return) * np.sqrt(252)) if std_return > 0 else 0
+        self.sortino_ratio = float((avg_return / downside) * np.sqrt(252)) if downside > 0 else 0
+    
+    def _calculate_calmar_ratio(self, entry_times: Optional[np.ndarray], exit_times: Optional[np.ndarray]):
+        """Annualized return (%) over max drawdown (%)"""
+        self.calmar_ratio = 0
+        if entry_times is None or exit_times is None or self.max_drawdown <= 0:
+            return
+        
+        years = (exit_times.max() - entry_times.min()) / (365.25 * 86400e9)
+        if years <= 0:
+            return
+        annual_return = self.net_profit / self.initial_balance * 100 / years
+        self.calmar_ratio = float(annual_return / self.max_drawdown)
+    
+    def to_payload(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Compact (trade arrays, metadata) form, see BacktestCache"""
+        arrays, tz = trades_to_arrays(self.trades)
+        return arrays, {'metrics': self.to_dict(), 'tz': tz}
+    
+    @classmethod
+    def from_payload(cls, arrays: Dict[str, np.ndarray], meta: Dict) -> 'BacktestResult':
+        result = cls()
+        for name, value in meta['metrics'].items():
+            setattr(result, name, value)
+        result.trades = trades_from_arrays(arrays, meta.get('tz'))
+        return result
     
     def to_dict(self) -> Dict:
         return {
@@ -192,105 +303,220 @@ class BacktestResult:
             'avg_win': self.avg_win,
             'avg_loss': self.avg_loss,
             'avg_trade_duration': self.avg_trade_duration,
-            'sharpe_ratio': self.sharpe_ratio
+            'sharpe_ratio': self.sharpe_ratio,
+            'sortino_ratio': self.sortino_ratio,
+            'calmar_ratio': self.calmar_ratio,
+            'expectancy': self.expectancy,
+            'time_under_water_pct': self.time_under_water_pct,
+            'max_time_under_water': self.max_time_under_water
         }
 
+def _find_exit(is_buy: bool, stop_loss: float, take_profit: float, high: np.ndarray, low: np.ndarray,
+               start: int, n: int) -> Tuple[int, Optional[float]]:
+    """First bar >= start whose range touches SL or TP (SL wins on the same bar)
+    
+    Scans in growing chunks so short trades stay cheap. Returns (-1, None) if the
+    trade is still open at the last bar.
+    """
+    chunk = 64
+    while start < n:
+        end = min(n, start + chunk)
+        if is_buy:
+            sl_hit = low[start:end] <= stop_loss
+            tp_hit = high[start:end] >= take_profit
+        else:
+            sl_hit = high[start:end] >= stop_loss
+            tp_hit = low[start:end] <= take_profit
+        hits = np.flatnonzero(sl_hit | tp_hit)
+        if len(hits):
+            j = hits[0]
+            return start + int(j), (stop_loss if sl_hit[j] else take_profit)
+        start = end
+        chunk *= 4
+    return -1, None
+
+def _find_event(low_level: float, high_level: float, high: np.ndarray, low: np.ndarray,
+                start: int, n: int) -> int:
+    """First bar >= start whose range reaches low_level or high_level, or -1"""
+    chunk = 64
+    while start < n:
+        end = min(n, start + chunk)
+        hits = np.flatnonzero((low[start:end] <= low_level) | (high[start:end] >= high_level))
+        if len(hits):
+            return start + int(hits[0])
+        start = end
+        chunk *= 4
+    return -1
+
+def _managed_walk(rules: position_engine.PositionRules, is_buy: bool, entry_price: float, original_sl: float,
+                  stop_loss: float, take_profit: float, max_profit: float, high: np.ndarray, low: np.ndarray,
+                  close: np.ndarray, start: int, n: int) -> Tuple[int, Optional[float], int, float, float]:
+    """Walk a trade through position_engine (dynamic SL, trailing stop, SL/TP)
+    
+    Bars whose range stays inside position_engine.event_levels are skipped with a
+    vectorized scan. On the remaining bars the engine is stepped along the path
+    adverse extreme -> favourable extreme -> close, which keeps the SL-before-TP
+    convention; fills happen at the SL/TP level like the unmanaged loop.
+    Returns (bar, exit_price, exit_code, stop_loss, max_profit), or (-1, None, HOLD, ...)
+    with the state to resume from if the trade is still open at bar n - 1.
+    """
+    i = start
+    while i < n:
+        low_level, high_level = position_engine.event_levels(
+            rules, is_buy, entry_price, original_sl, stop_loss, take_profit, max_profit
+        )
+        i = _find_event(low_level, high_level, high, low, i, n)
+        if i < 0:
+            break
+        path = (low[i], high[i], close[i]) if is_buy else (high[i], low[i], close[i])
+        for price in path:
+            stop_loss, max_profit, _, code, _ = position_engine.step(
+                rules, is_buy, entry_price, original_sl, stop_loss, take_profit, max_profit, float(price)
+            )
+            if code == position_engine.TP_HIT:
+                return i, take_profit, code, stop_loss, max_profit
+            if code != position_engine.HOLD:
+                return i, stop_loss, code, stop_loss, max_profit
+        i += 1
+    return -1, None, position_engine.HOLD, stop_loss, max_profit
+
+def _managed_exit(rules: position_engine.PositionRules, is_buy: bool, entry_price: float, stop_loss: float,
+                  take_profit: float, high: np.ndarray, low: np.ndarray, close: np.ndarray,
+                  start: int, n: int) -> Tuple[int, Optional[float], int]:
+    """_managed_walk for a freshly opened trade, returning (bar, exit_price, exit_code)"""
+    bar, exit_price, code, _, _ = _managed_walk(rules, is_buy, entry_price, stop_loss, stop_loss, take_profit,
+                                                0.0, high, low, close, start, n)
+    return bar, exit_price, code
+
 class Backtester:
-    def __init__(self, config):
+    def __init__(self, config, cache: Optional[BacktestCache] = None):
         self.config = config
         self.indicator_engine = IndicatorEngine(config)
         self.strategy = TradingStrategy(config)
+        self.cache = cache if cache is not None else BacktestCache.from_config(config)
         logger.info("Backtester initialized")
     
     def run_backtest(self, df: pd.DataFrame, initial_balance: float = 10000.0) -> BacktestResult:
+        """Event-driven backtest: indicator series are computed once, then bars are walked as arrays
+        
+        Produces the same trades as re-running get_indicators on every df.iloc[:i+1] slice
+        (all indicators are causal), in linear instead of quadratic time.
+        """
         logger.info(f"Starting backtest with {len(df)} candles")
         
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key('run_backtest', fingerprint_candles(df),
+                                            config_fingerprint(self.config), initial_balance)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                result = BacktestResult.from_payload(*cached)
+                logger.info(f"Backtest served from cache: {result.total_trades} trades")
+                return result
+        
+        arrays = self.indicator_engine.get_indicator_arrays(df)
+        timestamps = df.index if isinstance(df.index, pd.DatetimeIndex) else None
+        result = self.run_backtest_arrays(arrays, timestamps, initial_balance)
+        
+        if cache_key is not None:
+            self.cache.put(cache_key, *result.to_payload())
+        
+        logger.info(f"Backtest completed: {result.total_trades} trades, Win Rate: {result.win_rate:.1f}%")
+        
+        return result
+    
+    def first_tradable_index(self, strategy: Optional[TradingStrategy] = None) -> int:
+        strategy = strategy or self.strategy
+        return max(50, IndicatorEngine(strategy.config).min_required_candles() - 1)
+    
+    def run_backtest_arrays(self, arrays: Dict[str, np.ndarray], timestamps: Optional[pd.DatetimeIndex] = None,
+                            initial_balance: float = 10000.0,
+                            strategy: Optional[TradingStrategy] = None,
+                            start_index: Optional[int] = None,
+                            manage_positions: Optional[bool] = None) -> BacktestResult:
+        """Backtest over precomputed indicator arrays (see IndicatorEngine.get_indicator_arrays)
+        
+        Signals for every candle come from one detect_signals_vectorized call, so the
+        same arrays can be reused across parameter sets by passing a different strategy.
+        start_index overrides the indicator warm-up skip (e.g. for already warm windows).
+        manage_positions applies the live dynamic SL / trailing stop rules
+        (default: BACKTEST_POSITION_MANAGEMENT).
+        """
+        strategy = strategy or self.strategy
+        if manage_positions is None:
+            manage_positions = strategy.config.BACKTEST_POSITION_MANAGEMENT
+        rules = position_engine.PositionRules(strategy.config) if manage_positions else None
+        
         result = BacktestResult()
         result.initial_balance = initial_balance
         
-        open_trades: List[BacktestTrade] = []
-        
-        for i in range(50, len(df)):
-            df_slice = df.iloc[:i+1]
-            current_candle = df.iloc[i]
-            
-            indicators = self.indicator_engine.get_indicators(df_slice)
-            
-            if not indicators:
-                continue
+        close = arrays['close']
+        high = arrays['high']
+        low = arrays['low']
+        n = len(close)
+        
+        signals = strategy.detect_signals_vectorized(arrays, 'auto')
+        direction = signals['direction']
+        stop_losses = signals['stop_loss']
+        take_profits = signals['take_profit']
+        
+        start = self.first_tradable_index(strategy) if start_index is None else start_index
+        pip_value = self.config.XAUUSD_PIP_VALUE
+        
+        def bar_time(i):
+            return timestamps[i] if timestamps is not None else datetime.now()
+        
+        signal_bars = np.flatnonzero(direction[start:] != 0) + start
+        
+        # Open trades live in compact arrays; BacktestTrade objects are built once at the end
+        max_trades = len(signal_bars)
+        entry_idx = np.empty(max_trades, dtype=np.int64)
+        exit_idx = np.empty(max_trades, dtype=np.int64)
+        exit_prices = np.empty(max_trades, dtype=np.float64)
+        exit_codes = np.zeros(max_trades, dtype=np.int8)
+        n_trades = 0
+        
+        i = start
+        while True:
+            k = np.searchsorted(signal_bars, i)
+            if k >= max_trades:
+                break
+            entry = signal_bars[k]
+            is_buy = direction[entry] > 0
+            code = position_engine.HOLD
+            if rules is not None:
+                j, exit_price, code = _managed_exit(rules, is_buy, float(close[entry]), float(stop_losses[entry]),
+                                                    float(take_profits[entry]), high, low, close, entry, n)
+            else:
+                j, exit_price = _find_exit(is_buy, stop_losses[entry], take_profits[entry], high, low, entry, n)
+            if j < 0:
+                j, exit_price = n - 1, close[n - 1]
             
-            signal = self.strategy.detect_signal(indicators, 'M1')
-            
-            if signal and len(open_trades) == 0:
-                trade = BacktestTrade(
-                    signal_type=signal['signal'],
-                    entry_price=signal['entry_price'],
-                    entry_time=current_candle.name if isinstance(current_candle.name, datetime) else datetime.now(),
-                    stop_loss=signal['stop_loss'],
-                    take_profit=signal['take_profit']
-                )
-                open_trades.append(trade)
-                logger.debug(f"Opened {trade.signal_type} trade at {trade.entry_price}")
-            
-            for trade in open_trades[:]:
-                high = current_candle['high']
-                low = current_candle['low']
-                close = current_candle['close']
-                
-                if trade.signal_type == 'BUY':
-                    if low <= trade.stop_loss:
-                        trade.close_trade(
-                            trade.stop_loss,
-                            current_candle.name if isinstance(current_candle.name, datetime) else datetime.now(),
-                            self.config.XAUUSD_PIP_VALUE
-                        )
-                        result.trades.append(trade)
-                        open_trades.remove(trade)
-                        logger.debug(f"Closed BUY trade (SL hit) - P/L: {trade.profit_loss}")
-                    
-                    elif high >= trade.take_profit:
-                        trade.close_trade(
-                            trade.take_profit,
-                            current_candle.name if isinstance(current_candle.name, datetime) else datetime.now(),
-                            self.config.XAUUSD_PIP_VALUE
-                        )
-                        result.trades.append(trade)
-                        open_trades.remove(trade)
-                        logger.debug(f"Closed BUY trade (TP hit) - P/L: {trade.profit_loss}")
-                
-                else:
-                    if high >= trade.stop_loss:
-                        trade.close_trade(
-                            trade.stop_loss,
-                            current_candle.name if isinstance(current_candle.name, datetime) else datetime.now(),
-                            self.config.XAUUSD_PIP_VALUE
-                        )
-                        result.trades.append(trade)
-                        open_trades.remove(trade)
-                        logger.debug(f"Closed SELL trade (SL hit) - P/L: {trade.profit_loss}")
-                    
-                    elif low <= trade.take_profit:
-                        trade.close_trade(
-                            trade.take_profit,
-                            current_candle.name if isinstance(current_candle.name, datetime) else datetime.now(),
-                            self.config.XAUUSD_PIP_VALUE
-                        )
-                        result.trades.append(trade)
-                        open_trades.remove(trade)
-                        logger.debug(f"Closed SELL trade (TP hit) - P/L: {trade.profit_loss}")
-        
-        for trade in open_trades:
-            last_candle = df.iloc[-1]
-            trade.close_trade(
-                last_candle['close'],
-                last_candle.name if isinstance(last_candle.name, datetime) else datetime.now(),
-                self.config.XAUUSD_PIP_VALUE
+            entry_idx[n_trades] = entry
+            exit_idx[n_trades] = j
+            exit_prices[n_trades] = exit_price
+            exit_codes[n_trades] = code
+            n_trades += 1
+            i = j + 1
+        
+        for t in range(n_trades):
+            e = entry_idx[t]
+            trade = BacktestTrade(
+                signal_type='BUY' if direction[e] > 0 else 'SELL',
+                entry_price=float(close[e]),
+                entry_time=bar_time(e),
+                stop_loss=float(stop_losses[e]),
+                take_profit=float(take_profits[e])
             )
+            trade.close_trade(float(exit_prices[t]), bar_time(exit_idx[t]), pip_value)
+            if trade.result == 'UNKNOWN' and exit_codes[t] != position_engine.HOLD:
+                # Exit on a moved SL lands between the original levels: classify by P/L like the live tracker
+                trade.result = 'WIN' if trade.profit_loss > 0 else 'LOSS'
             result.trades.append(trade)
         
         result.calculate_metrics()
         
-        logger.info(f"Backtest completed: {result.total_trades} trades, Win Rate: {result.win_rate:.1f}%")
+        logger.debug(f"Array backtest completed: {result.total_trades} trades, Win Rate: {result.win_rate:.1f}%")
         
         return result
     
@@ -318,6 +544,10 @@ class Backtester:
         report += f"*Risk Metrics:*\n"
         report += f"Max Drawdown: {result.max_drawdown:.2f}%\n"
         report += f"Sharpe Ratio: {result.sharpe_ratio:.2f}\n"
+        report += f"Sortino Ratio: {result.sortino_ratio:.2f}\n"
+        report += f"Calmar Ratio: {result.calmar_ratio:.2f}\n"
+        report += f"Expectancy: ${result.expectancy:.2f}/trade\n"
+        report += f"Time Under Water: {result.time_under_water_pct:.1f}% (max {result.max_time_under_water:.0f} min)\n"
         report += f"Max Consecutive Wins: {result.max_consecutive_wins}\n"
         report += f"Max Consecutive Losses: {result.max_consecutive_losses}\n"
         report += f"Avg Trade Duration: {result.avg_trade_duration:.1f} min\n"
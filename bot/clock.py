@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+from abc import ABC, abstractmethod
+import itertools
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+import pytz
+from bot.logger import setup_logger
+
+logger = setup_logger('Clock')
+
+CLOCK_MODES = ('real', 'accelerated', 'virtual')
+
+class Clock(ABC):
+    """Time source shared by the live components (risk cooldowns, scheduler, tracker, feed)
+    
+    now() always returns an aware datetime (UTC unless tz is given); utcnow() is the
+    naive-UTC form used where the code historically called datetime.utcnow().
+    """
+    
+    @abstractmethod
+    def now(self, tz=None) -> datetime:
+        ...
+    
+    def utcnow(self) -> datetime:
+        return self.now(pytz.UTC).replace(tzinfo=None)
+    
+    def time(self) -> float:
+        return self.now(pytz.UTC).timestamp()
+    
+    @abstractmethod
+    async def sleep(self, seconds: float):
+        ...
+
+class RealClock(Clock):
+    def now(self, tz=None) -> datetime:
+        return datetime.now(tz or pytz.UTC)
+    
+    def time(self) -> float:
+        return time.time()
+    
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+class AcceleratedClock(Clock):
+    """Wall-clock time running `speed` times faster from `start` (default: now)"""
+    
+    def __init__(self, speed: float, start: Optional[datetime] = None):
+        if speed <= 0:
+            raise ValueError("Clock speed must be positive")
+        self.speed = speed
+        self.start = start or datetime.now(pytz.UTC)
+        self._started = time.monotonic()
+    
+    def now(self, tz=None) -> datetime:
+        elapsed = (time.monotonic() - self._started) * self.speed
+        return (self.start + timedelta(seconds=elapsed)).astimezone(tz or pytz.UTC)
+    
+    async def sleep(self, seconds: float):
+        await asyncio.sleep(max(0.0, seconds) / self.speed)
+
+class VirtualClock(Clock):
+    """Time that only moves when set_time()/advance() is called (e.g. by a tick replay)
+    
+    sleep() parks the caller until virtual time reaches its deadline, so scheduler
+    intervals, cooldowns and retry delays all follow the replayed data instead of the
+    wall clock. Time never moves backwards.
+    """
+    
+    def __init__(self, start: Optional[datetime] = None):
+        start = start or datetime.now(pytz.UTC)
+        self._now = start if start.tzinfo else pytz.UTC.localize(start)
+        self._sleepers: List[Tuple[datetime, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+    
+    def now(self, tz=None) -> datetime:
+        return self._now.astimezone(tz or pytz.UTC)
+    
+    async def sleep(self, seconds: float):
+        if seconds <= 0:
+            await asyncio.sleep(0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self._now + timedelta(seconds=seconds), next(self._sequence), future))
+        await future
+    
+    def set_time(self, when: datetime):
+        if when.tzinfo is None:
+            when = pytz.UTC.localize(when)
+        if when > self._now:
+            self._now = when
+        while self._sleepers and self._sleepers[0][0] <= self._now:
+            _, _, future = heapq.heappop(self._sleepers)
+            if not future.done():
+                future.set_result(None)
+    
+    def advance(self, seconds: float):
+        self.set_time(self._now + timedelta(seconds=seconds))
+    
+    @property
+    def pending_sleepers(self) -> int:
+        return sum(1 for _, _, future in self._sleepers if not future.done())
+
+def create_clock(config, start: Optional[datetime] = None) -> Clock:
+    """Clock for CLOCK_MODE (real / accelerated at CLOCK_SPEED / virtual)
+    
+    start is where accelerated and virtual time begin, e.g. the first replayed tick.
+    """
+    mode = getattr(config, 'CLOCK_MODE', 'real')
+    if mode == 'accelerated':
+        logger.info(f"Using accelerated clock ({config.CLOCK_SPEED}x)")
+        return AcceleratedClock(config.CLOCK_SPEED, start)
+    if mode == 'virtual':
+        logger.info("Using virtual clock (driven by replayed ticks)")
+        return VirtualClock(start)
+    if mode not in CLOCK_MODES:
+        logger.warning(f"Unknown CLOCK_MODE '{mode}', using real clock")
+    return RealClock()
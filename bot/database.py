@@ -35,6 +35,7 @@ class SignalLog(Base):
     ticker = Column(String(20), nullable=False)
     signal_type = Column(String(10), nullable=False)
     signal_source = Column(String(10), default='auto')
+    strategy_name = Column(String(50))
     entry_price = Column(Float, nullable=False)
     indicators = Column(Text)
     timestamp = Column(DateTime, default=datetime.utcnow)
@@ -54,7 +55,7 @@ class Position(Base):
     take_profit = Column(Float, nullable=False)
     current_price = Column(Float)
     unrealized_pl = Column(Float)
-    status = Column(String(20), default='ACTIVE')
+    status = Column(String(20), default='ACTIVE', index=True)
     opened_at = Column(DateTime, default=datetime.utcnow)
     closed_at = Column(DateTime)
     original_sl = Column(Float)
@@ -62,6 +63,27 @@ class Position(Base):
     max_profit_reached = Column(Float, default=0.0)
     last_price_update = Column(DateTime)
 
+class PositionEvent(Base):
+    __tablename__ = 'position_events'
+    
+    id = Column(Integer, primary_key=True)
+    position_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    event_type = Column(String(20), nullable=False)
+    price = Column(Float)
+    stop_loss = Column(Float)
+    max_profit = Column(Float)
+    sl_adjustment_count = Column(Integer)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class PositionSnapshot(Base):
+    __tablename__ = 'position_snapshots'
+    
+    id = Column(Integer, primary_key=True)
+    last_event_id = Column(Integer, nullable=False)
+    positions = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Performance(Base):
     __tablename__ = 'performance'
     
@@ -126,6 +148,11 @@ class DatabaseManager:
                     conn.execute(text("ALTER TABLE signal_logs ADD COLUMN user_id INTEGER DEFAULT 0"))
                     conn.commit()
                     print("✅ Database migrated: Added user_id column to signal_logs table")
+                
+                if 'strategy_name' not in columns:
+                    conn.execute(text("ALTER TABLE signal_logs ADD COLUMN strategy_name VARCHAR(50)"))
+                    conn.commit()
+                    print("✅ Database migrated: Added strategy_name column to signal_logs table")
             except Exception as e:
                 print(f"⚠️ Migration check for signal_logs table: {e}")
             
@@ -165,6 +192,9 @@ class DatabaseManager:
                     conn.execute(text("UPDATE positions SET last_price_update = datetime('now') WHERE last_price_update IS NULL"))
                     conn.commit()
                     print("✅ Database migrated: Added last_price_update column to positions table")
+                
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_positions_status ON positions (status)"))
+                conn.commit()
             except Exception as e:
                 print(f"⚠️ Migration check for positions table: {e}")
     
@@ -0,0 +1,212 @@
+"""Incremental backtest that resumes from a checkpoint when candles are appended
+
+The end state of a streaming backtest (indicator tail and EMA/MACD seeds, the open
+trade with its managed SL, the closed trades) is saved as a .npz checkpoint. The next
+run validates that the history it was built on is unchanged and only backtests the
+candles that came after it, so a nightly re-run costs time proportional to the new
+data. Results match Backtester.run_backtest over the full history.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from bot.logger import setup_logger
+from bot.backtester import BacktestResult, BacktestTrade, _from_ns, _to_ns, trades_from_arrays, trades_to_arrays
+from bot.backtest_cache import code_version, config_fingerprint, read_npz, write_npz
+from bot.streaming_backtest import CANDLE_COLUMNS, STREAM_CHUNK_SIZE, StreamingBacktester, StreamState, _OpenTrade
+
+logger = setup_logger('IncrementalBacktest')
+
+CHECKPOINT_FORMAT = 1
+
+class IncrementalBacktester:
+    """Backtest a growing candle history, checkpointing the end state after every run
+    
+    run() accepts any window of candles that contains the last checkpointed candle
+    (the full history, a sliding window; the overlap is aligned by timestamp, verified
+    against the stored indicator tail and skipped) or only the newly appended candles.
+    A checkpoint made with another config, code version, balance or position-management
+    setting is discarded and the backtest starts over; one whose history no longer
+    matches raises ValueError and is left untouched until reset().
+    """
+    
+    def __init__(self, config, checkpoint_dir: Optional[str] = None, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.config = config
+        self.checkpoint_dir = checkpoint_dir or config.BACKTEST_CHECKPOINT_DIR
+        self.chunk_size = chunk_size
+        self.streaming = StreamingBacktester(config, chunk_size=chunk_size)
+        logger.info(f"Incremental backtester initialized (checkpoint_dir={self.checkpoint_dir})")
+    
+    def checkpoint_path(self, name: str) -> str:
+        return os.path.join(self.checkpoint_dir, f'{name}.npz')
+    
+    def _state_key(self, initial_balance: float, manage_positions: bool) -> str:
+        payload = json.dumps([CHECKPOINT_FORMAT, code_version(), config_fingerprint(self.config),
+                              initial_balance, manage_positions])
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def save_checkpoint(self, path: str, key: str, state: StreamState, trades: List[BacktestTrade]):
+        stream = state.stream
+        tail = stream.tail
+        arrays = {f'tail_{name}': tail[name].to_numpy(dtype=np.float64) for name in CANDLE_COLUMNS}
+        arrays['tail_timestamp'] = _to_ns(tail.index)
+        trade_arrays, trades_tz = trades_to_arrays(trades)
+        arrays.update({f'trade_{name}': values for name, values in trade_arrays.items()})
+        
+        open_trade = None
+        if state.open_trade is not None:
+            trade = state.open_trade.trade
+            open_trade = {
+                'signal_type': trade.signal_type,
+                'entry_price': trade.entry_price,
+                'entry_time': int(_to_ns([trade.entry_time])[0]),
+                'stop_loss': trade.stop_loss,
+                'take_profit': trade.take_profit,
+                'symbol': trade.symbol,
+                'lot_size': trade.lot_size,
+                'current_sl': state.open_trade.stop_loss,
+                'max_profit': state.open_trade.max_profit
+            }
+        
+        tz = tail.index.tz
+        meta = {
+            'key': key,
+            'rows': stream.rows,
+            'offset': state.offset,
+            'seeds': stream.seeds,
+            'ema_periods': stream.ema_periods,
+            'last_close': state.last_close,
+            'last_time': int(_to_ns([state.last_time])[0]),
+            'tz': str(tz) if tz is not None else None,
+            'trades_tz': trades_tz,
+            'open_trade': open_trade
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        write_npz(path, arrays, meta)
+    
+    def load_checkpoint(self, path: str, key: str) -> Optional[Tuple[StreamState, List[BacktestTrade], np.ndarray]]:
+        """(state, closed trades, tail timestamps in ns) or None if missing/stale/unreadable"""
+        if not os.path.exists(path):
+            return None
+        try:
+            arrays, meta = read_npz(path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable backtest checkpoint {path}: {e}")
+            return None
+        if meta.get('key') != key:
+            logger.info(f"Backtest checkpoint {path} was made with other settings or code, starting over")
+            return None
+        
+        tz = meta['tz']
+        tail_ns = arrays['tail_timestamp']
+        state = self.streaming.new_state()
+        stream = state.stream
+        if list(meta['ema_periods']) != stream.ema_periods:
+            return None
+        stream.tail = pd.DataFrame({name: arrays[f'tail_{name}'] for name in CANDLE_COLUMNS},
+                                   index=pd.DatetimeIndex(_from_ns(tail_ns, tz), name='timestamp'))
+        stream.seeds = {name: float(value) for name, value in meta['seeds'].items()}
+        stream.rows = meta['rows']
+        state.offset = meta['offset']
+        state.last_close = meta['last_close']
+        state.last_time = _from_ns(np.array([meta['last_time']], dtype=np.int64), tz)[0]
+        
+        saved = meta['open_trade']
+        if saved is not None:
+            entry_time = _from_ns(np.array([saved['entry_time']], dtype=np.int64), tz)[0]
+            state.open_trade = _OpenTrade(BacktestTrade(saved['signal_type'], saved['entry_price'], entry_time,
+                                                        saved['stop_loss'], saved['take_profit'],
+                                                        saved['symbol'], saved['lot_size']))
+            state.open_trade.stop_loss = saved['current_sl']
+            state.open_trade.max_profit = saved['max_profit']
+        
+        trades = trades_from_arrays({name[len('trade_'):]: values for name, values in arrays.items()
+                                     if name.startswith('trade_')}, meta['trades_tz'])
+        return state, trades, tail_ns
+    
+    @staticmethod
+    def _new_candles(df: pd.DataFrame, state: StreamState, tail_ns: np.ndarray) -> Optional[pd.DataFrame]:
+        """Candles of df after the checkpoint, or None if df does not extend its history
+        
+        df is aligned on the last checkpointed candle by timestamp, so it may start
+        anywhere before it; the candles it shares with the stored tail must match.
+        """
+        index_ns = _to_ns(df.index)
+        if len(index_ns) == 0 or index_ns[0] > tail_ns[-1]:
+            return df
+        
+        end = int(np.searchsorted(index_ns, tail_ns[-1], side='right'))
+        if end == 0 or index_ns[end - 1] != tail_ns[-1]:
+            return None
+        overlap = min(end, len(tail_ns))
+        start = end - overlap
+        tail = state.stream.tail.iloc[len(tail_ns) - overlap:]
+        if not np.array_equal(index_ns[start:end], tail_ns[len(tail_ns) - overlap:]):
+            return None
+        for name in CANDLE_COLUMNS:
+            values = df[name].to_numpy(dtype=np.float64)[start:end]
+            if not np.array_equal(values, tail[name].to_numpy(), equal_nan=True):
+                return None
+        return df.iloc[end:]
+    
+    def run(self, df: pd.DataFrame, name: str = 'default', initial_balance: float = 10000.0,
+            manage_positions: Optional[bool] = None) -> BacktestResult:
+        """Backtest df, reusing and then updating the checkpoint called `name`
+        
+        df is the candle history, any window of it that contains the last checkpointed
+        candle, or only the candles appended since the last run; it needs a sorted
+        DatetimeIndex. Only the last tail of the checkpointed history (the candles the
+        indicators still look at) is compared, older edits go unnoticed. If df does not
+        match the checkpoint, ValueError is raised and the checkpoint is kept; call
+        reset() to backtest a different history under the same name.
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise ValueError("Incremental backtest needs candles with a DatetimeIndex")
+        started = time.perf_counter()
+        strategy = self.streaming.backtester.strategy
+        rules = self.streaming.position_rules(strategy, manage_positions)
+        key = self._state_key(initial_balance, rules is not None)
+        path = self.checkpoint_path(name)
+        
+        state = None
+        loaded = self.load_checkpoint(path, key)
+        if loaded is not None:
+            state, trades, tail_ns = loaded
+            new = self._new_candles(df, state, tail_ns)
+            if new is None:
+                raise ValueError(f"Candles do not match backtest checkpoint {path}; "
+                                 f"call reset('{name}') to start over")
+        if state is None:
+            state = self.streaming.new_state(strategy)
+            trades = []
+            new = df
+        resumed_at = state.stream.rows
+        
+        for start in range(0, len(new), self.chunk_size):
+            chunk = new.iloc[start:start + self.chunk_size]
+            trades.extend(self.streaming.feed(state, chunk, strategy, rules))
+        
+        if state.stream.tail is not None and len(new):
+            self.save_checkpoint(path, key, state, trades)
+        
+        result = BacktestResult()
+        result.initial_balance = initial_balance
+        result.trades = list(trades)
+        if state.stream.tail is not None:
+            trade = self.streaming.close_open_trade(state)
+            if trade is not None:
+                result.trades.append(trade)
+        result.calculate_metrics()
+        
+        logger.info(f"Incremental backtest '{name}': resumed at candle {resumed_at}, {len(new)} new candles, "
+                    f"{result.total_trades} trades in {time.perf_counter() - started:.2f}s")
+        return result
+    
+    def reset(self, name: str = 'default'):
+        try:
+            os.remove(self.checkpoint_path(name))
+        except FileNotFoundError:
+            pass
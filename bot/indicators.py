@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 class IndicatorEngine:
     def __init__(self, config):
@@ -58,14 +58,17 @@ class IndicatorEngine:
         macd_histogram = macd_line - macd_signal
         return macd_line, macd_signal, macd_histogram
     
-    def get_indicators(self, df: pd.DataFrame) -> Optional[Dict]:
-        min_required = max(30, max(self.ema_periods + [self.rsi_period, self.stoch_k_period, self.atr_period]) + 10)
+    def min_required_candles(self) -> int:
+        return max(30, max(self.ema_periods + [self.rsi_period, self.stoch_k_period, self.atr_period]) + 10)
+    
+    def get_indicators(self, df: pd.DataFrame, extra_ema_periods: Optional[List[int]] = None) -> Optional[Dict]:
+        min_required = self.min_required_candles()
         if len(df) < min_required:
             return None
         
         indicators = {}
         
-        for period in self.ema_periods:
+        for period in self.ema_periods + [p for p in (extra_ema_periods or []) if p not in self.ema_periods]:
             indicators[f'ema_{period}'] = self.calculate_ema(df, period).iloc[-1]
         
         indicators['rsi'] = self.calculate_rsi(df, self.rsi_period).iloc[-1]
@@ -98,3 +101,138 @@ class IndicatorEngine:
         indicators['low'] = df['low'].iloc[-1]
         
         return indicators
+    
+    def get_indicator_arrays(self, df: pd.DataFrame, ema_periods: Optional[List[int]] = None) -> Dict[str, np.ndarray]:
+        """Compute every indicator once for the whole DataFrame
+        
+        Returns numpy arrays aligned with df, using the same keys as get_indicators.
+        Element i equals get_indicators(df.iloc[:i+1]) because every indicator is causal.
+        """
+        periods = ema_periods if ema_periods is not None else self.ema_periods
+        arrays = {}
+        
+        for period in periods:
+            arrays[f'ema_{period}'] = self.calculate_ema(df, period).to_numpy(dtype=np.float64)
+        
+        rsi = self.calculate_rsi(df, self.rsi_period)
+        arrays['rsi'] = rsi.to_numpy(dtype=np.float64)
+        arrays['rsi_prev'] = rsi.shift(1).to_numpy(dtype=np.float64)
+        
+        stoch_k, stoch_d = self.calculate_stochastic(
+            df, self.stoch_k_period, self.stoch_d_period, self.stoch_smooth_k
+        )
+        arrays['stoch_k'] = stoch_k.to_numpy(dtype=np.float64)
+        arrays['stoch_d'] = stoch_d.to_numpy(dtype=np.float64)
+        arrays['stoch_k_prev'] = stoch_k.shift(1).to_numpy(dtype=np.float64)
+        arrays['stoch_d_prev'] = stoch_d.shift(1).to_numpy(dtype=np.float64)
+        
+        arrays['atr'] = self.calculate_atr(df, self.atr_period).to_numpy(dtype=np.float64)
+        
+        macd_line, macd_signal, macd_histogram = self.calculate_macd(
+            df, self.macd_fast, self.macd_slow, self.macd_signal
+        )
+        arrays['macd'] = macd_line.to_numpy(dtype=np.float64)
+        arrays['macd_signal'] = macd_signal.to_numpy(dtype=np.float64)
+        arrays['macd_histogram'] = macd_histogram.to_numpy(dtype=np.float64)
+        arrays['macd_prev'] = macd_line.shift(1).to_numpy(dtype=np.float64)
+        arrays['macd_signal_prev'] = macd_signal.shift(1).to_numpy(dtype=np.float64)
+        
+        arrays['volume'] = df['volume'].to_numpy(dtype=np.float64)
+        arrays['volume_avg'] = self.calculate_volume_average(df).to_numpy(dtype=np.float64)
+        
+        arrays['close'] = df['close'].to_numpy(dtype=np.float64)
+        arrays['high'] = df['high'].to_numpy(dtype=np.float64)
+        arrays['low'] = df['low'].to_numpy(dtype=np.float64)
+        
+        return arrays
+
+class IndicatorStream:
+    """get_indicator_arrays over consecutive chunks of one long candle series
+    
+    EMA and MACD recursions resume from the value they had before the kept tail, and
+    the rolling-window indicators are recomputed over that short tail of the previous
+    chunk, so the arrays returned for each chunk line up with one get_indicator_arrays
+    call over all rows while memory stays bounded by the chunk size.
+    """
+    
+    def __init__(self, engine: IndicatorEngine, ema_periods: Optional[List[int]] = None):
+        self.engine = engine
+        self.ema_periods = list(ema_periods if ema_periods is not None else engine.ema_periods)
+        self.tail_length = max(
+            engine.rsi_period + 1,
+            engine.stoch_k_period + engine.stoch_smooth_k + engine.stoch_d_period,
+            engine.atr_period + 1,
+            20
+        ) + 1
+        self.tail: Optional[pd.DataFrame] = None
+        self.seeds: Dict[str, float] = {}
+        self.rows = 0
+    
+    @staticmethod
+    def _ewm(values: np.ndarray, span: int, seed: Optional[float]) -> np.ndarray:
+        if seed is None:
+            return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy(dtype=np.float64)
+        seeded = pd.Series(np.concatenate(([seed], values)))
+        return seeded.ewm(span=span, adjust=False).mean().to_numpy(dtype=np.float64)[1:]
+    
+    def update(self, chunk: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Indicator arrays for the rows of chunk, continuing from earlier chunks"""
+        chunk = chunk[['open', 'high', 'low', 'close', 'volume']]
+        frame = chunk if self.tail is None else pd.concat([self.tail, chunk])
+        offset = len(frame) - len(chunk)
+        keep_from = max(0, len(frame) - self.tail_length)
+        engine = self.engine
+        seeds = {}
+        
+        def ema(name: str, values: np.ndarray, span: int) -> np.ndarray:
+            series = self._ewm(values, span, self.seeds.get(name))
+            if keep_from > 0:
+                seeds[name] = float(series[keep_from - 1])
+            elif name in self.seeds:
+                seeds[name] = self.seeds[name]
+            return series
+        
+        def previous(values: np.ndarray) -> np.ndarray:
+            return np.concatenate(([np.nan], values[:-1]))
+        
+        close = frame['close'].to_numpy(dtype=np.float64)
+        arrays = {}
+        
+        for period in self.ema_periods:
+            arrays[f'ema_{period}'] = ema(f'ema_{period}', close, period)
+        
+        rsi = engine.calculate_rsi(frame, engine.rsi_period).to_numpy(dtype=np.float64)
+        arrays['rsi'] = rsi
+        arrays['rsi_prev'] = previous(rsi)
+        
+        stoch_k, stoch_d = engine.calculate_stochastic(
+            frame, engine.stoch_k_period, engine.stoch_d_period, engine.stoch_smooth_k
+        )
+        stoch_k = stoch_k.to_numpy(dtype=np.float64)
+        stoch_d = stoch_d.to_numpy(dtype=np.float64)
+        arrays['stoch_k'] = stoch_k
+        arrays['stoch_d'] = stoch_d
+        arrays['stoch_k_prev'] = previous(stoch_k)
+        arrays['stoch_d_prev'] = previous(stoch_d)
+        
+        arrays['atr'] = engine.calculate_atr(frame, engine.atr_period).to_numpy(dtype=np.float64)
+        
+        macd_line = ema('macd_fast', close, engine.macd_fast) - ema('macd_slow', close, engine.macd_slow)
+        macd_signal = ema('macd_signal', macd_line, engine.macd_signal)
+        arrays['macd'] = macd_line
+        arrays['macd_signal'] = macd_signal
+        arrays['macd_histogram'] = macd_line - macd_signal
+        arrays['macd_prev'] = previous(macd_line)
+        arrays['macd_signal_prev'] = previous(macd_signal)
+        
+        arrays['volume'] = frame['volume'].to_numpy(dtype=np.float64)
+        arrays['volume_avg'] = engine.calculate_volume_average(frame).to_numpy(dtype=np.float64)
+        
+        arrays['close'] = close
+        arrays['high'] = frame['high'].to_numpy(dtype=np.float64)
+        arrays['low'] = frame['low'].to_numpy(dtype=np.float64)
+        
+        self.tail = frame.iloc[keep_from:].copy()
+        self.seeds = seeds
+        self.rows += len(chunk)
+        return {key: value[offset:] for key, value in arrays.items()}
@@ -8,21 +8,25 @@ import pytz
 import random
 from typing import Optional, Dict, List
 from bot.logger import setup_logger
+from bot.clock import Clock, RealClock, VirtualClock
 
 logger = setup_logger('MarketData')
 
 class OHLCBuilder:
-    def __init__(self, timeframe_minutes: int = 1):
+    def __init__(self, timeframe_minutes: int = 1, clock: Optional[Clock] = None):
         self.timeframe_minutes = timeframe_minutes
+        self.clock = clock or RealClock()
         self.timeframe_seconds = timeframe_minutes * 60
         self.current_candle = None
         self.candles = deque(maxlen=500)
         self.tick_count = 0
         
-    def add_tick(self, bid: float, ask: float, timestamp: datetime):
+    def add_tick(self, bid: float, ask: float, timestamp: Optional[datetime] = None):
         mid_price = (bid + ask) / 2.0
         
-        if timestamp.tzinfo is None:
+        if timestamp is None:
+            timestamp = self.clock.now()
+        elif timestamp.tzinfo is None:
             timestamp = timestamp.replace(tzinfo=pytz.UTC)
         
         candle_start = timestamp.replace(
@@ -70,9 +74,46 @@ class OHLCBuilder:
         
         return df
 
+class ConflatedTickQueue:
+    """Single-slot tick queue: a new tick replaces the one the subscriber has not read yet
+    
+    For consumers that only care about the latest price (position monitoring), so a
+    slow consumer never falls behind the feed or makes the broadcaster back off. The
+    price range of the ticks merged away is kept on the latest one as 'low' / 'high'.
+    """
+    
+    def __init__(self):
+        self._latest = None
+        self._ready = asyncio.Event()
+        self.conflated = 0
+    
+    def put_nowait(self, tick: Dict):
+        previous = self._latest
+        if self._ready.is_set():
+            self.conflated += 1
+            if previous.get('quote') is not None and tick.get('quote') is not None:
+                tick = dict(tick,
+                            low=min(previous.get('low', previous['quote']), tick['quote']),
+                            high=max(previous.get('high', previous['quote']), tick['quote']))
+        self._latest = tick
+        self._ready.set()
+    
+    async def get(self) -> Dict:
+        await self._ready.wait()
+        self._ready.clear()
+        tick, self._latest = self._latest, None
+        return tick
+    
+    def qsize(self) -> int:
+        return 1 if self._ready.is_set() else 0
+    
+    def empty(self) -> bool:
+        return not self._ready.is_set()
+
 class MarketDataClient:
-    def __init__(self, config):
+    def __init__(self, config, clock: Optional[Clock] = None):
         self.config = config
+        self.clock = clock or RealClock()
         self.ws_url = "wss://ws.derivws.com/websockets/v3?app_id=1089"
         self.symbol = "frxXAUUSD"
         self.current_bid = None
@@ -88,8 +129,8 @@ class MarketDataClient:
         self.simulator_task = None
         self.last_ping = 0
         
-        self.m1_builder = OHLCBuilder(timeframe_minutes=1)
-        self.m5_builder = OHLCBuilder(timeframe_minutes=5)
+        self.m1_builder = OHLCBuilder(timeframe_minutes=1, clock=self.clock)
+        self.m5_builder = OHLCBuilder(timeframe_minutes=5, clock=self.clock)
         
         self.reconnect_delay = 3
         self.base_price = 2650.0
@@ -115,8 +156,9 @@ class MarketDataClient:
             else:
                 logger.debug(f"💰 Tick: Bid={bid:.2f}, Ask={ask:.2f}, Quote={quote:.2f}")
     
-    async def subscribe_ticks(self, name: str) -> asyncio.Queue:
-        queue = asyncio.Queue(maxsize=100)
+    async def subscribe_ticks(self, name: str, conflate: bool = False):
+        """Tick queue for a subscriber; conflate=True keeps only the latest unread tick"""
+        queue = ConflatedTickQueue() if conflate else asyncio.Queue(maxsize=100)
         self.subscribers[name] = queue
         self.subscriber_failures[name] = 0
         logger.debug(f"Subscriber '{name}' registered untuk tick feed")
@@ -280,13 +322,12 @@ class MarketDataClient:
     async def _send_heartbeat(self):
         while self.running and self.ws:
             try:
-                import time
-                current_time = time.time()
+                current_time = self.clock.time()
                 if current_time - self.last_ping >= 20:
                     ping_msg = {"ping": 1}
                     await self.ws.send(json.dumps(ping_msg))
                     self.last_ping = current_time
-                await asyncio.sleep(1)
+                await self.clock.sleep(1)
             except Exception as e:
                 logger.debug(f"Heartbeat error: {e}")
                 break
@@ -300,7 +341,7 @@ class MarketDataClient:
         if self.reconnect_attempts <= self.max_reconnect_attempts:
             logger.warning(f"WebSocket connection failed. Will retry in {self.reconnect_delay}s (Attempt {self.reconnect_attempts}/{self.max_reconnect_attempts})")
             logger.warning(f"Note: URL {self.ws_url} may not be publicly accessible")
-            await asyncio.sleep(self.reconnect_delay)
+            await self.clock.sleep(self.reconnect_delay)
         else:
             logger.error(f"Max reconnect attempts ({self.max_reconnect_attempts}) reached")
             logger.warning("Switching to SIMULATOR MODE for testing purposes")
@@ -314,7 +355,7 @@ class MarketDataClient:
         spread = 0.40
         self.current_bid = self.base_price - (spread / 2)
         self.current_ask = self.base_price + (spread / 2)
-        self.current_timestamp = datetime.utcnow()
+        self.current_timestamp = self.clock.utcnow()
         
         self.m1_builder.add_tick(self.current_bid, self.current_ask, self.current_timestamp)
         self.m5_builder.add_tick(self.current_bid, self.current_ask, self.current_timestamp)
@@ -334,7 +375,7 @@ class MarketDataClient:
                 
                 self.current_bid = mid_price - (spread / 2)
                 self.current_ask = mid_price + (spread / 2)
-                self.current_timestamp = datetime.utcnow()
+                self.current_timestamp = self.clock.utcnow()
                 self.current_quote = mid_price
                 
                 self.m1_builder.add_tick(self.current_bid, self.current_ask, self.current_timestamp)
@@ -352,14 +393,57 @@ class MarketDataClient:
                 
                 self.base_price = mid_price
                 
-                await asyncio.sleep(0.5)
+                await self.clock.sleep(0.5)
                 
             except Exception as e:
                 logger.error(f"Simulator error: {e}")
-                await asyncio.sleep(5)
+                await self.clock.sleep(5)
         
         logger.info("Price simulator stopped")
     
+    async def replay_ticks(self, ticks):
+        """Feed recorded ticks (e.g. TickData: ns timestamps, bid, ask) through the live tick path
+        
+        With a VirtualClock, time jumps to each tick's timestamp, so the rest of the bot
+        runs as fast as it can process ticks; otherwise the recorded gaps are waited out
+        on the clock (real time, or scaled by an AcceleratedClock).
+        """
+        self.running = True
+        self.connected = True
+        virtual = isinstance(self.clock, VirtualClock)
+        timestamps = ticks.timestamp
+        logger.info(f"Replaying {len(timestamps)} recorded ticks ({type(self.clock).__name__})")
+        
+        previous = None
+        for i in range(len(timestamps)):
+            if not self.running:
+                break
+            timestamp = pd.Timestamp(int(timestamps[i]), tz='UTC').to_pydatetime()
+            if virtual:
+                self.clock.set_time(timestamp)
+            elif previous is not None:
+                await self.clock.sleep((timestamp - previous).total_seconds())
+            previous = timestamp
+            
+            self.current_bid = float(ticks.bid[i])
+            self.current_ask = float(ticks.ask[i])
+            self.current_quote = (self.current_bid + self.current_ask) / 2
+            self.current_timestamp = timestamp.replace(tzinfo=None)
+            
+            self.m1_builder.add_tick(self.current_bid, self.current_ask, self.current_timestamp)
+            self.m5_builder.add_tick(self.current_bid, self.current_ask, self.current_timestamp)
+            
+            await self._broadcast_tick({
+                'bid': self.current_bid,
+                'ask': self.current_ask,
+                'quote': self.current_quote,
+                'timestamp': self.current_timestamp
+            })
+            await asyncio.sleep(0)
+        
+        self.connected = False
+        logger.info("Tick replay finished")
+    
     async def _on_message(self, message: str):
         try:
             data = json.loads(message)
@@ -367,7 +451,7 @@ class MarketDataClient:
             if isinstance(data, dict):
                 if "tick" in data:
                     tick = data["tick"]
-                    epoch = tick.get("epoch", int(datetime.utcnow().timestamp()))
+                    epoch = tick.get("epoch", int(self.clock.time()))
                     bid = tick.get("bid")
                     ask = tick.get("ask")
                     quote = tick.get("quote")
@@ -0,0 +1,197 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Sequence, Tuple, Union
+import numpy as np
+from bot.logger import setup_logger
+from bot.backtester import BacktestResult, BacktestTrade
+
+logger = setup_logger('MonteCarlo')
+
+MONTE_CARLO_METHODS = ('bootstrap', 'shuffle')
+MAX_CHUNK_ELEMENTS = 2_000_000
+
+def _simulate_chunk(task: Dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Simulate one block of equity paths as a (paths x trades) matrix
+    
+    Each chunk draws from its own SeedSequence child, so results do not depend on
+    how chunks are spread over processes. Returns per-path (max_drawdown %,
+    longest stretch under water in trades, ruined, final balance, ended under water).
+    """
+    profit_loss = task['profit_loss']
+    n_paths = task['n_paths']
+    n = len(profit_loss)
+    initial_balance = task['initial_balance']
+    rng = np.random.default_rng(np.random.SeedSequence(task['seed'], spawn_key=(task['chunk'],)))
+    
+    if task['method'] == 'bootstrap':
+        balance = profit_loss[rng.integers(0, n, size=(n_paths, n))]
+    else:
+        balance = np.tile(profit_loss, (n_paths, 1))
+        rng.permuted(balance, axis=1, out=balance)
+    
+    np.cumsum(balance, axis=1, out=balance)
+    balance += initial_balance
+    
+    peak = np.maximum.accumulate(balance, axis=1)
+    np.maximum(peak, initial_balance, out=peak)
+    max_drawdown = ((peak - balance) / peak).max(axis=1) * 100
+    
+    under_water = balance < peak
+    idx = np.arange(n)
+    last_peak = np.maximum.accumulate(np.where(under_water, -1, idx), axis=1)
+    recovery = np.where(under_water, idx - last_peak, 0).max(axis=1)
+    
+    ruined = balance.min(axis=1) <= task['ruin_balance']
+    return max_drawdown, recovery, ruined, balance[:, -1].copy(), under_water[:, -1].copy()
+
+class MonteCarloResult:
+    """Per-path outcomes of a Monte Carlo run plus their distribution summary"""
+    
+    PERCENTILES = (5, 25, 50, 75, 95, 99)
+    
+    def __init__(self, method: str, initial_balance: float, ruin_drawdown_pct: float,
+                 max_drawdowns: np.ndarray, recovery_trades: np.ndarray, ruined: np.ndarray,
+                 final_balances: np.ndarray, ended_under_water: np.ndarray):
+        self.method = method
+        self.initial_balance = initial_balance
+        self.ruin_drawdown_pct = ruin_drawdown_pct
+        self.max_drawdowns = max_drawdowns
+        self.recovery_trades = recovery_trades
+        self.ruined = ruined
+        self.final_balances = final_balances
+        self.ended_under_water = ended_under_water
+    
+    @property
+    def simulations(self) -> int:
+        return len(self.max_drawdowns)
+    
+    @property
+    def risk_of_ruin(self) -> float:
+        """% of paths whose balance fell to the ruin level"""
+        return float(self.ruined.mean() * 100) if self.simulations else 0.0
+    
+    def drawdown_percentiles(self) -> Dict[int, float]:
+        values = np.percentile(self.max_drawdowns, self.PERCENTILES) if self.simulations else [0.0] * 6
+        return {p: float(v) for p, v in zip(self.PERCENTILES, values)}
+    
+    def recovery_percentiles(self) -> Dict[int, float]:
+        values = np.percentile(self.recovery_trades, self.PERCENTILES) if self.simulations else [0.0] * 6
+        return {p: float(v) for p, v in zip(self.PERCENTILES, values)}
+    
+    def to_dict(self) -> Dict:
+        if not self.simulations:
+            return {'method': self.method, 'simulations': 0}
+        return {
+            'method': self.method,
+            'simulations': self.simulations,
+            'initial_balance': self.initial_balance,
+            'max_drawdown_mean': float(self.max_drawdowns.mean()),
+            'max_drawdown_percentiles': self.drawdown_percentiles(),
+            'recovery_trades_percentiles': self.recovery_percentiles(),
+            'recovery_trades_max': int(self.recovery_trades.max()),
+            'ended_under_water_pct': float(self.ended_under_water.mean() * 100),
+            'risk_of_ruin': self.risk_of_ruin,
+            'ruin_drawdown_pct': self.ruin_drawdown_pct,
+            'probability_of_loss': float((self.final_balances < self.initial_balance).mean() * 100),
+            'final_balance_median': float(np.median(self.final_balances))
+        }
+    
+    def format_report(self) -> str:
+        if not self.simulations:
+            return "🎲 *Monte Carlo*\n\nTidak ada trade untuk disimulasikan."
+        
+        summary = self.to_dict()
+        dd = summary['max_drawdown_percentiles']
+        rec = summary['recovery_trades_percentiles']
+        report = "🎲 *Monte Carlo Results*\n\n"
+        report += f"Simulations: {self.simulations:,} ({self.method})\n\n"
+        
+        report += f"*Max Drawdown:*\n"
+        report += f"Median: {dd[50]:.2f}%\n"
+        report += f"95th pct: {dd[95]:.2f}%\n"
+        report += f"99th pct: {dd[99]:.2f}%\n\n"
+        
+        report += f"*Time to Recovery (trades):*\n"
+        report += f"Median: {rec[50]:.0f}\n"
+        report += f"95th pct: {rec[95]:.0f}\n"
+        report += f"Ended under water: {summary['ended_under_water_pct']:.1f}%\n\n"
+        
+        report += f"*Risk:*\n"
+        report += f"Risk of Ruin (-{self.ruin_drawdown_pct:.0f}%): {self.risk_of_ruin:.2f}%\n"
+        report += f"Probability of Loss: {summary['probability_of_loss']:.1f}%\n"
+        report += f"Median Final Balance: ${summary['final_balance_median']:,.2f}\n"
+        
+        return report
+
+class MonteCarloSimulator:
+    """Resample the trade sequence of a backtest to get drawdown/ruin distributions
+    
+    'bootstrap' draws trades with replacement, 'shuffle' permutes the actual trades
+    (same total P/L, different order). Paths are simulated in chunks of at most
+    MAX_CHUNK_ELEMENTS matrix cells, optionally spread over a process pool.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or 1
+        logger.info(f"Monte Carlo simulator initialized (max_workers={self.max_workers})")
+    
+    @staticmethod
+    def trade_profit_loss(trades: Union[BacktestResult, Sequence[BacktestTrade], np.ndarray]) -> np.ndarray:
+        if isinstance(trades, BacktestResult):
+            trades = trades.trades
+        if isinstance(trades, np.ndarray):
+            return trades.astype(np.float64)
+        return np.fromiter((t.profit_loss if isinstance(t, BacktestTrade) else t for t in trades),
+                           dtype=np.float64)
+    
+    def run(self, trades: Union[BacktestResult, Sequence[BacktestTrade], np.ndarray], simulations: int = 10000,
+            method: str = 'bootstrap', initial_balance: Optional[float] = None, ruin_drawdown_pct: float = 50.0,
+            seed: Optional[int] = None) -> MonteCarloResult:
+        """Simulate `simulations` equity paths from the trades' P/L
+        
+        A path is ruined once its balance drops to initial_balance * (1 - ruin_drawdown_pct/100).
+        initial_balance defaults to the BacktestResult's own, or 10000.
+        """
+        if method not in MONTE_CARLO_METHODS:
+            raise ValueError(f"Unknown Monte Carlo method '{method}' (use {', '.join(MONTE_CARLO_METHODS)})")
+        
+        if initial_balance is None:
+            initial_balance = trades.initial_balance if isinstance(trades, BacktestResult) else 10000.0
+        profit_loss = self.trade_profit_loss(trades)
+        n = len(profit_loss)
+        if n == 0 or simulations <= 0:
+            logger.warning("Monte Carlo: no trades to resample")
+            empty = np.empty(0)
+            return MonteCarloResult(method, initial_balance, ruin_drawdown_pct,
+                                    empty, empty.astype(np.int64), empty.astype(bool), empty, empty.astype(bool))
+        
+        started = time.perf_counter()
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        paths_per_chunk = max(1, MAX_CHUNK_ELEMENTS // n)
+        tasks = []
+        for chunk, start in enumerate(range(0, simulations, paths_per_chunk)):
+            tasks.append({
+                'profit_loss': profit_loss,
+                'n_paths': min(paths_per_chunk, simulations - start),
+                'method': method,
+                'seed': seed,
+                'chunk': chunk,
+                'initial_balance': initial_balance,
+                'ruin_balance': initial_balance * (1 - ruin_drawdown_pct / 100)
+            })
+        
+        workers = min(self.max_workers, len(tasks))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parts = list(executor.map(_simulate_chunk, tasks))
+        else:
+            parts = [_simulate_chunk(task) for task in tasks]
+        
+        result = MonteCarloResult(method, initial_balance, ruin_drawdown_pct,
+                                  *(np.concatenate(column) for column in zip(*parts)))
+        
+        logger.info(f"Monte Carlo: {simulations} x {n} trades ({method}, {len(tasks)} chunks, "
+                    f"{workers} worker(s)) in {time.perf_counter() - started:.2f}s, "
+                    f"median max DD {result.drawdown_percentiles()[50]:.2f}%, ruin {result.risk_of_ruin:.2f}%")
+        return result
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from bot.logger import setup_logger
+
+logger = setup_logger('NotificationQueue')
+
+class NotificationQueue:
+    """Bounded queue of notification jobs run by a small pool of background workers
+    
+    submit() never waits: it is called from the tick path, so when the queue is full
+    the job is dropped and counted instead of stalling position evaluation. Workers
+    start lazily on the first submit inside the running event loop.
+    """
+    
+    def __init__(self, name: str, workers: int = 2, maxsize: int = 100):
+        self.name = name
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+    
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for i in range(len(self._tasks), self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(), name=f'{self.name}_worker_{i}'))
+    
+    def submit(self, job: Callable[[], Awaitable], description: str = '') -> bool:
+        """Queue a coroutine function to be awaited by a worker, False if it was dropped"""
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait((job, description))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"{self.name} queue full ({self.maxsize}), dropping notification: {description}")
+            return False
+        self.submitted += 1
+        return True
+    
+    async def _worker(self):
+        while True:
+            job, description = await self._queue.get()
+            try:
+                await job()
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"{self.name} job failed ({description}): {e}")
+            finally:
+                self._queue.task_done()
+    
+    async def drain(self):
+        """Wait until every queued job has run"""
+        if self._queue is not None:
+            await self._queue.join()
+    
+    async def stop(self, timeout: float = 10.0):
+        """Give queued jobs up to `timeout` seconds to finish, then cancel the workers"""
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self.drain(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self.name}: {self._queue.qsize()} notifications not sent before shutdown")
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def get_stats(self) -> Dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'dropped': self.dropped
+        }
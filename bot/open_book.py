@@ -0,0 +1,146 @@
+from typing import Dict, Hashable, Iterable, List, Optional
+import numpy as np
+from bot import position_engine
+
+class BookChange:
+    """One position whose state changed on a price update"""
+    
+    __slots__ = ('key', 'old_stop_loss', 'stop_loss', 'max_profit', 'sl_adjustments', 'adjustment',
+                 'exit_code', 'unrealized_pl')
+    
+    def __init__(self, key, old_stop_loss: float, stop_loss: float, max_profit: float, sl_adjustments: int,
+                 adjustment: int, exit_code: int, unrealized_pl: float):
+        self.key = key
+        self.old_stop_loss = old_stop_loss
+        self.stop_loss = stop_loss
+        self.max_profit = max_profit
+        self.sl_adjustments = sl_adjustments
+        self.adjustment = adjustment
+        self.exit_code = exit_code
+        self.unrealized_pl = unrealized_pl
+
+class OpenBook:
+    """Open positions held as struct-of-arrays (one NumPy column per field)
+    
+    Rows 0..size-1 are the open positions; removing one moves the last row into its
+    place. step() marks every position to the price in one expression (live P/L) and
+    runs position_engine.step_arrays over the requested rows, writing the new SL /
+    max profit back and returning only the rows whose state changed.
+    """
+    
+    FLOAT_COLUMNS = ('entry_price', 'stop_loss', 'take_profit', 'original_sl', 'max_profit', 'lot_size',
+                     'unrealized_pl')
+    
+    def __init__(self, rules: position_engine.PositionRules, capacity: int = 64):
+        self.rules = rules
+        self.size = 0
+        self.last_price = np.nan
+        self.keys: List[Hashable] = []
+        self._rows: Dict[Hashable, int] = {}
+        self._allocate(max(capacity, 1))
+    
+    def _allocate(self, capacity: int):
+        n = self.size
+        is_buy = np.zeros(capacity, dtype=bool)
+        sl_adjustments = np.zeros(capacity, dtype=np.int64)
+        if n:
+            is_buy[:n] = self.is_buy[:n]
+            sl_adjustments[:n] = self.sl_adjustments[:n]
+        self.is_buy = is_buy
+        self.sl_adjustments = sl_adjustments
+        for name in self.FLOAT_COLUMNS:
+            column = np.zeros(capacity, dtype=np.float64)
+            if n:
+                column[:n] = getattr(self, name)[:n]
+            setattr(self, name, column)
+        self.capacity = capacity
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __contains__(self, key) -> bool:
+        return key in self._rows
+    
+    def add(self, key, is_buy: bool, entry_price: float, stop_loss: float, take_profit: float,
+            original_sl: Optional[float] = None, max_profit: float = 0.0, sl_adjustments: int = 0,
+            lot_size: Optional[float] = None):
+        if key in self._rows:
+            self.remove(key)
+        if self.size == self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.size
+        self.is_buy[i] = is_buy
+        self.entry_price[i] = entry_price
+        self.stop_loss[i] = stop_loss
+        self.take_profit[i] = take_profit
+        self.original_sl[i] = stop_loss if original_sl is None else original_sl
+        self.max_profit[i] = max_profit or 0.0
+        self.sl_adjustments[i] = sl_adjustments or 0
+        self.lot_size[i] = self.rules.lot_size if lot_size is None else lot_size
+        self.unrealized_pl[i] = 0.0
+        self.keys.append(key)
+        self._rows[key] = i
+        self.size += 1
+    
+    def remove(self, key):
+        i = self._rows.pop(key, None)
+        if i is None:
+            return
+        last = self.size - 1
+        if i != last:
+            moved = self.keys[last]
+            self.keys[i] = moved
+            self._rows[moved] = i
+            self.is_buy[i] = self.is_buy[last]
+            self.sl_adjustments[i] = self.sl_adjustments[last]
+            for name in self.FLOAT_COLUMNS:
+                column = getattr(self, name)
+                column[i] = column[last]
+        self.keys.pop()
+        self.size = last
+    
+    def clear(self):
+        self.keys.clear()
+        self._rows.clear()
+        self.size = 0
+    
+    def get(self, key) -> Dict:
+        i = self._rows[key]
+        row = {name: float(getattr(self, name)[i]) for name in self.FLOAT_COLUMNS}
+        row['is_buy'] = bool(self.is_buy[i])
+        row['sl_adjustments'] = int(self.sl_adjustments[i])
+        return row
+    
+    def mark(self, price: float):
+        """Unrealized P/L of every open position at this price"""
+        n = self.size
+        self.unrealized_pl[:n] = (np.where(self.is_buy[:n], price - self.entry_price[:n], self.entry_price[:n] - price)
+                                  * self.rules.pip_value * self.lot_size[:n])
+        self.last_price = price
+    
+    def step(self, price: float, keys: Optional[Iterable[Hashable]] = None) -> List[BookChange]:
+        """Apply a price to the given positions (default: all), returning the changed rows"""
+        self.mark(price)
+        if keys is None:
+            rows = np.arange(self.size)
+        else:
+            rows = np.fromiter((self._rows[key] for key in keys if key in self._rows), dtype=np.int64)
+        if not len(rows):
+            return []
+        
+        stop_loss = self.stop_loss[rows]
+        max_profit = self.max_profit[rows]
+        new_stop_loss, new_max_profit, adjustment, code, pl = position_engine.step_arrays(
+            self.rules, self.is_buy[rows], self.entry_price[rows], self.original_sl[rows], stop_loss,
+            self.take_profit[rows], max_profit, price, self.lot_size[rows]
+        )
+        adjusted = adjustment != position_engine.NO_ADJUSTMENT
+        self.stop_loss[rows] = new_stop_loss
+        self.max_profit[rows] = new_max_profit
+        self.sl_adjustments[rows] += adjusted
+        
+        changed = np.flatnonzero(adjusted | (code != position_engine.HOLD) | (new_max_profit != max_profit))
+        return [BookChange(self.keys[rows[j]], float(stop_loss[j]), float(new_stop_loss[j]),
+                           float(new_max_profit[j]), int(self.sl_adjustments[rows[j]]), int(adjustment[j]),
+                           int(code[j]), float(pl[j]))
+                for j in changed]
@@ -0,0 +1,321 @@
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import ConfigOverride
+from bot.logger import setup_logger
+from bot.indicators import IndicatorEngine
+from bot.strategy import TradingStrategy
+from bot.backtester import Backtester, trades_from_arrays, trades_to_arrays
+from bot.backtest_cache import BacktestCache, config_fingerprint, fingerprint_arrays
+
+logger = setup_logger('ParameterSweep')
+
+SWEEPABLE_PARAMS = {
+    'SL_ATR_MULTIPLIER', 'EMA_PERIODS', 'RSI_OVERSOLD_LEVEL', 'RSI_OVERBOUGHT_LEVEL',
+    'STOCH_OVERSOLD_LEVEL', 'STOCH_OVERBOUGHT_LEVEL', 'VOLUME_THRESHOLD_MULTIPLIER',
+    'SIGNAL_MIN_SCORE', 'DEFAULT_SL_PIPS', 'STRATEGY_RULE_WEIGHTS'
+}
+
+class SharedArrays:
+    """Pack a dict of float arrays into one SharedMemory block
+    
+    The parent creates the block once; workers attach by name and get zero-copy views.
+    """
+    
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.layout: List[Tuple[str, int, int, str]] = []
+        offset = 0
+        for key, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            self.layout.append((key, offset, len(arr), arr.dtype.str))
+            offset += arr.nbytes
+        
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for key, start, length, dtype in self.layout:
+            view = np.ndarray((length,), dtype=np.dtype(dtype), buffer=self.shm.buf, offset=start)
+            view[:] = arrays[key]
+        
+        self.name = self.shm.name
+    
+    @staticmethod
+    def attach(name: str, layout: List[Tuple[str, int, int, str]]) -> Tuple[shared_memory.SharedMemory, Dict[str, np.ndarray]]:
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for key, start, length, dtype in layout:
+            view = np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf, offset=start)
+            view.flags.writeable = False
+            arrays[key] = view
+        return shm, arrays
+    
+    def close(self):
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def _timestamps_payload(index) -> Tuple[Optional[np.ndarray], Optional[str]]:
+    if isinstance(index, pd.DatetimeIndex):
+        tz = str(index.tz) if index.tz is not None else None
+        return index.as_unit('ns').asi8.copy(), tz
+    return None, None
+
+def _timestamps_from_payload(ns: Optional[np.ndarray], tz: Optional[str]) -> Optional[pd.DatetimeIndex]:
+    if ns is None:
+        return None
+    index = pd.DatetimeIndex(ns.view('datetime64[ns]'))
+    return index.tz_localize('UTC').tz_convert(tz) if tz else index
+
+_worker_state: Dict = {}
+
+def _init_worker(shm_name: str, layout, base_config, ts_key: Optional[str], tz: Optional[str]):
+    shm, arrays = SharedArrays.attach(shm_name, layout)
+    timestamps = None
+    if ts_key is not None:
+        timestamps = _timestamps_from_payload(arrays.pop(ts_key), tz)
+    _worker_state['shm'] = shm
+    _worker_state['arrays'] = arrays
+    _worker_state['timestamps'] = timestamps
+    _worker_state['base_config'] = base_config
+    _worker_state['backtester'] = Backtester(base_config)
+
+def _config_params(params: Dict) -> Dict:
+    """params as config overrides; EMA_PERIODS may be any sequence, the indicators expect a list"""
+    if 'EMA_PERIODS' not in params:
+        return params
+    return dict(params, EMA_PERIODS=list(params['EMA_PERIODS']))
+
+def evaluate_params(params: Dict, arrays: Dict[str, np.ndarray], timestamps, base_config,
+                    backtester: Backtester, initial_balance: float = 10000.0,
+                    start: int = 0, end: Optional[int] = None, include_trades: bool = False) -> Dict:
+    """Run one parameter set over shared indicator arrays and return its metrics row
+    
+    start/end select a window of the arrays (views, no copy). Indicators inside the
+    window keep the warm-up from the bars before it, so only the first window of the
+    history skips the indicator warm-up bars.
+    """
+    config = ConfigOverride(base_config, **_config_params(params))
+    strategy = TradingStrategy(config)
+    
+    if start or end is not None:
+        arrays = {key: value[start:end] for key, value in arrays.items()}
+        if timestamps is not None:
+            timestamps = timestamps[start:end]
+    start_index = max(0, backtester.first_tradable_index(strategy) - start)
+    
+    result = backtester.run_backtest_arrays(arrays, timestamps, initial_balance,
+                                            strategy=strategy, start_index=start_index)
+    row = dict(params)
+    row.update(result.to_dict())
+    if include_trades:
+        row['trades'] = result.trades
+    return row
+
+def _evaluate_task(task: Dict) -> Dict:
+    try:
+        return evaluate_params(
+            task['params'], _worker_state['arrays'], _worker_state['timestamps'],
+            _worker_state['base_config'], _worker_state['backtester'],
+            task.get('initial_balance', 10000.0), task.get('start', 0), task.get('end'),
+            task.get('include_trades', False)
+        )
+    except Exception as e:
+        row = dict(task['params'])
+        row['error'] = str(e)
+        return row
+
+def _row_payload(row: Dict) -> Tuple[Dict[str, np.ndarray], Dict]:
+    row = dict(row)
+    trades = row.pop('trades', None)
+    if trades is None:
+        return {}, {'row': row}
+    arrays, tz = trades_to_arrays(trades)
+    return arrays, {'row': row, 'tz': tz, 'trades': True}
+
+def _row_from_payload(arrays: Dict[str, np.ndarray], meta: Dict) -> Dict:
+    row = dict(meta['row'])
+    if meta.get('trades'):
+        row['trades'] = trades_from_arrays(arrays, meta.get('tz'))
+    return row
+
+class SweepPool:
+    """Process pool whose workers share one copy of the indicator arrays
+    
+    Tasks are dicts with 'params' and optional 'start', 'end', 'initial_balance'
+    and 'include_trades'. With max_workers=1 tasks run in-process. Rows already in
+    the backtest cache (same candles, effective config, window and code version) are
+    returned from disk and only the misses are dispatched.
+    """
+    
+    def __init__(self, config, arrays: Dict[str, np.ndarray], index=None, max_workers: int = 1,
+                 cache: Optional[BacktestCache] = None):
+        self.config = config
+        self.arrays = arrays
+        self.index = index
+        self.max_workers = max(1, max_workers)
+        self.shared = None
+        self.executor = None
+        self.cache = cache if cache is not None else BacktestCache.from_config(config)
+        self._data_key = None
+    
+    def _task_key(self, task: Dict) -> str:
+        if self._data_key is None:
+            self._data_key = fingerprint_arrays(self.arrays, self.index)
+        return self.cache.make_key(
+            'sweep', self._data_key, config_fingerprint(ConfigOverride(self.config, **_config_params(task['params']))),
+            task.get('start', 0), task.get('end'), task.get('initial_balance', 10000.0),
+            task.get('include_trades', False)
+        )
+    
+    def __enter__(self):
+        if self.max_workers > 1:
+            payload = dict(self.arrays)
+            ts_ns, tz = _timestamps_payload(self.index)
+            ts_key = None
+            if ts_ns is not None:
+                ts_key = '__timestamps__'
+                payload[ts_key] = ts_ns
+            
+            self.shared = SharedArrays(payload)
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.shared.name, self.shared.layout, self.config, ts_key, tz)
+            )
+        else:
+            _worker_state['arrays'] = self.arrays
+            _worker_state['timestamps'] = self.index if isinstance(self.index, pd.DatetimeIndex) else None
+            _worker_state['base_config'] = self.config
+            _worker_state['backtester'] = Backtester(self.config)
+        return self
+    
+    def _run(self, tasks: List[Dict]) -> List[Dict]:
+        if self.executor is None:
+            return [_evaluate_task(task) for task in tasks]
+        chunksize = max(1, len(tasks) // (self.max_workers * 4))
+        return list(self.executor.map(_evaluate_task, tasks, chunksize=chunksize))
+    
+    def map(self, tasks: List[Dict]) -> List[Dict]:
+        if self.cache is None:
+            return self._run(tasks)
+        
+        keys = [self._task_key(task) for task in tasks]
+        rows: List[Optional[Dict]] = []
+        for key in keys:
+            cached = self.cache.get(key)
+            rows.append(_row_from_payload(*cached) if cached is not None else None)
+        
+        pending = [i for i, row in enumerate(rows) if row is None]
+        if len(pending) < len(tasks):
+            logger.info(f"Sweep cache: {len(tasks) - len(pending)}/{len(tasks)} rows served from cache")
+        
+        for i, row in zip(pending, self._run([tasks[i] for i in pending])):
+            rows[i] = row
+            if 'error' not in row:
+                self.cache.put(keys[i], *_row_payload(row))
+        return rows
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+        _worker_state.clear()
+        return False
+
+class ParameterSweep:
+    """Grid / random-search parameter sweep on top of Backtester
+    
+    Indicator arrays for every EMA period in the search space are computed once,
+    placed in shared memory and evaluated by a process pool.
+    """
+    
+    def __init__(self, config, max_workers: Optional[int] = None):
+        self.config = config
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.indicator_engine = IndicatorEngine(config)
+        logger.info(f"Parameter sweep initialized (max_workers={self.max_workers})")
+    
+    @staticmethod
+    def grid(space: Dict[str, List]) -> List[Dict]:
+        """Cartesian product of {param: [values]}"""
+        names = list(space.keys())
+        return [dict(zip(names, values)) for values in itertools.product(*(space[n] for n in names))]
+    
+    @staticmethod
+    def random_search(space: Dict, n_samples: int, seed: Optional[int] = None) -> List[Dict]:
+        """Sample n_samples parameter sets
+        
+        A list means choose one value, a (low, high) tuple means uniform sampling
+        (integer sampling when both bounds are int).
+        """
+        rng = random.Random(seed)
+        samples = []
+        for _ in range(n_samples):
+            params = {}
+            for name, values in space.items():
+                if isinstance(values, tuple) and len(values) == 2:
+                    low, high = values
+                    if isinstance(low, int) and isinstance(high, int):
+                        params[name] = rng.randint(low, high)
+                    else:
+                        params[name] = rng.uniform(low, high)
+                else:
+                    params[name] = rng.choice(list(values))
+            samples.append(params)
+        return samples
+    
+    def _validate(self, param_sets: List[Dict]):
+        for params in param_sets:
+            unknown = set(params) - SWEEPABLE_PARAMS
+            if unknown:
+                raise ValueError(f"Unsupported sweep parameters: {', '.join(sorted(unknown))}")
+            periods = params.get('EMA_PERIODS')
+            if periods is not None and len(periods) != 3:
+                raise ValueError(f"EMA_PERIODS must contain 3 periods, got {periods}")
+    
+    def compute_arrays(self, df: pd.DataFrame, param_sets: List[Dict]) -> Dict[str, np.ndarray]:
+        ema_periods = set(self.config.EMA_PERIODS)
+        for params in param_sets:
+            ema_periods.update(params.get('EMA_PERIODS', []))
+        return self.indicator_engine.get_indicator_arrays(df, sorted(ema_periods))
+    
+    def run(self, df: pd.DataFrame, param_sets: List[Dict], initial_balance: float = 10000.0,
+            rank_by: str = 'net_profit', ascending: bool = False,
+            arrays: Optional[Dict[str, np.ndarray]] = None) -> pd.DataFrame:
+        """Evaluate every parameter set and return a ranked results table"""
+        if not param_sets:
+            return pd.DataFrame()
+        
+        self._validate(param_sets)
+        
+        started = time.perf_counter()
+        if arrays is None:
+            arrays = self.compute_arrays(df, param_sets)
+        logger.info(f"Sweep: {len(param_sets)} parameter sets over {len(df)} candles "
+                    f"(indicators in {time.perf_counter() - started:.2f}s)")
+        
+        workers = min(self.max_workers, len(param_sets))
+        tasks = [{'params': p, 'initial_balance': initial_balance} for p in param_sets]
+        with SweepPool(self.config, arrays, df.index, workers) as pool:
+            rows = pool.map(tasks)
+        
+        failed = [r for r in rows if 'error' in r]
+        if failed:
+            logger.warning(f"Sweep: {len(failed)} parameter sets failed, first error: {failed[0]['error']}")
+        
+        table = pd.DataFrame(rows)
+        if rank_by in table.columns:
+            table = table.sort_values(rank_by, ascending=ascending, kind='mergesort').reset_index(drop=True)
+        table.insert(0, 'rank', range(1, len(table) + 1))
+        
+        logger.info(f"Sweep completed in {time.perf_counter() - started:.2f}s")
+        return table
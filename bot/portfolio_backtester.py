@@ -0,0 +1,374 @@
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from config import ConfigOverride
+from bot.logger import setup_logger
+from bot.indicators import IndicatorEngine
+from bot.strategy import TradingStrategy
+from bot.pair_config import PairConfigManager, TradingPairConfig
+from bot.backtester import Backtester, BacktestResult, BacktestTrade, _find_exit, _managed_exit
+from bot import position_engine
+
+logger = setup_logger('PortfolioBacktester')
+
+NS_PER_DAY = 86_400_000_000_000
+JAKARTA_OFFSET_NS = 7 * 3_600_000_000_000
+
+class PortfolioLimits:
+    """Risk limits shared by all pairs; any limit set couples the pairs into one loop"""
+    
+    def __init__(self, max_open_positions: Optional[int] = None, max_trades_per_day: Optional[int] = None,
+                 daily_loss_percent: Optional[float] = None):
+        self.max_open_positions = max_open_positions
+        self.max_trades_per_day = max_trades_per_day
+        self.daily_loss_percent = daily_loss_percent
+    
+    @classmethod
+    def from_config(cls, config) -> 'PortfolioLimits':
+        max_trades = config.MAX_TRADES_PER_DAY
+        return cls(
+            max_open_positions=config.PORTFOLIO_MAX_OPEN_POSITIONS or None,
+            max_trades_per_day=max_trades if 0 < max_trades < 999999 else None,
+            daily_loss_percent=config.DAILY_LOSS_PERCENT or None
+        )
+    
+    @property
+    def coupled(self) -> bool:
+        return any(v is not None for v in (self.max_open_positions, self.max_trades_per_day,
+                                           self.daily_loss_percent))
+
+def pair_config_override(config, pair: TradingPairConfig, lot_size: float):
+    """Config view with the pair's economics in place of the XAUUSD constants"""
+    return ConfigOverride(
+        config,
+        XAUUSD_PIP_VALUE=pair.pip_value,
+        LOT_SIZE=lot_size,
+        DEFAULT_SL_PIPS=pair.default_sl_pips,
+        DEFAULT_TP_PIPS=pair.default_tp_pips,
+        MAX_SPREAD_PIPS=pair.max_spread_pips
+    )
+
+class PairData:
+    """One pair's candles, signals and economics, ready for the portfolio loop"""
+    
+    def __init__(self, symbol: str, pair: TradingPairConfig, config, lot_size: float, index: pd.DatetimeIndex,
+                 close: np.ndarray, high: np.ndarray, low: np.ndarray, spread: np.ndarray,
+                 direction: np.ndarray, stop_loss: np.ndarray, take_profit: np.ndarray,
+                 signal_bars: np.ndarray, rules: Optional[position_engine.PositionRules], spread_rejections: int):
+        self.symbol = symbol
+        self.pair = pair
+        self.config = config
+        self.lot_size = lot_size
+        self.index = index
+        self.times = index.as_unit('ns').asi8
+        self.close = close
+        self.high = high
+        self.low = low
+        self.spread = spread
+        self.direction = direction
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.signal_bars = signal_bars
+        self.rules = rules
+        self.spread_rejections = spread_rejections
+    
+    def resolve(self, entry: int) -> Tuple[int, float, int]:
+        """Exit (bar, price, code) of a trade opened at bar entry; depends on this pair only"""
+        n = len(self.close)
+        is_buy = self.direction[entry] > 0
+        code = position_engine.HOLD
+        if self.rules is not None:
+            bar, exit_price, code = _managed_exit(self.rules, is_buy, float(self.close[entry]),
+                                                  float(self.stop_loss[entry]), float(self.take_profit[entry]),
+                                                  self.high, self.low, self.close, entry, n)
+        else:
+            bar, exit_price = _find_exit(is_buy, self.stop_loss[entry], self.take_profit[entry],
+                                         self.high, self.low, entry, n)
+        if bar < 0:
+            bar, exit_price = n - 1, self.close[n - 1]
+        return bar, float(exit_price), code
+    
+    def close_trade(self, entry: int, bar: int, exit_price: float, code: int) -> BacktestTrade:
+        """BacktestTrade with this pair's lot size, spread, commission and swap applied"""
+        pair = self.pair
+        is_buy = self.direction[entry] > 0
+        trade = BacktestTrade(
+            signal_type='BUY' if is_buy else 'SELL',
+            entry_price=float(self.close[entry]),
+            entry_time=self.index[entry],
+            stop_loss=float(self.stop_loss[entry]),
+            take_profit=float(self.take_profit[entry]),
+            symbol=self.symbol,
+            lot_size=self.lot_size
+        )
+        nights = int((self.times[bar] // NS_PER_DAY) - (self.times[entry] // NS_PER_DAY))
+        swap = (pair.swap_long if is_buy else pair.swap_short) * self.lot_size * nights
+        costs = (float(self.spread[entry]) * pair.pip_value * self.lot_size
+                 + pair.commission_per_lot * self.lot_size - swap)
+        trade.close_trade(exit_price, self.index[bar], pair.pip_value, costs)
+        if trade.result == 'UNKNOWN' and code != position_engine.HOLD:
+            trade.result = 'WIN' if trade.profit_loss > 0 else 'LOSS'
+        return trade
+
+def _prepare_pair(task: Dict) -> PairData:
+    pair: TradingPairConfig = task['pair']
+    df: pd.DataFrame = task['df']
+    config = task['config']
+    strategy = TradingStrategy(config)
+    
+    arrays = IndicatorEngine(config).get_indicator_arrays(df)
+    signals = strategy.detect_signals_vectorized(arrays, 'auto')
+    
+    spread = df['spread'].to_numpy(dtype=np.float64) if 'spread' in df.columns else np.zeros(len(df))
+    direction = signals['direction'].copy()
+    too_wide = (direction != 0) & (spread * pair.pip_value > pair.max_spread_pips)
+    direction[too_wide] = 0
+    
+    start = Backtester(config).first_tradable_index(strategy)
+    signal_bars = np.flatnonzero(direction[start:] != 0) + start
+    manage_positions = task['manage_positions']
+    if manage_positions is None:
+        manage_positions = config.BACKTEST_POSITION_MANAGEMENT
+    
+    index = df.index if df.index.tz is not None else df.index.tz_localize('UTC')
+    return PairData(
+        task['symbol'], pair, config, task['lot_size'], index,
+        arrays['close'], arrays['high'], arrays['low'], spread,
+        direction, signals['stop_loss'], signals['take_profit'], signal_bars,
+        position_engine.PositionRules(config) if manage_positions else None,
+        int(too_wide[start:].sum())
+    )
+
+def _simulate(pairs: List[PairData], limits: PortfolioLimits,
+              initial_balance: float) -> Tuple[List[BacktestTrade], Dict[str, int]]:
+    """Walk all pairs' entry candidates in time order, applying the shared limits
+    
+    A trade's exit only depends on its own pair, so it is resolved when the trade is
+    opened and its P/L is realized (for the daily-loss limit) once the loop reaches its
+    exit time. Each pair holds at most one position, like Backtester.
+    """
+    trades: List[BacktestTrade] = []
+    rejected = {'spread': sum(p.spread_rejections for p in pairs), 'max_open_positions': 0,
+                'max_trades_per_day': 0, 'daily_loss': 0}
+    
+    candidates = []
+    for p, data in enumerate(pairs):
+        if len(data.signal_bars):
+            candidates.append((int(data.times[data.signal_bars[0]]), p, 0))
+    heapq.heapify(candidates)
+    
+    open_positions = []
+    balance = initial_balance
+    realized_by_day: Dict[int, float] = {}
+    day = None
+    day_trades = 0
+    
+    while candidates:
+        entry_ns, p, k = heapq.heappop(candidates)
+        data = pairs[p]
+        entry = int(data.signal_bars[k])
+        
+        while open_positions and open_positions[0][0] <= entry_ns:
+            exit_ns, _, pl = heapq.heappop(open_positions)
+            balance += pl
+            exit_day = (exit_ns + JAKARTA_OFFSET_NS) // NS_PER_DAY
+            realized_by_day[exit_day] = realized_by_day.get(exit_day, 0.0) + pl
+        
+        entry_day = (entry_ns + JAKARTA_OFFSET_NS) // NS_PER_DAY
+        if entry_day != day:
+            day = entry_day
+            day_trades = 0
+        day_pl = realized_by_day.get(day, 0.0)
+        day_start_balance = balance - day_pl
+        
+        reason = None
+        if limits.max_open_positions is not None and len(open_positions) >= limits.max_open_positions:
+            reason = 'max_open_positions'
+        elif limits.max_trades_per_day is not None and day_trades >= limits.max_trades_per_day:
+            reason = 'max_trades_per_day'
+        elif (limits.daily_loss_percent is not None and day_pl < 0
+              and -day_pl >= day_start_balance * limits.daily_loss_percent / 100):
+            reason = 'daily_loss'
+        
+        if reason is not None:
+            rejected[reason] += 1
+            next_k = k + 1
+        else:
+            bar, exit_price, code = data.resolve(entry)
+            trade = data.close_trade(entry, bar, exit_price, code)
+            trades.append(trade)
+            day_trades += 1
+            heapq.heappush(open_positions, (int(data.times[bar]), len(trades), trade.profit_loss))
+            next_k = int(np.searchsorted(data.signal_bars, bar, side='right'))
+        
+        if next_k < len(data.signal_bars):
+            heapq.heappush(candidates, (int(data.times[data.signal_bars[next_k]]), p, next_k))
+    
+    return trades, rejected
+
+def _run_pair(task: Dict) -> Tuple[str, List[BacktestTrade], Dict[str, int]]:
+    """Uncoupled mode: one pair prepared and simulated entirely inside a worker"""
+    data = _prepare_pair(task)
+    trades, rejected = _simulate([data], PortfolioLimits(), task['initial_balance'])
+    return data.symbol, trades, rejected
+
+class PortfolioResult:
+    def __init__(self, pair_results: Dict[str, BacktestResult], portfolio: BacktestResult,
+                 equity_curve: pd.Series, correlation: pd.DataFrame, rejected: Dict[str, int], coupled: bool):
+        self.pair_results = pair_results
+        self.portfolio = portfolio
+        self.equity_curve = equity_curve
+        self.correlation = correlation
+        self.rejected = rejected
+        self.coupled = coupled
+    
+    def to_dict(self) -> Dict:
+        return {
+            'portfolio': self.portfolio.to_dict(),
+            'pairs': {symbol: result.to_dict() for symbol, result in self.pair_results.items()},
+            'correlation': self.correlation.round(4).to_dict(),
+            'rejected': dict(self.rejected),
+            'coupled': self.coupled
+        }
+    
+    def format_report(self) -> str:
+        portfolio = self.portfolio
+        report = "💼 *Portfolio Backtest Results*\n\n"
+        report += f"Pairs: {', '.join(self.pair_results) or '-'}\n"
+        report += f"Net Profit: ${portfolio.net_profit:,.2f}\n"
+        report += f"Total Trades: {portfolio.total_trades}\n"
+        report += f"Win Rate: {portfolio.win_rate:.1f}%\n"
+        report += f"Max Drawdown: {portfolio.max_drawdown:.2f}%\n"
+        report += f"Sharpe Ratio: {portfolio.sharpe_ratio:.2f}\n\n"
+        
+        report += f"*Per Pair:*\n"
+        for symbol, result in self.pair_results.items():
+            report += (f"{symbol}: ${result.net_profit:,.2f} ({result.total_trades} trades, "
+                       f"WR {result.win_rate:.1f}%)\n")
+        
+        if len(self.correlation) > 1:
+            report += f"\n*Daily Return Correlation:*\n"
+            symbols = list(self.correlation.columns)
+            for i, a in enumerate(symbols):
+                for b in symbols[i + 1:]:
+                    report += f"{a}/{b}: {self.correlation.loc[a, b]:.2f}\n"
+        
+        skipped = {k: v for k, v in self.rejected.items() if v}
+        if skipped:
+            report += f"\n*Skipped Signals:*\n"
+            for reason, count in skipped.items():
+                report += f"{reason}: {count}\n"
+        
+        return report
+
+class PortfolioBacktester:
+    """Backtest every enabled pair of PairConfigManager as one portfolio
+    
+    Each pair trades with its own pip value, lot size (default_lot within min/max),
+    spread filter/cost (optional 'spread' column, in price units), commission and swap.
+    With shared PortfolioLimits the pairs run in one time-ordered loop (signals are
+    still prepared in parallel); without them pairs are independent and each runs in
+    its own process.
+    """
+    
+    def __init__(self, config, pair_manager: Optional[PairConfigManager] = None, max_workers: Optional[int] = None):
+        self.config = config
+        self.pair_manager = pair_manager or PairConfigManager(config)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        logger.info(f"Portfolio backtester initialized (max_workers={self.max_workers})")
+    
+    def lot_size(self, pair: TradingPairConfig, lot_size: Optional[float] = None) -> float:
+        return min(max(lot_size if lot_size is not None else pair.default_lot, pair.min_lot), pair.max_lot)
+    
+    def _map(self, fn, tasks: List[Dict]) -> List:
+        workers = min(self.max_workers, len(tasks))
+        if workers <= 1:
+            return [fn(task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fn, tasks))
+    
+    def run(self, data: Dict[str, pd.DataFrame], initial_balance: float = 10000.0,
+            limits: Optional[PortfolioLimits] = None, lot_sizes: Optional[Dict[str, float]] = None,
+            symbols: Optional[List[str]] = None, manage_positions: Optional[bool] = None) -> PortfolioResult:
+        """Backtest the enabled pairs (or `symbols`) that have candles in data"""
+        started = time.perf_counter()
+        limits = limits if limits is not None else PortfolioLimits.from_config(self.config)
+        lot_sizes = lot_sizes or {}
+        
+        if symbols is None:
+            pairs = self.pair_manager.get_enabled_pairs()
+        else:
+            pairs = [self.pair_manager.get_pair(s) for s in symbols]
+            unknown = [s for s, pair in zip(symbols, pairs) if pair is None]
+            if unknown:
+                raise ValueError(f"Unknown pairs: {', '.join(unknown)}")
+        
+        tasks = []
+        for pair in pairs:
+            df = data.get(pair.symbol)
+            if df is None or df.empty:
+                logger.warning(f"Portfolio backtest: no candles for {pair.symbol}, skipped")
+                continue
+            lot_size = self.lot_size(pair, lot_sizes.get(pair.symbol))
+            tasks.append({
+                'symbol': pair.symbol,
+                'pair': pair,
+                'config': pair_config_override(self.config, pair, lot_size),
+                'lot_size': lot_size,
+                'df': df,
+                'manage_positions': manage_positions,
+                'initial_balance': initial_balance
+            })
+        
+        if limits.coupled:
+            prepared = self._map(_prepare_pair, tasks)
+            trades, rejected = _simulate(prepared, limits, initial_balance)
+        else:
+            trades = []
+            rejected = {}
+            for _, pair_trades, pair_rejected in self._map(_run_pair, tasks):
+                trades.extend(pair_trades)
+                for reason, count in pair_rejected.items():
+                    rejected[reason] = rejected.get(reason, 0) + count
+        
+        result = self._build_result(tasks, trades, rejected, initial_balance, limits.coupled)
+        
+        logger.info(f"Portfolio backtest: {len(tasks)} pair(s), {result.portfolio.total_trades} trades, "
+                    f"net ${result.portfolio.net_profit:.2f} ({'shared limits' if limits.coupled else 'independent'}) "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return result
+    
+    def _build_result(self, tasks: List[Dict], trades: List[BacktestTrade], rejected: Dict[str, int],
+                      initial_balance: float, coupled: bool) -> PortfolioResult:
+        pair_results = {}
+        for task in tasks:
+            result = BacktestResult()
+            result.initial_balance = initial_balance
+            result.trades = [t for t in trades if t.symbol == task['symbol']]
+            result.calculate_metrics()
+            pair_results[task['symbol']] = result
+        
+        # Portfolio equity is realized in exit order across all pairs
+        ordered = sorted(trades, key=lambda t: t.exit_time)
+        portfolio = BacktestResult()
+        portfolio.initial_balance = initial_balance
+        portfolio.trades = ordered
+        portfolio.calculate_metrics()
+        
+        if ordered:
+            exit_index = pd.DatetimeIndex([t.exit_time for t in ordered])
+            pl = np.array([t.profit_loss for t in ordered])
+            equity_curve = pd.Series(initial_balance + np.cumsum(pl), index=exit_index, name='equity')
+            daily = pd.DataFrame({'symbol': [t.symbol for t in ordered], 'pl': pl},
+                                 index=exit_index.tz_convert('UTC').normalize())
+            daily_pl = daily.pivot_table(index=daily.index, columns='symbol', values='pl', aggfunc='sum').fillna(0.0)
+            correlation = daily_pl.corr()
+        else:
+            equity_curve = pd.Series(dtype=np.float64, name='equity')
+            correlation = pd.DataFrame()
+        
+        return PortfolioResult(pair_results, portfolio, equity_curve, correlation, rejected, coupled)
@@ -0,0 +1,173 @@
+"""Pure position-management rules shared by PositionTracker and the backtesters
+
+Everything here works on plain floats: no dicts, no database, no I/O. The live
+tracker calls these functions on every tick and the backtesters call the same
+functions at the bars/ticks where something can change, so both apply dynamic SL
+tightening, trailing stops and SL/TP exits identically.
+"""
+import math
+from typing import Tuple
+import numpy as np
+
+HOLD = 0
+TP_HIT = 1
+SL_HIT = 2
+DYNAMIC_SL_HIT = 3
+
+EXIT_REASONS = {TP_HIT: 'TP_HIT', SL_HIT: 'SL_HIT', DYNAMIC_SL_HIT: 'DYNAMIC_SL_HIT'}
+
+NO_ADJUSTMENT = 0
+DYNAMIC_SL = 1
+TRAILING_STOP = 2
+
+class PositionRules:
+    """Config values the rules need, read once"""
+    
+    __slots__ = ('pip_value', 'lot_size', 'dynamic_sl_threshold', 'dynamic_sl_multiplier',
+                 'trailing_threshold', 'trailing_distance')
+    
+    def __init__(self, config, lot_size: float = None):
+        self.pip_value = config.XAUUSD_PIP_VALUE
+        self.lot_size = config.LOT_SIZE if lot_size is None else lot_size
+        self.dynamic_sl_threshold = config.DYNAMIC_SL_LOSS_THRESHOLD
+        self.dynamic_sl_multiplier = config.DYNAMIC_SL_TIGHTENING_MULTIPLIER
+        self.trailing_threshold = config.TRAILING_STOP_PROFIT_THRESHOLD
+        self.trailing_distance = config.TRAILING_STOP_DISTANCE_PIPS / config.XAUUSD_PIP_VALUE
+
+def unrealized_pl(rules: PositionRules, is_buy: bool, entry_price: float, price: float) -> float:
+    """Same arithmetic as RiskManager.calculate_pl"""
+    price_diff = price - entry_price if is_buy else entry_price - price
+    return price_diff * rules.pip_value * rules.lot_size
+
+def dynamic_stop_loss(rules: PositionRules, is_buy: bool, entry_price: float, original_sl: float,
+                      stop_loss: float, pl: float) -> float:
+    """Tightened SL when the loss reaches the threshold, or NaN if SL stays"""
+    if pl >= 0 or abs(pl) < rules.dynamic_sl_threshold:
+        return math.nan
+    
+    new_sl_distance = abs(entry_price - original_sl) * rules.dynamic_sl_multiplier
+    if is_buy:
+        new_stop_loss = entry_price - new_sl_distance
+        return new_stop_loss if new_stop_loss > stop_loss else math.nan
+    new_stop_loss = entry_price + new_sl_distance
+    return new_stop_loss if new_stop_loss < stop_loss else math.nan
+
+def trailing_stop_loss(rules: PositionRules, is_buy: bool, price: float, stop_loss: float, pl: float) -> float:
+    """Trailing SL once profit reaches the threshold, or NaN if SL stays"""
+    if pl <= 0 or pl < rules.trailing_threshold:
+        return math.nan
+    
+    if is_buy:
+        new_stop_loss = price - rules.trailing_distance
+        return new_stop_loss if new_stop_loss > stop_loss else math.nan
+    new_stop_loss = price + rules.trailing_distance
+    return new_stop_loss if new_stop_loss < stop_loss else math.nan
+
+def trailing_max_profit(rules: PositionRules, pl: float, max_profit: float) -> float:
+    """Max profit as tracked while the trailing stop is armed"""
+    if pl <= 0 or pl < rules.trailing_threshold:
+        return max_profit
+    return pl if pl > max_profit else max_profit
+
+def exit_code(is_buy: bool, price: float, stop_loss: float, take_profit: float, sl_adjusted: bool) -> int:
+    """TP is checked before SL; an SL hit right after an adjustment counts as DYNAMIC_SL_HIT"""
+    if is_buy:
+        hit_tp = price >= take_profit
+        hit_sl = price <= stop_loss
+    else:
+        hit_tp = price <= take_profit
+        hit_sl = price >= stop_loss
+    
+    if hit_tp:
+        return TP_HIT
+    if hit_sl:
+        return DYNAMIC_SL_HIT if sl_adjusted else SL_HIT
+    return HOLD
+
+def step(rules: PositionRules, is_buy: bool, entry_price: float, original_sl: float, stop_loss: float,
+         take_profit: float, max_profit: float, price: float) -> Tuple[float, float, int, int, float]:
+    """Apply one price update to a position
+    
+    Returns (stop_loss, max_profit, adjustment, exit_code, unrealized_pl). Dynamic SL
+    takes precedence; the trailing stop is only evaluated when it did not fire.
+    """
+    pl = unrealized_pl(rules, is_buy, entry_price, price)
+    adjustment = NO_ADJUSTMENT
+    
+    new_sl = dynamic_stop_loss(rules, is_buy, entry_price, original_sl, stop_loss, pl)
+    if not math.isnan(new_sl):
+        stop_loss = new_sl
+        adjustment = DYNAMIC_SL
+    else:
+        max_profit = trailing_max_profit(rules, pl, max_profit)
+        new_sl = trailing_stop_loss(rules, is_buy, price, stop_loss, pl)
+        if not math.isnan(new_sl):
+            stop_loss = new_sl
+            adjustment = TRAILING_STOP
+    
+    code = exit_code(is_buy, price, stop_loss, take_profit, adjustment != NO_ADJUSTMENT)
+    return stop_loss, max_profit, adjustment, code, pl
+
+def step_arrays(rules: PositionRules, is_buy: np.ndarray, entry_price: np.ndarray, original_sl: np.ndarray,
+                stop_loss: np.ndarray, take_profit: np.ndarray, max_profit: np.ndarray, price: float,
+                lot_size=None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """step() for many positions at one price, as whole-array expressions
+    
+    lot_size may be an array (one lot per position); it defaults to rules.lot_size.
+    Returns the same (stop_loss, max_profit, adjustment, exit_code, unrealized_pl)
+    tuple as arrays, with identical results to calling step() row by row.
+    """
+    lot_size = rules.lot_size if lot_size is None else lot_size
+    pl = np.where(is_buy, price - entry_price, entry_price - price) * rules.pip_value * lot_size
+    
+    dynamic_distance = np.abs(entry_price - original_sl) * rules.dynamic_sl_multiplier
+    dynamic_sl = np.where(is_buy, entry_price - dynamic_distance, entry_price + dynamic_distance)
+    dynamic = ((pl < 0) & (np.abs(pl) >= rules.dynamic_sl_threshold)
+               & np.where(is_buy, dynamic_sl > stop_loss, dynamic_sl < stop_loss))
+    
+    armed = ~dynamic & (pl > 0) & (pl >= rules.trailing_threshold)
+    new_max_profit = np.where(armed & (pl > max_profit), pl, max_profit)
+    trailing_sl = np.where(is_buy, price - rules.trailing_distance, price + rules.trailing_distance)
+    trailing = armed & np.where(is_buy, trailing_sl > stop_loss, trailing_sl < stop_loss)
+    
+    new_stop_loss = np.where(dynamic, dynamic_sl, np.where(trailing, trailing_sl, stop_loss))
+    adjustment = np.where(dynamic, DYNAMIC_SL, np.where(trailing, TRAILING_STOP, NO_ADJUSTMENT))
+    
+    hit_tp = np.where(is_buy, price >= take_profit, price <= take_profit)
+    hit_sl = np.where(is_buy, price <= new_stop_loss, price >= new_stop_loss)
+    code = np.where(hit_tp, TP_HIT,
+                    np.where(hit_sl, np.where(adjustment != NO_ADJUSTMENT, DYNAMIC_SL_HIT, SL_HIT), HOLD))
+    return new_stop_loss, new_max_profit, adjustment, code, pl
+
+def event_levels(rules: PositionRules, is_buy: bool, entry_price: float, original_sl: float,
+                 stop_loss: float, take_profit: float, max_profit: float) -> Tuple[float, float]:
+    """Price band inside which step() cannot change anything
+    
+    Returns (low_level, high_level): as long as low > low_level and high < high_level,
+    the position state stays exactly the same, so backtesters can skip those bars with
+    a vectorized comparison and only call step() where a level is touched. The band is
+    slightly narrower than the exact one, never wider.
+    """
+    per_price = rules.pip_value * rules.lot_size
+    slack = 1e-9 * abs(entry_price)
+    dynamic_sl_distance = abs(entry_price - original_sl) * rules.dynamic_sl_multiplier
+    trailing_offset = rules.trailing_threshold / per_price if per_price > 0 else math.inf
+    dynamic_offset = rules.dynamic_sl_threshold / per_price if per_price > 0 else math.inf
+    max_profit_offset = max_profit / per_price if per_price > 0 else math.inf
+    
+    if is_buy:
+        low_level = stop_loss
+        if entry_price - dynamic_sl_distance > stop_loss:
+            low_level = max(low_level, entry_price - dynamic_offset + slack)
+        trail_from = max(entry_price + trailing_offset,
+                         min(stop_loss + rules.trailing_distance, entry_price + max_profit_offset))
+        high_level = min(take_profit, trail_from - slack)
+        return low_level, high_level
+    
+    high_level = stop_loss
+    if entry_price + dynamic_sl_distance < stop_loss:
+        high_level = min(high_level, entry_price + dynamic_offset - slack)
+    trail_from = min(entry_price - trailing_offset,
+                     max(stop_loss - rules.trailing_distance, entry_price - max_profit_offset))
+    low_level = max(take_profit, trail_from + slack)
+    return low_level, high_level
@@ -0,0 +1,217 @@
+import json
+from typing import Dict, List, Optional
+from sqlalchemy import func
+from bot.logger import setup_logger
+from bot.database import PositionEvent, PositionSnapshot
+
+logger = setup_logger('PositionLog')
+
+EVENT_OPEN = 'OPEN'
+EVENT_SL_MOVED = 'SL_MOVED'
+EVENT_MAX_PROFIT = 'MAX_PROFIT'
+EVENT_CLOSE = 'CLOSE'
+
+# Snapshots older than the newest few are pruned, events are kept as history
+SNAPSHOTS_KEPT = 2
+
+def apply_event(state: Dict[int, Dict], event: Dict):
+    """Fold one event into {position_id: {stop_loss, max_profit, sl_adjustment_count, ...}}"""
+    position_id = event['position_id']
+    if event['event_type'] == EVENT_CLOSE:
+        state.pop(position_id, None)
+        return
+    entry = state.setdefault(position_id, {'user_id': event['user_id']})
+    if event['event_type'] in (EVENT_OPEN, EVENT_SL_MOVED):
+        entry['stop_loss'] = event['stop_loss']
+        entry['sl_adjustment_count'] = event['sl_adjustment_count']
+    max_profit = event['max_profit']
+    if max_profit is not None and max_profit > entry.get('max_profit', 0.0):
+        entry['max_profit'] = max_profit
+    elif 'max_profit' not in entry:
+        entry['max_profit'] = 0.0
+
+class PositionEventLog:
+    """Append-only log of position state changes with periodic snapshots
+    
+    Opens, SL moves and closes are appended in order; max profit changes are
+    coalesced per position until the next flush. flush() writes everything pending
+    as one executemany INSERT, so the hot path only does sequential appends. Every
+    `snapshot_every` events the folded state of the open positions is stored, and
+    load() rebuilds that state from the newest snapshot plus the events after it.
+    The positions table stays authoritative for which positions are open; the log
+    restores their SL / max profit and keeps the full SL history.
+    Durability follows POSITION_WRITE_DURABILITY: in 'sl' and 'full' an SL move is
+    appended right away.
+    """
+    
+    def __init__(self, db_manager, durability: str = 'sl', snapshot_every: int = 1000):
+        self.db = db_manager
+        self.durability = durability
+        self.snapshot_every = max(snapshot_every, 1)
+        self.state: Dict[int, Dict] = {}
+        self._pending: List[Dict] = []
+        self._max_profit: Dict[int, Dict] = {}
+        self.events_since_snapshot = 0
+        self.events_written = 0
+        self.flushes = 0
+        self.snapshots = 0
+        self.failed_flushes = 0
+        self._insert = PositionEvent.__table__.insert()
+    
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._max_profit)
+    
+    def _event(self, event_type: str, position_id: int, user_id: int, price: Optional[float],
+               stop_loss: Optional[float], max_profit: Optional[float], sl_adjustment_count: Optional[int],
+               created_at) -> Dict:
+        return {
+            'position_id': position_id,
+            'user_id': user_id,
+            'event_type': event_type,
+            'price': price,
+            'stop_loss': stop_loss,
+            'max_profit': max_profit,
+            'sl_adjustment_count': sl_adjustment_count,
+            'created_at': created_at
+        }
+    
+    def record_open(self, position_id: int, user_id: int, price: float, stop_loss: float, created_at):
+        self._pending.append(self._event(EVENT_OPEN, position_id, user_id, price, stop_loss, 0.0, 0, created_at))
+        if self.durability == 'full':
+            self.flush()
+    
+    def record_sl_move(self, position_id: int, user_id: int, price: float, stop_loss: float, max_profit: float,
+                       sl_adjustment_count: int, created_at):
+        self._pending.append(self._event(EVENT_SL_MOVED, position_id, user_id, price, stop_loss, max_profit,
+                                         sl_adjustment_count, created_at))
+        if self.durability in ('sl', 'full'):
+            self.flush()
+    
+    def record_max_profit(self, position_id: int, user_id: int, price: float, max_profit: float, created_at):
+        self._max_profit[position_id] = self._event(EVENT_MAX_PROFIT, position_id, user_id, price, None,
+                                                    max_profit, None, created_at)
+        if self.durability == 'full':
+            self.flush()
+    
+    def record_close(self, position_id: int, user_id: int, price: float, created_at):
+        """Queue the close after whatever is still pending for the position
+        
+        Not flushed on its own: the positions row is already CLOSED, and recovery drops
+        positions the database no longer has open."""
+        self._max_profit.pop(position_id, None)
+        self._pending.append(self._event(EVENT_CLOSE, position_id, user_id, price, None, None, None, created_at))
+        if self.durability == 'full':
+            self.flush()
+    
+    def flush(self) -> int:
+        """Append every pending event in one transaction, returning the number of events"""
+        if not self._pending and not self._max_profit:
+            return 0
+        events = self._pending + list(self._max_profit.values())
+        self._pending = []
+        self._max_profit = {}
+        
+        session = self.db.get_session()
+        try:
+            session.execute(self._insert, events)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error appending {len(events)} position events: {e}")
+            session.rollback()
+            self.failed_flushes += 1
+            self._pending = [event for event in events if event['event_type'] != EVENT_MAX_PROFIT] + self._pending
+            for event in events:
+                if event['event_type'] == EVENT_MAX_PROFIT:
+                    self._max_profit.setdefault(event['position_id'], event)
+            return 0
+        finally:
+            session.close()
+        
+        for event in events:
+            apply_event(self.state, event)
+        self.flushes += 1
+        self.events_written += len(events)
+        self.events_since_snapshot += len(events)
+        if self.events_since_snapshot >= self.snapshot_every:
+            self.snapshot()
+        return len(events)
+    
+    def snapshot(self) -> bool:
+        """Store the folded state of the open positions as of the last written event"""
+        session = self.db.get_session()
+        try:
+            last_event_id = session.query(func.max(PositionEvent.id)).scalar() or 0
+            snapshot = PositionSnapshot(last_event_id=last_event_id, positions=json.dumps(self.state))
+            session.add(snapshot)
+            session.flush()
+            session.query(PositionSnapshot).filter(
+                PositionSnapshot.id <= snapshot.id - SNAPSHOTS_KEPT
+            ).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error writing position snapshot: {e}")
+            session.rollback()
+            return False
+        finally:
+            session.close()
+        
+        self.snapshots += 1
+        self.events_since_snapshot = 0
+        logger.debug(f"Position snapshot at event {last_event_id}: {len(self.state)} open positions")
+        return True
+    
+    def load(self) -> Dict[int, Dict]:
+        """Rebuild the state from the newest snapshot and replay the events written after it"""
+        session = self.db.get_session()
+        try:
+            snapshot = session.query(PositionSnapshot).order_by(PositionSnapshot.id.desc()).first()
+            state = {}
+            last_event_id = 0
+            if snapshot is not None:
+                state = {int(position_id): entry for position_id, entry in json.loads(snapshot.positions).items()}
+                last_event_id = snapshot.last_event_id
+            
+            table = PositionEvent.__table__
+            rows = session.execute(
+                table.select().where(table.c.id > last_event_id).order_by(table.c.id)
+            ).mappings().all()
+        except Exception as e:
+            logger.error(f"Error replaying position events: {e}")
+            return {}
+        finally:
+            session.close()
+        
+        for row in rows:
+            apply_event(state, row)
+        self.state = state
+        self.events_since_snapshot = len(rows)
+        logger.info(f"Position log replayed {len(rows)} events after snapshot at event {last_event_id}")
+        return state
+    
+    def sl_history(self, position_id: int) -> List[Dict]:
+        """Every SL level a position went through, oldest first (for analytics)"""
+        session = self.db.get_session()
+        try:
+            rows = session.query(PositionEvent).filter(
+                PositionEvent.position_id == position_id,
+                PositionEvent.event_type.in_((EVENT_OPEN, EVENT_SL_MOVED))
+            ).order_by(PositionEvent.id).all()
+            return [{
+                'event_type': row.event_type,
+                'price': row.price,
+                'stop_loss': row.stop_loss,
+                'max_profit': row.max_profit,
+                'sl_adjustment_count': row.sl_adjustment_count,
+                'created_at': row.created_at
+            } for row in rows]
+        finally:
+            session.close()
+    
+    def get_stats(self) -> Dict:
+        return {
+            'pending': len(self),
+            'events_written': self.events_written,
+            'flushes': self.flushes,
+            'snapshots': self.snapshots,
+            'failed_flushes': self.failed_flushes
+        }
@@ -0,0 +1,101 @@
+from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Iterator, Mapping, Optional
+
+POSITION_OPEN = 'OPEN'
+POSITION_CLOSING = 'CLOSING'
+
+_NO_POSITIONS: Mapping = MappingProxyType({})
+
+class PositionRecord:
+    """In-memory state of one open position"""
+    
+    __slots__ = ('id', 'user_id', 'trade_id', 'signal_type', 'is_buy', 'entry_price', 'stop_loss', 'take_profit',
+                 'original_sl', 'sl_adjustment_count', 'max_profit_reached', 'last_price_update', 'state',
+                 'range_seq')
+    
+    def __init__(self, id: int, user_id: int, trade_id: int, signal_type: str, entry_price: float,
+                 stop_loss: float, take_profit: float, original_sl: Optional[float] = None,
+                 sl_adjustment_count: int = 0, max_profit_reached: float = 0.0,
+                 last_price_update: Optional[datetime] = None):
+        self.id = id
+        self.user_id = user_id
+        self.trade_id = trade_id
+        self.signal_type = signal_type
+        self.is_buy = signal_type == 'BUY'
+        self.entry_price = entry_price
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.original_sl = stop_loss if original_sl is None else original_sl
+        self.sl_adjustment_count = sl_adjustment_count or 0
+        self.max_profit_reached = max_profit_reached or 0.0
+        self.last_price_update = last_price_update
+        self.state = POSITION_OPEN
+        # First observed price range (PositionTracker._range_seq) this position may be checked against
+        self.range_seq = 0
+    
+    def __repr__(self) -> str:
+        return (f"PositionRecord(id={self.id}, user_id={self.user_id}, {self.signal_type} @{self.entry_price}, "
+                f"sl={self.stop_loss}, tp={self.take_profit}, state={self.state})")
+
+class PositionStore:
+    """Open position records indexed by position id and by user
+    
+    Callers get read-only mappings (for_user(), by_user) that stay live, so listing a
+    user's positions never copies anything. Only the tracker adds and removes records.
+    """
+    
+    def __init__(self):
+        self._by_id: Dict[int, PositionRecord] = {}
+        self._by_user: Dict[int, Dict[int, PositionRecord]] = {}
+        self._user_views: Dict[int, Mapping[int, PositionRecord]] = {}
+        self.by_user: Mapping[int, Mapping[int, PositionRecord]] = MappingProxyType(self._user_views)
+    
+    def __len__(self) -> int:
+        return len(self._by_id)
+    
+    def __contains__(self, position_id) -> bool:
+        return position_id in self._by_id
+    
+    def __iter__(self) -> Iterator[PositionRecord]:
+        return iter(self._by_id.values())
+    
+    def add(self, record: PositionRecord):
+        self.remove(record.id)
+        self._by_id[record.id] = record
+        positions = self._by_user.get(record.user_id)
+        if positions is None:
+            positions = self._by_user[record.user_id] = {}
+            self._user_views[record.user_id] = MappingProxyType(positions)
+        positions[record.id] = record
+    
+    def remove(self, position_id: int) -> Optional[PositionRecord]:
+        record = self._by_id.pop(position_id, None)
+        if record is None:
+            return None
+        positions = self._by_user[record.user_id]
+        del positions[position_id]
+        if not positions:
+            del self._by_user[record.user_id]
+            del self._user_views[record.user_id]
+        return record
+    
+    def clear(self):
+        self._by_id.clear()
+        self._by_user.clear()
+        self._user_views.clear()
+    
+    def get(self, position_id: int, user_id: Optional[int] = None) -> Optional[PositionRecord]:
+        """The record, or None if it is not open (or belongs to another user)"""
+        record = self._by_id.get(position_id)
+        if record is None or (user_id is not None and record.user_id != user_id):
+            return None
+        return record
+    
+    def for_user(self, user_id: int) -> Mapping[int, PositionRecord]:
+        return self._user_views.get(user_id, _NO_POSITIONS)
+    
+    def count(self, user_id: Optional[int] = None) -> int:
+        if user_id is None:
+            return len(self._by_id)
+        return len(self._by_user.get(user_id, ()))
@@ -1,15 +1,27 @@
 import asyncio
-from datetime import datetime
-from typing import Dict, Optional
-import pytz
+import math
+from functools import partial
+from typing import Dict, List, Mapping, Optional, Tuple
 from bot.logger import setup_logger
+from bot.clock import Clock, RealClock
 from bot.database import Position, Trade
+from bot import position_engine
+from bot.trigger_index import PriceTriggerIndex
+from bot.open_book import BookChange, OpenBook
+from bot.position_store import POSITION_CLOSING, POSITION_OPEN, PositionRecord, PositionStore
+from bot.write_behind import PositionWriteBuffer
+from bot.position_log import PositionEventLog
+from bot.notification_queue import NotificationQueue
+from bot.sl_notifier import SLNotificationThrottle
 
 logger = setup_logger('PositionTracker')
 
+# The 10s sweep only evaluates positions itself when the tick stream has been quiet this long
+SWEEP_STALE_SECONDS = 10
+
 class PositionTracker:
     def __init__(self, config, db_manager, risk_manager, alert_system=None, user_manager=None, 
-                 chart_generator=None, market_data=None, telegram_app=None):
+                 chart_generator=None, market_data=None, telegram_app=None, clock: Optional[Clock] = None):
         self.config = config
         self.db = db_manager
         self.risk_manager = risk_manager
@@ -18,20 +30,116 @@ class PositionTracker:
         self.chart_generator = chart_generator
         self.market_data = market_data
         self.telegram_app = telegram_app
-        self.active_positions = {}
+        self.clock = clock or RealClock()
+        self.positions = PositionStore()
         self.monitoring = False
+        self.position_rules = position_engine.PositionRules(config)
+        self.trigger_index = PriceTriggerIndex()
+        self.book = OpenBook(self.position_rules)
+        self.write_buffer = PositionWriteBuffer(db_manager, config.POSITION_WRITE_DURABILITY)
+        self.event_log = None
+        if config.POSITION_EVENT_LOG:
+            self.event_log = PositionEventLog(db_manager, self.write_buffer.durability, config.POSITION_SNAPSHOT_EVERY)
+        self.flush_interval = max(config.POSITION_FLUSH_INTERVAL_MS, 10) / 1000.0
+        self.notifications = NotificationQueue('notifications', config.NOTIFICATION_WORKERS,
+                                               config.NOTIFICATION_QUEUE_SIZE)
+        self.sl_notifier = SLNotificationThrottle(self.notifications, self.clock, self._send_sl_notification,
+                                                  config.SL_NOTIFICATION_WINDOW_SECONDS)
+        self.eval_interval = max(config.POSITION_EVAL_INTERVAL_MS, 0) / 1000.0
+        self.last_price_time = None
+        self._last_eval_time = None
+        self._last_observed = None
+        self._range_low = None
+        self._range_high = None
+        self._range_seq = 0
+        self._closed_ranges: List[Tuple[float, float, int]] = []
+        self._tick_queue = None
+        self.engine_stats = {
+            'prices': 0,
+            'evaluations': 0,
+            'evaluations_saved': 0,
+            'rows_changed': 0,
+            'sweeps_run': 0,
+            'sweeps_skipped': 0,
+            'intrabar_ranges': 0,
+            'duplicate_closes': 0
+        }
+    
+    def _index_position(self, record: PositionRecord):
+        """(Re)compute the price levels at which this position next needs an update"""
+        low_level, high_level = position_engine.event_levels(
+            self.position_rules, record.is_buy, record.entry_price, record.original_sl,
+            record.stop_loss, record.take_profit, record.max_profit_reached
+        )
+        if math.isnan(low_level):
+            low_level = math.inf
+        if math.isnan(high_level):
+            high_level = -math.inf
+        self.trigger_index.set(record.id, low_level, high_level)
     
-    def _normalize_position_dict(self, pos: Dict) -> Dict:
-        """Ensure all required keys exist in position dict with safe defaults"""
-        if 'original_sl' not in pos or pos['original_sl'] is None:
-            pos['original_sl'] = pos.get('stop_loss', 0.0)
-        if 'sl_adjustment_count' not in pos or pos['sl_adjustment_count'] is None:
-            pos['sl_adjustment_count'] = 0
-        if 'max_profit_reached' not in pos or pos['max_profit_reached'] is None:
-            pos['max_profit_reached'] = 0.0
-        if 'last_price_update' not in pos:
-            pos['last_price_update'] = datetime.now(pytz.UTC)
-        return pos
+    def _track_position(self, record: PositionRecord):
+        """Put a position in memory: record store, open book and trigger index
+        
+        A price range still pending evaluation is closed first, so the new position is
+        only checked against prices observed after it opened.
+        """
+        if self._range_low is not None:
+            self._closed_ranges.append((self._range_low, self._range_high, self._range_seq))
+            self._range_low = self._range_high = None
+            self._range_seq += 1
+        record.range_seq = self._range_seq
+        self.positions.add(record)
+        self.book.add(record.id, record.is_buy, record.entry_price, record.stop_loss, record.take_profit,
+                      record.original_sl, record.max_profit_reached, record.sl_adjustment_count)
+        self._index_position(record)
+        
+    def load_active_positions(self) -> int:
+        """Rehydrate ACTIVE positions from the database (one query on the status index)
+        
+        Called at startup before the tick stream starts so positions opened before a
+        restart keep being monitored and closed. Positions already in memory are kept.
+        With the event log on, SL / max profit come from its snapshot + replay, which
+        also covers SL moves whose positions row update had not been flushed yet.
+        """
+        logged = self.event_log.load() if self.event_log is not None else {}
+        session = self.db.get_session()
+        try:
+            rows = session.query(
+                Position.id, Position.user_id, Position.trade_id, Position.signal_type,
+                Position.entry_price, Position.stop_loss, Position.take_profit, Position.original_sl,
+                Position.sl_adjustment_count, Position.max_profit_reached, Position.last_price_update
+            ).filter(Position.status == 'ACTIVE').all()
+        except Exception as e:
+            logger.error(f"Error loading active positions: {e}")
+            return 0
+        finally:
+            session.close()
+        
+        loaded = 0
+        for row in rows:
+            if row.id in self.positions:
+                continue
+            stop_loss = row.stop_loss
+            sl_adjustment_count = row.sl_adjustment_count
+            max_profit = position_engine.trailing_max_profit(self.position_rules, row.max_profit_reached or 0.0, 0.0)
+            state = logged.get(row.id)
+            if state is not None:
+                if 'stop_loss' in state:
+                    stop_loss = state['stop_loss']
+                    sl_adjustment_count = state['sl_adjustment_count']
+                max_profit = max(max_profit, state['max_profit'])
+            self._track_position(PositionRecord(
+                row.id, row.user_id, row.trade_id, row.signal_type, row.entry_price, stop_loss,
+                row.take_profit, row.original_sl, sl_adjustment_count, max_profit, row.last_price_update
+            ))
+            loaded += 1
+        
+        # Positions the log still has open but the database closed (e.g. the close event was lost)
+        for position_id in set(logged) - {row.id for row in rows}:
+            del logged[position_id]
+        
+        logger.info(f"Restored {loaded} active positions from database")
+        return loaded
         
     async def add_position(self, user_id: int, trade_id: int, signal_type: str, entry_price: float,
                           stop_loss: float, take_profit: float):
@@ -51,24 +159,15 @@ class PositionTracker:
                 original_sl=stop_loss,
                 sl_adjustment_count=0,
                 max_profit_reached=0.0,
-                last_price_update=datetime.now(pytz.UTC)
+                last_price_update=self.clock.now()
             )
             session.add(position)
             session.commit()
             
-            if user_id not in self.active_positions:
-                self.active_positions[user_id] = {}
-            
-            self.active_positions[user_id][position.id] = {
-                'trade_id': trade_id,
-                'signal_type': signal_type,
-                'entry_price': entry_price,
-                'stop_loss': stop_loss,
-                'take_profit': take_profit,
-                'original_sl': stop_loss,
-                'sl_adjustment_count': 0,
-                'max_profit_reached': 0.0
-            }
+            self._track_position(PositionRecord(position.id, user_id, trade_id, signal_type, entry_price,
+                                                stop_loss, take_profit))
+            if self.event_log is not None:
+                self.event_log.record_open(position.id, user_id, entry_price, stop_loss, self.clock.now())
             
             logger.info(f"Position added - User:{user_id} ID:{position.id} {signal_type} @${entry_price:.2f}")
             return position.id
@@ -80,361 +179,371 @@ class PositionTracker:
         finally:
             session.close()
     
-    async def apply_dynamic_sl(self, user_id: int, position_id: int, current_price: float, unrealized_pl: float) -> tuple[bool, Optional[float]]:
-        """Apply dynamic SL tightening when loss >= threshold
-        
-        Returns:
-            tuple[bool, Optional[float]]: (sl_adjusted, new_stop_loss)
-        """
-        if user_id not in self.active_positions or position_id not in self.active_positions[user_id]:
-            return False, None
-        
-        pos = self._normalize_position_dict(self.active_positions[user_id][position_id])
-        signal_type = pos['signal_type']
-        entry_price = pos['entry_price']
-        stop_loss = pos['stop_loss']
-        original_sl = pos.get('original_sl')
-        
-        if original_sl is None:
-            original_sl = stop_loss
-            pos['original_sl'] = stop_loss
-            logger.warning(f"original_sl was None for position {position_id}, using current stop_loss")
-        
-        if unrealized_pl >= 0 or abs(unrealized_pl) < self.config.DYNAMIC_SL_LOSS_THRESHOLD:
-            return False, None
-        
-        original_sl_distance = abs(entry_price - original_sl)
-        new_sl_distance = original_sl_distance * self.config.DYNAMIC_SL_TIGHTENING_MULTIPLIER
-        
-        new_stop_loss = None
-        sl_adjusted = False
-        
-        if signal_type == 'BUY':
-            new_stop_loss = entry_price - new_sl_distance
-            if new_stop_loss > stop_loss:
-                pos['stop_loss'] = new_stop_loss
-                pos['sl_adjustment_count'] = pos.get('sl_adjustment_count', 0) + 1
-                sl_adjusted = True
-                logger.info(f"🛡️ Dynamic SL activated! Loss ${abs(unrealized_pl):.2f} >= ${self.config.DYNAMIC_SL_LOSS_THRESHOLD}. SL tightened from ${stop_loss:.2f} → ${new_stop_loss:.2f} (protect capital)")
-                
-                if self.telegram_app:
-                    try:
-                        msg = (
-                            f"🛡️ *Dynamic SL Activated*\n\n"
-                            f"Position ID: {position_id}\n"
-                            f"Type: {signal_type}\n"
-                            f"Current Loss: ${abs(unrealized_pl):.2f}\n"
-                            f"SL Updated: ${stop_loss:.2f} → ${new_stop_loss:.2f}\n"
-                            f"Protection: Capital preservation mode"
-                        )
-                        await self.telegram_app.bot.send_message(chat_id=user_id, text=msg, parse_mode='Markdown')
-                    except Exception as e:
-                        logger.error(f"Failed to send dynamic SL notification: {e}")
+    def _notify_sl_adjustment(self, record: PositionRecord, change: BookChange):
+        unrealized_pl = change.unrealized_pl
+        if change.adjustment == position_engine.DYNAMIC_SL:
+            logger.info(f"🛡️ Dynamic SL activated! Loss ${abs(unrealized_pl):.2f} >= ${self.config.DYNAMIC_SL_LOSS_THRESHOLD}. SL tightened from ${change.old_stop_loss:.2f} → ${change.stop_loss:.2f} (protect capital)")
         else:
-            new_stop_loss = entry_price + new_sl_distance
-            if new_stop_loss < stop_loss:
-                pos['stop_loss'] = new_stop_loss
-                pos['sl_adjustment_count'] = pos.get('sl_adjustment_count', 0) + 1
-                sl_adjusted = True
-                logger.info(f"🛡️ Dynamic SL activated! Loss ${abs(unrealized_pl):.2f} >= ${self.config.DYNAMIC_SL_LOSS_THRESHOLD}. SL tightened from ${stop_loss:.2f} → ${new_stop_loss:.2f} (protect capital)")
-                
-                if self.telegram_app:
-                    try:
-                        msg = (
-                            f"🛡️ *Dynamic SL Activated*\n\n"
-                            f"Position ID: {position_id}\n"
-                            f"Type: {signal_type}\n"
-                            f"Current Loss: ${abs(unrealized_pl):.2f}\n"
-                            f"SL Updated: ${stop_loss:.2f} → ${new_stop_loss:.2f}\n"
-                            f"Protection: Capital preservation mode"
-                        )
-                        await self.telegram_app.bot.send_message(chat_id=user_id, text=msg, parse_mode='Markdown')
-                    except Exception as e:
-                        logger.error(f"Failed to send dynamic SL notification: {e}")
-        
-        return sl_adjusted, new_stop_loss if sl_adjusted else None
+            logger.info(f"💎 Trailing stop activated! Profit ${unrealized_pl:.2f}. SL moved to ${change.stop_loss:.2f} (lock-in profit)")
+        
+        if self.telegram_app:
+            self.sl_notifier.offer(record.id, record.user_id, {
+                'position_id': record.id,
+                'signal_type': record.signal_type,
+                'adjustment': change.adjustment,
+                'unrealized_pl': unrealized_pl,
+                'max_profit': change.max_profit,
+                'old_stop_loss': change.old_stop_loss,
+                'stop_loss': change.stop_loss
+            })
     
-    async def apply_trailing_stop(self, user_id: int, position_id: int, current_price: float, unrealized_pl: float) -> tuple[bool, Optional[float]]:
-        """Apply trailing stop when profit >= threshold
-        
-        Returns:
-            tuple[bool, Optional[float]]: (sl_adjusted, new_stop_loss)
-        """
-        if user_id not in self.active_positions or position_id not in self.active_positions[user_id]:
-            return False, None
-        
-        pos = self._normalize_position_dict(self.active_positions[user_id][position_id])
-        signal_type = pos['signal_type']
-        stop_loss = pos['stop_loss']
-        
-        if unrealized_pl <= 0 or unrealized_pl < self.config.TRAILING_STOP_PROFIT_THRESHOLD:
-            return False, None
-        
-        max_profit = pos.get('max_profit_reached', 0.0)
-        if max_profit is None:
-            max_profit = 0.0
-        
-        if unrealized_pl > max_profit:
-            pos['max_profit_reached'] = unrealized_pl
+    async def _send_sl_notification(self, user_id: int, update: Dict, message_id: Optional[int]) -> Optional[int]:
+        """Send (or edit in place) the latest SL update of a position, run by the notification workers"""
+        if update['adjustment'] == position_engine.DYNAMIC_SL:
+            msg = (
+                f"🛡️ *Dynamic SL Activated*\n\n"
+                f"Position ID: {update['position_id']}\n"
+                f"Type: {update['signal_type']}\n"
+                f"Current Loss: ${abs(update['unrealized_pl']):.2f}\n"
+                f"SL Updated: ${update['old_stop_loss']:.2f} → ${update['stop_loss']:.2f}\n"
+                f"Protection: Capital preservation mode"
+            )
+        else:
+            msg = (
+                f"💎 *Trailing Stop Active*\n\n"
+                f"Position ID: {update['position_id']}\n"
+                f"Type: {update['signal_type']}\n"
+                f"Current Profit: ${update['unrealized_pl']:.2f}\n"
+                f"Max Profit: ${update['max_profit']:.2f}\n"
+                f"SL Updated: ${update['old_stop_loss']:.2f} → ${update['stop_loss']:.2f}\n"
+                f"Status: Profit locked-in!"
+            )
         
-        trailing_distance = self.config.TRAILING_STOP_DISTANCE_PIPS / self.config.XAUUSD_PIP_VALUE
+        if message_id is not None:
+            try:
+                await self.telegram_app.bot.edit_message_text(chat_id=user_id, message_id=message_id,
+                                                              text=msg, parse_mode='Markdown')
+                return message_id
+            except Exception as e:
+                if 'not modified' in str(e).lower():
+                    return message_id
+                logger.debug(f"Could not edit SL message {message_id}, sending a new one: {e}")
         
-        new_trailing_sl = None
-        sl_adjusted = False
+        try:
+            message = await self.telegram_app.bot.send_message(chat_id=user_id, text=msg, parse_mode='Markdown')
+            return getattr(message, 'message_id', None)
+        except Exception as e:
+            logger.error(f"Failed to send SL notification for position {update['position_id']}: {e}")
+            return None
         
-        if signal_type == 'BUY':
-            new_trailing_sl = current_price - trailing_distance
-            if new_trailing_sl > stop_loss:
-                pos['stop_loss'] = new_trailing_sl
-                pos['sl_adjustment_count'] = pos.get('sl_adjustment_count', 0) + 1
-                sl_adjusted = True
-                logger.info(f"💎 Trailing stop activated! Profit ${unrealized_pl:.2f}. SL moved to ${new_trailing_sl:.2f} (lock-in profit)")
-                
-                if self.telegram_app:
-                    try:
-                        msg = (
-                            f"💎 *Trailing Stop Active*\n\n"
-                            f"Position ID: {position_id}\n"
-                            f"Type: {signal_type}\n"
-                            f"Current Profit: ${unrealized_pl:.2f}\n"
-                            f"Max Profit: ${pos['max_profit_reached']:.2f}\n"
-                            f"SL Updated: ${stop_loss:.2f} → ${new_trailing_sl:.2f}\n"
-                            f"Status: Profit locked-in!"
-                        )
-                        await self.telegram_app.bot.send_message(chat_id=user_id, text=msg, parse_mode='Markdown')
-                    except Exception as e:
-                        logger.error(f"Failed to send trailing stop notification: {e}")
-        else:
-            new_trailing_sl = current_price + trailing_distance
-            if new_trailing_sl < stop_loss:
-                pos['stop_loss'] = new_trailing_sl
-                pos['sl_adjustment_count'] = pos.get('sl_adjustment_count', 0) + 1
-                sl_adjusted = True
-                logger.info(f"💎 Trailing stop activated! Profit ${unrealized_pl:.2f}. SL moved to ${new_trailing_sl:.2f} (lock-in profit)")
-                
-                if self.telegram_app:
-                    try:
-                        msg = (
-                            f"💎 *Trailing Stop Active*\n\n"
-                            f"Position ID: {position_id}\n"
-                            f"Type: {signal_type}\n"
-                            f"Current Profit: ${unrealized_pl:.2f}\n"
-                            f"Max Profit: ${pos['max_profit_reached']:.2f}\n"
-                            f"SL Updated: ${stop_loss:.2f} → ${new_trailing_sl:.2f}\n"
-                            f"Status: Profit locked-in!"
-                        )
-                        await self.telegram_app.bot.send_message(chat_id=user_id, text=msg, parse_mode='Markdown')
-                    except Exception as e:
-                        logger.error(f"Failed to send trailing stop notification: {e}")
+    async def _apply_change(self, change: BookChange, price: float, exit_price: Optional[float] = None) -> Optional[str]:
+        """Sync, persist and notify one changed row of the open book; returns the exit reason if it closed
+        
+        exit_price is the fill if this change closes the position (default: price)."""
+        record = self.positions.get(change.key)
+        max_profit_changed = change.max_profit != record.max_profit_reached
+        record.stop_loss = change.stop_loss
+        record.max_profit_reached = change.max_profit
+        record.sl_adjustment_count = change.sl_adjustments
+        sl_adjusted = change.adjustment != position_engine.NO_ADJUSTMENT
+        now = self.clock.now()
+        
+        if sl_adjusted:
+            self._notify_sl_adjustment(record, change)
+        
+        if self.event_log is not None:
+            # SL moves are made durable by the log append, the positions row can wait for the flush
+            if sl_adjusted:
+                self.event_log.record_sl_move(record.id, record.user_id, price, change.stop_loss,
+                                              change.max_profit, change.sl_adjustments, now)
+            elif max_profit_changed:
+                self.event_log.record_max_profit(record.id, record.user_id, price, change.max_profit, now)
+        
+        self.write_buffer.record(record.id, price, change.unrealized_pl, now, change.stop_loss,
+                                 change.sl_adjustments, sl_adjusted and self.event_log is None)
+        
+        if change.exit_code != position_engine.HOLD:
+            reason = position_engine.EXIT_REASONS[change.exit_code]
+            await self.close_position(record.user_id, record.id, price if exit_price is None else exit_price, reason)
+            return reason
         
-        return sl_adjusted, new_trailing_sl if sl_adjusted else None
+        self._index_position(record)
+        return None
     
     async def update_position(self, user_id: int, position_id: int, current_price: float) -> Optional[str]:
         """Update position with current price and apply dynamic SL/TP logic"""
-        if user_id not in self.active_positions or position_id not in self.active_positions[user_id]:
+        record = self.positions.get(position_id, user_id)
+        if record is None or record.state != POSITION_OPEN:
             return None
         
-        pos = self.active_positions[user_id][position_id]
-        signal_type = pos['signal_type']
-        entry_price = pos['entry_price']
-        stop_loss = pos['stop_loss']
-        take_profit = pos['take_profit']
-        
-        unrealized_pl = self.risk_manager.calculate_pl(entry_price, current_price, signal_type)
-        
-        sl_adjusted = False
-        
-        dynamic_sl_applied, new_sl = await self.apply_dynamic_sl(user_id, position_id, current_price, unrealized_pl)
-        if dynamic_sl_applied:
-            sl_adjusted = True
-            stop_loss = new_sl
-        
-        if not dynamic_sl_applied:
-            trailing_applied, new_sl = await self.apply_trailing_stop(user_id, position_id, current_price, unrealized_pl)
-            if trailing_applied:
-                sl_adjusted = True
-                stop_loss = new_sl
-        
-        stop_loss = pos['stop_loss']
-        
-        session = self.db.get_session()
-        try:
-            position = session.query(Position).filter(Position.id == position_id, Position.user_id == user_id).first()
-            if position:
-                position.current_price = current_price
-                position.unrealized_pl = unrealized_pl
-                position.last_price_update = datetime.now(pytz.UTC)
-                
-                current_max_profit = position.max_profit_reached if position.max_profit_reached is not None else 0.0
-                if unrealized_pl > 0 and unrealized_pl > current_max_profit:
-                    position.max_profit_reached = unrealized_pl
-                
-                if sl_adjusted:
-                    position.stop_loss = stop_loss
-                    position.sl_adjustment_count = pos['sl_adjustment_count']
-                
-                session.commit()
-        except Exception as e:
-            logger.error(f"Error updating position {position_id}: {e}")
-            session.rollback()
-        finally:
-            session.close()
-        
-        hit_tp = False
-        hit_sl = False
-        
-        if signal_type == 'BUY':
-            hit_tp = current_price >= take_profit
-            hit_sl = current_price <= stop_loss
-        else:
-            hit_tp = current_price <= take_profit
-            hit_sl = current_price >= stop_loss
-        
-        if hit_tp:
-            await self.close_position(user_id, position_id, current_price, 'TP_HIT')
-            return 'TP_HIT'
-        elif hit_sl:
-            reason = 'DYNAMIC_SL_HIT' if sl_adjusted else 'SL_HIT'
-            await self.close_position(user_id, position_id, current_price, reason)
-            return reason
-        
+        for change in self.book.step(current_price, [position_id]):
+            return await self._apply_change(change, current_price)
         return None
     
+    def _forget_position(self, position_id: int):
+        self.positions.remove(position_id)
+        self.trigger_index.discard(position_id)
+        self.book.remove(position_id)
+        self.write_buffer.discard(position_id)
+        self.sl_notifier.forget(position_id)
+    
     async def close_position(self, user_id: int, position_id: int, exit_price: float, reason: str):
-        if user_id not in self.active_positions or position_id not in self.active_positions[user_id]:
+        """Close a position once: OPEN -> CLOSING -> removed, repeated calls are no-ops"""
+        record = self.positions.get(position_id, user_id)
+        if record is None:
             return
         
-        pos = self.active_positions[user_id][position_id]
-        trade_id = pos['trade_id']
-        signal_type = pos['signal_type']
-        entry_price = pos['entry_price']
+        if record.state != POSITION_OPEN:
+            self.engine_stats['duplicate_closes'] += 1
+            return
+        record.state = POSITION_CLOSING
+        self.trigger_index.discard(position_id)
+        trade_id = record.trade_id
+        signal_type = record.signal_type
+        entry_price = record.entry_price
         
         actual_pl = self.risk_manager.calculate_pl(entry_price, exit_price, signal_type)
         
         session = self.db.get_session()
         try:
             position = session.query(Position).filter(Position.id == position_id, Position.user_id == user_id).first()
+            if position and position.status == 'CLOSED':
+                logger.warning(f"Position {position_id} was already closed in the database, dropping it")
+                self.engine_stats['duplicate_closes'] += 1
+                self._forget_position(position_id)
+                if self.event_log is not None:
+                    self.event_log.record_close(position_id, user_id, exit_price, self.clock.now())
+                return
+            
             if position:
+                self.write_buffer.merge_into(position)
                 position.status = 'CLOSED'
                 position.current_price = exit_price
                 position.unrealized_pl = actual_pl
-                position.closed_at = datetime.now(pytz.UTC)
+                position.closed_at = self.clock.now()
                 
             trade = session.query(Trade).filter(Trade.id == trade_id, Trade.user_id == user_id).first()
             if trade:
                 trade.status = 'CLOSED'
                 trade.exit_price = exit_price
                 trade.actual_pl = actual_pl
-                trade.close_time = datetime.now(pytz.UTC)
+                trade.close_time = self.clock.now()
                 trade.result = 'WIN' if actual_pl > 0 else 'LOSS'
                 
             session.commit()
+            self._forget_position(position_id)
+            if self.event_log is not None:
+                self.event_log.record_close(position_id, user_id, exit_price, self.clock.now())
             
             logger.info(f"Position closed - User:{user_id} ID:{position_id} {reason} P/L:${actual_pl:.2f}")
             
-            if self.telegram_app and self.chart_generator and self.market_data:
-                try:
-                    df_m1 = await self.market_data.get_historical_data('M1', 100)
-                    
-                    if df_m1 is not None and len(df_m1) >= 30:
-                        exit_signal = {
-                            'signal': signal_type,
-                            'entry_price': entry_price,
-                            'stop_loss': pos['stop_loss'],
-                            'take_profit': pos['take_profit'],
-                            'timeframe': 'M1'
-                        }
-                        
-                        chart_path = await self.chart_generator.generate_chart_async(df_m1, exit_signal, 'M1')
-                        
-                        result_emoji = '✅' if trade.result == 'WIN' else '❌'
-                        exit_label = "TRADE_EXIT" if reason == "TP_HIT" else "Trade LOSS"
-                        
-                        exit_msg = (
-                            f"{result_emoji} *{exit_label}*\n\n"
-                            f"Type: {signal_type}\n"
-                            f"Entry: ${entry_price:.2f}\n"
-                            f"Exit: ${exit_price:.2f}\n"
-                            f"P/L: ${actual_pl:.2f}"
-                        )
-                        
-                        try:
-                            await self.telegram_app.bot.send_message(
-                                chat_id=user_id,
-                                text=exit_msg,
-                                parse_mode='Markdown'
-                            )
-                            
-                            if chart_path:
-                                with open(chart_path, 'rb') as photo:
-                                    await self.telegram_app.bot.send_photo(
-                                        chat_id=user_id, 
-                                        photo=photo,
-                                        caption=f"Chart Exit - {signal_type} @ ${exit_price:.2f}"
-                                    )
-                                
-                                if self.config.CHART_AUTO_DELETE:
-                                    await asyncio.sleep(2)
-                                    self.chart_generator.delete_chart(chart_path)
-                                    logger.info(f"Auto-deleted exit chart: {chart_path}")
-                        except Exception as e:
-                            logger.error(f"Failed to send exit notification to user {user_id}: {e}")
-                    else:
-                        logger.warning(f"Not enough candles for exit chart: {len(df_m1) if df_m1 else 0}")
-                        
-                        if self.alert_system and trade:
-                            await self.alert_system.send_trade_exit_alert({
-                                'signal_type': signal_type,
-                                'entry_price': entry_price,
-                                'exit_price': exit_price,
-                                'actual_pl': actual_pl
-                            }, trade.result)
-                except Exception as e:
-                    logger.error(f"Error sending exit chart: {e}")
-                    
-                    if self.alert_system and trade:
-                        await self.alert_system.send_trade_exit_alert({
-                            'signal_type': signal_type,
-                            'entry_price': entry_price,
-                            'exit_price': exit_price,
-                            'actual_pl': actual_pl
-                        }, trade.result)
-            elif self.alert_system and trade:
-                await self.alert_system.send_trade_exit_alert({
-                    'signal_type': signal_type,
-                    'entry_price': entry_price,
-                    'exit_price': exit_price,
-                    'actual_pl': actual_pl
-                }, trade.result)
-            
             if self.user_manager and trade:
                 self.user_manager.update_user_stats(user_id, actual_pl)
             
-            del self.active_positions[user_id][position_id]
-            if not self.active_positions[user_id]:
-                del self.active_positions[user_id]
+            exit_info = {
+                'signal_type': signal_type,
+                'entry_price': entry_price,
+                'exit_price': exit_price,
+                'actual_pl': actual_pl,
+                'stop_loss': record.stop_loss,
+                'take_profit': record.take_profit
+            }
+            result = trade.result if trade else None
+            if self.telegram_app or (self.alert_system and result):
+                self.notifications.submit(partial(self._notify_exit, user_id, exit_info, result, reason),
+                                          f"exit of position {position_id} for user {user_id}")
             
         except Exception as e:
             logger.error(f"Error closing position {position_id}: {e}")
             session.rollback()
+            if position_id in self.positions:
+                record.state = POSITION_OPEN
+                self._index_position(record)
         finally:
             session.close()
     
+    def observe_price(self, price: float, low: Optional[float] = None, high: Optional[float] = None):
+        """Fold a tick (and the range of any ticks merged into it) into the running extremes, O(1)"""
+        self.last_price_time = self.clock.time()
+        self._last_observed = price
+        low = price if low is None or low > price else low
+        high = price if high is None or high < price else high
+        if self._range_low is None or low < self._range_low:
+            self._range_low = low
+        if self._range_high is None or high > self._range_high:
+            self._range_high = high
+        
+    async def process_price(self, price: float, low: Optional[float] = None,
+                            high: Optional[float] = None) -> List[Dict]:
+        """Evaluate the positions whose trigger levels were crossed since the last evaluation
+        
+        The single evaluation path for both the tick stream and the scheduler sweep.
+        Prices observed since the last evaluation are kept as a running low/high, so a
+        spike that no evaluated tick saw still hits SL/TP: each position is stepped along
+        adverse extreme -> favourable extreme -> price, like the backtester walks a bar.
+        An exit at an extreme fills at the crossed SL/TP level (kept inside the range),
+        as the backtester does; only the final instant evaluation fills at the price.
+        A position opened while a range was pending only sees the prices after it.
+        The open book marks every position and steps the triggered ones in one array
+        pass per point, and only the rows whose state changed are persisted and notified.
+        Returns the positions that were closed.
+        """
+        self.observe_price(price, low, high)
+        ranges = self._closed_ranges + [(self._range_low, self._range_high, self._range_seq)]
+        self._closed_ranges = []
+        self._range_low = self._range_high = self._last_observed = None
+        self._range_seq += 1
+        self.engine_stats['prices'] += 1
+        
+        closed_positions = []
+        for low, high, range_seq in ranges:
+            if low < price or high > price:
+                self.engine_stats['intrabar_ranges'] += 1
+                for point, is_buy in ((low, True), (high, False), (high, True), (low, False)):
+                    closed_positions += await self._evaluate_at(point, is_buy, (low, high), range_seq)
+        closed_positions += await self._evaluate_at(price)
+        return closed_positions
+    
+    async def _evaluate_at(self, price: float, is_buy: Optional[bool] = None,
+                           fill_range: Optional[Tuple[float, float]] = None,
+                           range_seq: Optional[int] = None) -> List[Dict]:
+        """Step the positions (optionally only one side) triggered at this price
+        
+        With fill_range (a range extreme rather than a traded instant price) exits fill
+        at the crossed SL/TP level, bounded to the range, and positions opened after
+        range range_seq started are skipped."""
+        keys = self.trigger_index.triggered(price)
+        if is_buy is not None:
+            keys = [key for key in keys if self.positions.get(key).is_buy == is_buy
+                    and (range_seq is None or self.positions.get(key).range_seq <= range_seq)]
+            if not keys:
+                return []
+        else:
+            self.engine_stats['evaluations_saved'] += len(self.trigger_index) - len(keys)
+        self.engine_stats['evaluations'] += len(keys)
+        
+        changes = self.book.step(price, keys)
+        self.engine_stats['rows_changed'] += len(changes)
+        
+        closed_positions = []
+        for change in changes:
+            position_id = change.key
+            record = self.positions.get(position_id)
+            user_id = record.user_id
+            exit_price = price
+            if fill_range is not None and change.exit_code != position_engine.HOLD:
+                level = record.take_profit if change.exit_code == position_engine.TP_HIT else change.stop_loss
+                exit_price = min(max(level, fill_range[0]), fill_range[1])
+            try:
+                result = await self._apply_change(change, price, exit_price)
+                if result:
+                    closed_positions.append({
+                        'user_id': user_id,
+                        'position_id': position_id,
+                        'result': result,
+                        'price': exit_price
+                    })
+                    logger.info(f"Position {position_id} User:{user_id} closed: {result} at ${exit_price:.2f}")
+            except Exception as e:
+                logger.error(f"Error monitoring position {position_id} for user {user_id}: {e}")
+        return closed_positions
+    
+    async def _notify_exit(self, user_id: int, exit_info: Dict, result: Optional[str], reason: str):
+        """Exit message with chart (or a plain alert), run by the notification workers"""
+        signal_type = exit_info['signal_type']
+        entry_price = exit_info['entry_price']
+        exit_price = exit_info['exit_price']
+        actual_pl = exit_info['actual_pl']
+        alert_data = {
+            'signal_type': signal_type,
+            'entry_price': entry_price,
+            'exit_price': exit_price,
+            'actual_pl': actual_pl
+        }
+        
+        if self.telegram_app and self.chart_generator and self.market_data:
+            try:
+                df_m1 = await self.market_data.get_historical_data('M1', 100)
+                
+                if df_m1 is not None and len(df_m1) >= 30:
+                    exit_signal = {
+                        'signal': signal_type,
+                        'entry_price': entry_price,
+                        'stop_loss': exit_info['stop_loss'],
+                        'take_profit': exit_info['take_profit'],
+                        'timeframe': 'M1'
+                    }
+                    
+                    chart_path = await self.chart_generator.generate_chart_async(df_m1, exit_signal, 'M1')
+                    
+                    result_emoji = '✅' if result == 'WIN' else '❌'
+                    exit_label = "TRADE_EXIT" if reason == "TP_HIT" else "Trade LOSS"
+                    
+                    exit_msg = (
+                        f"{result_emoji} *{exit_label}*\n\n"
+                        f"Type: {signal_type}\n"
+                        f"Entry: ${entry_price:.2f}\n"
+                        f"Exit: ${exit_price:.2f}\n"
+                        f"P/L: ${actual_pl:.2f}"
+                    )
+                    
+                    try:
+                        await self.telegram_app.bot.send_message(
+                            chat_id=user_id,
+                            text=exit_msg,
+                            parse_mode='Markdown'
+                        )
+                        
+                        if chart_path:
+                            with open(chart_path, 'rb') as photo:
+                                await self.telegram_app.bot.send_photo(
+                                    chat_id=user_id, 
+                                    photo=photo,
+                                    caption=f"Chart Exit - {signal_type} @ ${exit_price:.2f}"
+                                )
+                            
+                            if self.config.CHART_AUTO_DELETE:
+                                await self.clock.sleep(2)
+                                self.chart_generator.delete_chart(chart_path)
+                                logger.info(f"Auto-deleted exit chart: {chart_path}")
+                    except Exception as e:
+                        logger.error(f"Failed to send exit notification to user {user_id}: {e}")
+                else:
+                    logger.warning(f"Not enough candles for exit chart: {len(df_m1) if df_m1 is not None else 0}")
+                    
+                    if self.alert_system and result:
+                        await self.alert_system.send_trade_exit_alert(alert_data, result)
+            except Exception as e:
+                logger.error(f"Error sending exit chart: {e}")
+                
+                if self.alert_system and result:
+                    await self.alert_system.send_trade_exit_alert(alert_data, result)
+        elif self.alert_system and result:
+            await self.alert_system.send_trade_exit_alert(alert_data, result)
+    
     async def monitor_active_positions(self):
-        """Monitor all active positions and apply dynamic SL/TP
+        """Scheduler fallback for the tick-driven monitor, called every 10 seconds
         
-        This method is called by the scheduler every 10 seconds.
-        Returns a list of updated positions.
+        While the tick stream keeps delivering prices the positions are already up to
+        date, so the sweep only flushes pending writes. When the stream has been quiet
+        for SWEEP_STALE_SECONDS it evaluates the current price through process_price.
+        Returns a list of closed positions.
         """
-        if not self.active_positions:
+        self._flush_writes()
+        self.sl_notifier.dispatch_due()
+        
+        if not self.positions:
+            return []
+        
+        if self.last_price_time is not None and self.clock.time() - self.last_price_time < SWEEP_STALE_SECONDS:
+            self.engine_stats['sweeps_skipped'] += 1
+            self.engine_stats['evaluations_saved'] += len(self.trigger_index)
             return []
         
         if not self.market_data:
             logger.warning("Market data not available for position monitoring")
             return []
         
-        updated_positions = []
-        
         try:
             current_price = await self.market_data.get_current_price()
             
@@ -442,68 +551,116 @@ class PositionTracker:
                 logger.warning("No current price available for position monitoring")
                 return []
             
-            for user_id in list(self.active_positions.keys()):
-                for position_id in list(self.active_positions[user_id].keys()):
-                    try:
-                        result = await self.update_position(user_id, position_id, current_price)
-                        if result:
-                            updated_positions.append({
-                                'user_id': user_id,
-                                'position_id': position_id,
-                                'result': result,
-                                'price': current_price
-                            })
-                            logger.info(f"Position {position_id} User:{user_id} closed: {result} at ${current_price:.2f}")
-                    except Exception as e:
-                        logger.error(f"Error monitoring position {position_id} for user {user_id}: {e}")
-            
-            return updated_positions
+            self.engine_stats['sweeps_run'] += 1
+            closed_positions = await self.process_price(current_price)
+            self._flush_writes()
+            return closed_positions
             
         except Exception as e:
             logger.error(f"Error in monitor_active_positions: {e}")
             return []
     
     async def monitor_positions(self, market_data_client):
-        tick_queue = await market_data_client.subscribe_ticks('position_tracker')
+        self._tick_queue = await market_data_client.subscribe_ticks('position_tracker', conflate=True)
         logger.info("Position tracker monitoring started")
         
         self.monitoring = True
+        flush_task = asyncio.create_task(self._flush_loop())
         
         try:
             while self.monitoring:
                 try:
-                    tick = await tick_queue.get()
-                    
-                    if self.active_positions:
-                        mid_price = tick['quote']
-                        
-                        for user_id in list(self.active_positions.keys()):
-                            for position_id in list(self.active_positions[user_id].keys()):
-                                result = await self.update_position(user_id, position_id, mid_price)
-                                if result:
-                                    logger.info(f"Position {position_id} User:{user_id} closed: {result}")
+                    tick = await self._tick_queue.get()
+                    self.observe_price(tick['quote'], tick.get('low'), tick.get('high'))
+                    if self._evaluation_due():
+                        await self.process_price(tick['quote'])
                     
                 except Exception as e:
                     logger.error(f"Error processing tick dalam position monitoring: {e}")
-                    await asyncio.sleep(1)
+                    await self.clock.sleep(1)
                     
         finally:
+            flush_task.cancel()
+            self._flush_writes()
             await market_data_client.unsubscribe_ticks('position_tracker')
-            logger.info("Position tracker monitoring stopped")
+            logger.info(f"Position tracker monitoring stopped - {self.format_engine_stats()}")
+    
+    def get_engine_stats(self) -> Dict:
+        """Work done by the position engine and what it saved over evaluating and writing
+        every open position on every tick and every sweep"""
+        stats = dict(self.engine_stats)
+        writes = self.write_buffer.get_stats()
+        stats['ticks_conflated'] = getattr(self._tick_queue, 'conflated', 0)
+        stats['db_rows_written'] = writes['rows_written']
+        stats['db_flushes'] = writes['flushes']
+        stats['writes_saved'] = max(0, stats['evaluations'] + stats['evaluations_saved'] - writes['rows_written'])
+        stats['log_events_written'] = self.event_log.events_written if self.event_log is not None else 0
+        sl_notes = self.sl_notifier.get_stats()
+        stats['sl_notifications_sent'] = sl_notes['sent']
+        stats['sl_notifications_coalesced'] = sl_notes['coalesced']
+        return stats
+    
+    def format_engine_stats(self) -> str:
+        stats = self.get_engine_stats()
+        return (f"{stats['prices']} prices ({stats['ticks_conflated']} conflated ticks), "
+                f"{stats['evaluations']} evaluations ({stats['evaluations_saved']} saved, {stats['rows_changed']} changed), "
+                f"{stats['db_rows_written']} rows in {stats['db_flushes']} flushes ({stats['writes_saved']} writes saved), "
+                f"{stats['log_events_written']} position events logged, "
+                f"sweeps {stats['sweeps_run']} run / {stats['sweeps_skipped']} skipped, "
+                f"{stats['intrabar_ranges']} intrabar ranges, "
+                f"{stats['sl_notifications_sent']} SL notifications ({stats['sl_notifications_coalesced']} coalesced), "
+                f"{stats['duplicate_closes']} duplicate closes ignored")
+    
+    def _flush_writes(self):
+        self.write_buffer.flush()
+        if self.event_log is not None:
+            self.event_log.flush()
+    
+    def _evaluation_due(self) -> bool:
+        now = self.clock.time()
+        if self._last_eval_time is not None and now - self._last_eval_time < self.eval_interval:
+            return False
+        self._last_eval_time = now
+        return True
+    
+    async def _flush_loop(self):
+        """Write the buffered price updates and send due SL notifications every POSITION_FLUSH_INTERVAL_MS
+        
+        Also evaluates the last tick when POSITION_EVAL_INTERVAL_MS held it back and no
+        newer tick has arrived since."""
+        while self.monitoring:
+            await self.clock.sleep(self.flush_interval)
+            if self._last_observed is not None and self._evaluation_due():
+                await self.process_price(self._last_observed)
+            self._flush_writes()
+            self.sl_notifier.dispatch_due()
+    
+    def clear_positions(self):
+        self.positions.clear()
+        self.trigger_index.clear()
+        self.book.clear()
+        self.write_buffer.clear()
+        self.sl_notifier.clear()
     
     def stop_monitoring(self):
         self.monitoring = False
+        self._flush_writes()
         logger.info("Position monitoring stopped")
     
-    def get_active_positions(self, user_id: Optional[int] = None) -> Dict:
+    def get_mark(self, position_id: int) -> Optional[Tuple[float, float]]:
+        """(last price, live unrealized P/L) of an open position from the open book"""
+        if position_id not in self.book or math.isnan(self.book.last_price):
+            return None
+        return self.book.last_price, self.book.get(position_id)['unrealized_pl']
+    
+    def get_active_positions(self, user_id: Optional[int] = None) -> Mapping:
+        """Read-only live view of the open records, nothing is copied"""
         if user_id is not None:
-            return self.active_positions.get(user_id, {}).copy()
-        return self.active_positions.copy()
+            return self.positions.for_user(user_id)
+        return self.positions.by_user
     
     def has_active_position(self, user_id: int) -> bool:
-        return user_id in self.active_positions and len(self.active_positions[user_id]) > 0
+        return self.positions.count(user_id) > 0
     
     def get_active_position_count(self, user_id: Optional[int] = None) -> int:
-        if user_id is not None:
-            return len(self.active_positions.get(user_id, {}))
-        return sum(len(positions) for positions in self.active_positions.values())
+        return self.positions.count(user_id)
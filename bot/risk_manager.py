@@ -1,19 +1,20 @@
-from datetime import datetime, timedelta
 from typing import Optional
 import pytz
 from bot.logger import setup_logger
+from bot.clock import Clock, RealClock
 
 logger = setup_logger('RiskManager')
 
 class RiskManager:
-    def __init__(self, config, db_manager):
+    def __init__(self, config, db_manager, clock: Optional[Clock] = None):
         self.config = config
         self.db = db_manager
+        self.clock = clock or RealClock()
         self.last_signal_time = {}
         self.daily_stats = {}
         
     def can_trade(self, user_id: int, signal_type: str) -> tuple[bool, Optional[str]]:
-        utc_now = datetime.now(pytz.UTC)
+        utc_now = self.clock.now()
         jakarta_tz = pytz.timezone('Asia/Jakarta')
         jakarta_time = utc_now.astimezone(jakarta_tz)
         today_str = jakarta_time.strftime('%Y-%m-%d')
@@ -53,7 +54,7 @@ class RiskManager:
             session.close()
     
     def record_signal(self, user_id: int):
-        self.last_signal_time[user_id] = datetime.now(pytz.UTC)
+        self.last_signal_time[user_id] = self.clock.now()
         logger.debug(f"Signal recorded for user {user_id}, cooldown timer started")
     
     def calculate_position_size(self, account_balance: float, entry_price: float, 
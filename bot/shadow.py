@@ -0,0 +1,314 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+import pandas as pd
+import pytz
+from config import ConfigOverride
+from bot.logger import setup_logger
+from bot.clock import Clock, RealClock
+from bot.database import SignalLog
+from bot import position_engine
+from bot.strategy import TradingStrategy
+
+logger = setup_logger('Shadow')
+
+SHADOW_USER_ID = 0
+
+class PaperPositionBook:
+    """Simulated positions of one shadow strategy
+    
+    Managed by position_engine with the live PositionTracker's rules and LOT_SIZE
+    (dynamic SL, trailing stop, SL/TP), so paper P/L compares with production.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.rules = position_engine.PositionRules(config)
+        self.open_position: Optional[Dict] = None
+        self.closed_trades: List[Dict] = []
+        self.total_pl = 0.0
+        self.wins = 0
+        self.losses = 0
+    
+    def has_open_position(self) -> bool:
+        return self.open_position is not None
+    
+    def open(self, signal: Dict, opened_at: datetime):
+        self.open_position = {
+            'signal_type': signal['signal'],
+            'entry_price': signal['entry_price'],
+            'stop_loss': signal['stop_loss'],
+            'original_sl': signal['stop_loss'],
+            'take_profit': signal['take_profit'],
+            'max_profit': 0.0,
+            'lot_size': self.rules.lot_size,
+            'opened_at': opened_at
+        }
+    
+    def update_price(self, price: float, timestamp: datetime, low: Optional[float] = None,
+                     high: Optional[float] = None) -> Optional[Dict]:
+        """Apply a tick (and the low/high seen since the previous one) to the open position
+    
+        Like PositionTracker.process_price the position is stepped along adverse
+        extreme -> favourable extreme -> price; an exit at an extreme fills at the
+        crossed SL/TP level, an exit at the price fills at the price. Returns the closed
+        trade, if any.
+        """
+        pos = self.open_position
+        if pos is None:
+            return None
+        
+        is_buy = pos['signal_type'] == 'BUY'
+        low = price if low is None or low > price else low
+        high = price if high is None or high < price else high
+        path = (low, high) if is_buy else (high, low)
+        if low == high:
+            path = ()
+        
+        for i, point in enumerate(path + (price,)):
+            stop_loss, max_profit, _, code, _ = position_engine.step(
+                self.rules, is_buy, pos['entry_price'], pos['original_sl'], pos['stop_loss'],
+                pos['take_profit'], pos['max_profit'], point
+            )
+            pos['stop_loss'] = stop_loss
+            pos['max_profit'] = max_profit
+            if code == position_engine.HOLD:
+                continue
+        
+            exit_price = point
+            if i < len(path):
+                level = pos['take_profit'] if code == position_engine.TP_HIT else stop_loss
+                exit_price = min(max(level, low), high)
+            return self._close(pos, exit_price, timestamp, position_engine.EXIT_REASONS[code])
+        return None
+    
+    def _close(self, pos: Dict, exit_price: float, timestamp: datetime, reason: str) -> Dict:
+        pl = float(position_engine.unrealized_pl(self.rules, pos['signal_type'] == 'BUY', pos['entry_price'],
+                                                 exit_price))
+        trade = dict(pos)
+        trade.update({
+            'exit_price': exit_price,
+            'closed_at': timestamp,
+            'reason': reason,
+            'pl': pl
+        })
+        
+        self.closed_trades.append(trade)
+        self.total_pl += pl
+        if pl > 0:
+            self.wins += 1
+        else:
+            self.losses += 1
+        self.open_position = None
+        return trade
+    
+    def get_stats(self) -> Dict:
+        total = self.wins + self.losses
+        return {
+            'total_trades': total,
+            'wins': self.wins,
+            'losses': self.losses,
+            'win_rate': (self.wins / total * 100) if total > 0 else 0.0,
+            'total_pl': self.total_pl,
+            'open_position': dict(self.open_position) if self.open_position else None
+        }
+
+class ShadowStrategy:
+    def __init__(self, name: str, strategy: TradingStrategy, config):
+        self.name = name
+        self.strategy = strategy
+        self.config = config
+        self.book = PaperPositionBook(config)
+        self.last_signal_candle = None
+        self.signals_logged = 0
+
+class ShadowRunner:
+    """Evaluate candidate strategies on the production indicator stream
+    
+    Candidates never message users: their signals go to SignalLog (user_id 0,
+    strategy_name set) and into a per-candidate paper position book. run() drives
+    them from its own tick subscription, independent of any user's monitoring loop;
+    indicators come from the shared production computation, so each candidate only
+    costs its rule evaluation.
+    """
+    
+    def __init__(self, config, db_manager, candidates: Optional[Dict[str, Dict]] = None,
+                 clock: Optional[Clock] = None):
+        self.config = config
+        self.db = db_manager
+        self.clock = clock or RealClock()
+        self.running = False
+        self.shadows: List[ShadowStrategy] = []
+        
+        if candidates is None:
+            candidates = self.load_candidates(config)
+        
+        for name, overrides in candidates.items():
+            try:
+                shadow_config = ConfigOverride(config, **overrides)
+                strategy = TradingStrategy(shadow_config)
+                self.shadows.append(ShadowStrategy(name, strategy, shadow_config))
+            except Exception as e:
+                logger.error(f"Invalid shadow strategy '{name}': {e}")
+        
+        logger.info(f"Shadow runner initialized with {len(self.shadows)} candidate(s): "
+                    f"{', '.join(s.name for s in self.shadows) or '-'}")
+    
+    @staticmethod
+    def load_candidates(config) -> Dict[str, Dict]:
+        """Read {name: {CONFIG_KEY: value}} from SHADOW_STRATEGIES_FILE"""
+        path = getattr(config, 'SHADOW_STRATEGIES_FILE', '')
+        if not path:
+            return {}
+        if not os.path.exists(path):
+            logger.warning(f"Shadow strategies file not found: {path}")
+            return {}
+        
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load shadow strategies file {path}: {e}")
+            return {}
+        
+        if not isinstance(data, dict):
+            logger.error(f"Shadow strategies file must contain an object of name -> overrides")
+            return {}
+        return {str(name): dict(overrides or {}) for name, overrides in data.items()}
+    
+    def extra_ema_periods(self) -> List[int]:
+        """EMA periods candidates need beyond production, so the shared pass computes them too"""
+        periods = set()
+        for shadow in self.shadows:
+            periods.update(shadow.config.EMA_PERIODS)
+        return sorted(periods - set(self.config.EMA_PERIODS))
+    
+    async def run(self, market_data, get_indicators: Callable[[pd.DataFrame, str], Awaitable[Optional[Dict]]]):
+        """Drive the candidates from the tick stream until stop()
+        
+        Every tick (with the low/high of ticks conflated into it) updates the paper
+        books. Signals are evaluated every SIGNAL_COOLDOWN_SECONDS, like the production
+        monitoring loops, on M1 indicators from get_indicators
+        (TradingBot.get_shared_indicators), so users on M1 share the same computation.
+        """
+        if not self.shadows:
+            return
+        tick_queue = await market_data.subscribe_ticks('shadow_runner', conflate=True)
+        logger.info("Shadow runner started")
+        
+        self.running = True
+        last_signal_check = None
+        try:
+            while self.running:
+                try:
+                    tick = await tick_queue.get()
+                    self.on_price(tick['quote'], tick.get('low'), tick.get('high'))
+                    
+                    now = self.clock.time()
+                    if last_signal_check is not None and now - last_signal_check < self.config.SIGNAL_COOLDOWN_SECONDS:
+                        continue
+                    last_signal_check = now
+                    
+                    df = await market_data.get_historical_data('M1', 100)
+                    if df is None or len(df) < 30:
+                        continue
+                    
+                    indicators = await get_indicators(df, 'M1')
+                    if indicators:
+                        spread = await market_data.get_spread()
+                        self.on_indicators(indicators, df.index[-1], 'M1', spread)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error in shadow runner: {e}")
+                    await self.clock.sleep(1)
+        finally:
+            await market_data.unsubscribe_ticks('shadow_runner')
+            logger.info("Shadow runner stopped")
+    
+    def stop(self):
+        self.running = False
+    
+    def on_price(self, price: float, low: Optional[float] = None, high: Optional[float] = None):
+        """Apply a tick to every candidate's open paper position"""
+        now = self.clock.now(pytz.UTC)
+        for shadow in self.shadows:
+            try:
+                closed = shadow.book.update_price(float(price), now, low, high)
+                if closed:
+                    logger.info(f"[shadow:{shadow.name}] Paper {closed['signal_type']} closed "
+                                f"{closed['reason']} P/L ${closed['pl']:.2f}")
+            except Exception as e:
+                logger.error(f"Error updating shadow strategy '{shadow.name}': {e}")
+    
+    def on_indicators(self, indicators: Dict, candle_time, timeframe: str = 'M1', spread: Optional[float] = None):
+        """Feed one shared indicator snapshot to every candidate
+        
+        Each candidate opens at most one paper position at a time and logs at most one
+        signal per candle.
+        """
+        if not indicators or not self.shadows:
+            return
+        
+        now = self.clock.now(pytz.UTC)
+        
+        for shadow in self.shadows:
+            try:
+                if shadow.last_signal_candle == candle_time:
+                    continue
+                
+                signal = shadow.strategy.detect_signal(indicators, timeframe, signal_source='auto')
+                if not signal:
+                    continue
+                
+                shadow.last_signal_candle = candle_time
+                
+                accepted = True
+                rejection_reason = None
+                if shadow.book.has_open_position():
+                    accepted = False
+                    rejection_reason = 'Paper position already open'
+                else:
+                    is_valid, validation_msg = shadow.strategy.validate_signal(signal, spread or 0)
+                    if not is_valid:
+                        accepted = False
+                        rejection_reason = validation_msg
+                
+                if accepted:
+                    shadow.book.open(signal, now)
+                    logger.info(f"[shadow:{shadow.name}] Paper {signal['signal']} @${signal['entry_price']:.2f}")
+                
+                self._log_signal(shadow, signal, accepted, rejection_reason)
+            except Exception as e:
+                logger.error(f"Error evaluating shadow strategy '{shadow.name}': {e}")
+    
+    def _log_signal(self, shadow: ShadowStrategy, signal: Dict, accepted: bool, rejection_reason: Optional[str]):
+        session = self.db.get_session()
+        try:
+            session.add(SignalLog(
+                user_id=SHADOW_USER_ID,
+                ticker='XAUUSD',
+                signal_type=signal['signal'],
+                signal_source=signal.get('signal_source', 'auto'),
+                strategy_name=shadow.name,
+                entry_price=signal['entry_price'],
+                indicators=signal.get('indicators'),
+                accepted=accepted,
+                rejection_reason=rejection_reason
+            ))
+            session.commit()
+            shadow.signals_logged += 1
+        except Exception as e:
+            logger.error(f"Error logging shadow signal: {e}")
+            session.rollback()
+        finally:
+            session.close()
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        stats = {}
+        for shadow in self.shadows:
+            stats[shadow.name] = shadow.book.get_stats()
+            stats[shadow.name]['signals_logged'] = shadow.signals_logged
+        return stats
@@ -0,0 +1,406 @@
+import json
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from bot.logger import setup_logger
+
+logger = setup_logger('SignalRules')
+
+SIDES = ('BUY', 'SELL')
+
+FEATURES = (
+    'ema_trend', 'ema_crossover', 'ema_condition',
+    'macd_crossover', 'macd', 'macd_zero',
+    'rsi_cross', 'rsi_momentum', 'rsi_condition',
+    'stoch', 'volume_strong'
+)
+
+@dataclass(frozen=True)
+class SignalRule:
+    """One row of the rule table: (condition, weight, reason text)
+    
+    condition is a feature name from FEATURES, mirrored automatically for BUY/SELL.
+    reason holds the (BUY, SELL) texts; an empty string hides the rule from the reasons.
+    group: rules sharing a group are exclusive for scoring (first match wins).
+    reason_group: rules sharing a reason_group are exclusive for the reasons only.
+    required: gate rule, every required rule must hold for a side to be valid.
+    leader_bonus: weight goes to the side that is already leading (e.g. volume confirmation).
+    """
+    name: str
+    condition: str
+    weight: int
+    reason: Tuple[str, str] = ('', '')
+    group: Optional[str] = None
+    reason_group: Optional[str] = None
+    required: bool = False
+    leader_bonus: bool = False
+
+@dataclass(frozen=True)
+class RuleSet:
+    """Rule table for one signal_source
+    
+    min_score=None means gate mode (only the required rules decide the signal),
+    otherwise a side wins when its score >= min_score and beats the opposite side.
+    """
+    name: str
+    rules: Tuple[SignalRule, ...]
+    min_score: Optional[int] = None
+
+DEFAULT_AUTO_RULES = (
+    SignalRule('ema_trend', 'ema_trend', 2, ('EMA trend bullish', 'EMA trend bearish')),
+    SignalRule('macd_crossover', 'macd_crossover', 2,
+               ('MACD bullish crossover (konfirmasi kuat)', 'MACD bearish crossover (konfirmasi kuat)'),
+               group='macd'),
+    SignalRule('macd', 'macd', 1, ('MACD bullish', 'MACD bearish'), group='macd'),
+    SignalRule('rsi_cross', 'rsi_cross', 1,
+               ('RSI keluar dari oversold', 'RSI keluar dari overbought'), reason_group='rsi'),
+    SignalRule('rsi_momentum', 'rsi_momentum', 1,
+               ('RSI di atas 50 (momentum bullish)', 'RSI di bawah 50 (momentum bearish)'), reason_group='rsi'),
+    SignalRule('stoch', 'stoch', 1, ('Stochastic konfirmasi bullish', 'Stochastic konfirmasi bearish')),
+    SignalRule('volume', 'volume_strong', 1, ('Volume tinggi konfirmasi', 'Volume tinggi konfirmasi'),
+               leader_bonus=True),
+)
+
+DEFAULT_MANUAL_RULES = (
+    SignalRule('ema_condition', 'ema_condition', 0, ('Manual: EMA bullish', 'Manual: EMA bearish'), required=True),
+    SignalRule('macd', 'macd', 0, ('MACD bullish (konfirmasi)', 'MACD bearish (konfirmasi)'), required=True),
+    SignalRule('rsi_condition', 'rsi_condition', 0, required=True),
+    SignalRule('macd_crossover', 'macd_crossover', 0, ('MACD fresh crossover', 'MACD fresh crossover')),
+    SignalRule('rsi_cross', 'rsi_cross', 0,
+               ('RSI keluar dari oversold', 'RSI keluar dari overbought'), reason_group='rsi'),
+    SignalRule('rsi_momentum', 'rsi_momentum', 0, ('RSI bullish', 'RSI bearish'), reason_group='rsi'),
+    SignalRule('stoch', 'stoch', 0, ('Stochastic konfirmasi bullish', 'Stochastic konfirmasi bearish')),
+)
+
+def compute_features(v: Dict, config) -> Dict[str, Dict]:
+    """Compute BUY/SELL boolean features from indicator values
+    
+    Shared by the scalar path (floats) and the vectorized path (numpy arrays),
+    so it only uses &, | and elementwise comparisons.
+    """
+    ema_short = v['ema_short']
+    ema_mid = v['ema_mid']
+    ema_long = v['ema_long']
+    rsi = v['rsi']
+    rsi_prev = v['rsi_prev']
+    stoch_k = v['stoch_k']
+    stoch_d = v['stoch_d']
+    stoch_k_prev = v['stoch_k_prev']
+    stoch_d_prev = v['stoch_d_prev']
+    macd = v['macd']
+    macd_signal = v['macd_signal']
+    macd_prev = v['macd_prev']
+    macd_signal_prev = v['macd_signal_prev']
+    
+    ema_near = abs(ema_short - ema_mid) / ema_mid < 0.001
+    
+    buy = {
+        'ema_trend': (ema_short > ema_mid) & (ema_mid > ema_long),
+        'ema_crossover': (ema_short > ema_mid) & ema_near,
+        'macd_crossover': (macd_prev <= macd_signal_prev) & (macd > macd_signal),
+        'macd': macd > macd_signal,
+        'macd_zero': macd > 0,
+        'rsi_cross': (rsi_prev < config.RSI_OVERSOLD_LEVEL) & (rsi >= config.RSI_OVERSOLD_LEVEL),
+        'rsi_momentum': rsi > 50,
+        'stoch': (stoch_k_prev < stoch_d_prev) & (stoch_k > stoch_d) & (stoch_k < config.STOCH_OVERBOUGHT_LEVEL),
+    }
+    sell = {
+        'ema_trend': (ema_short < ema_mid) & (ema_mid < ema_long),
+        'ema_crossover': (ema_short < ema_mid) & ema_near,
+        'macd_crossover': (macd_prev >= macd_signal_prev) & (macd < macd_signal),
+        'macd': macd < macd_signal,
+        'macd_zero': macd < 0,
+        'rsi_cross': (rsi_prev > config.RSI_OVERBOUGHT_LEVEL) & (rsi <= config.RSI_OVERBOUGHT_LEVEL),
+        'rsi_momentum': rsi < 50,
+        'stoch': (stoch_k_prev > stoch_d_prev) & (stoch_k < stoch_d) & (stoch_k > config.STOCH_OVERSOLD_LEVEL),
+    }
+    
+    volume = v.get('volume')
+    volume_avg = v.get('volume_avg')
+    if volume is None or volume_avg is None:
+        volume_strong = True
+    else:
+        volume_strong = volume > volume_avg * config.VOLUME_THRESHOLD_MULTIPLIER
+    
+    for side in (buy, sell):
+        side['ema_condition'] = side['ema_trend'] | side['ema_crossover']
+        side['rsi_condition'] = side['rsi_cross'] | side['rsi_momentum']
+        side['volume_strong'] = volume_strong
+    
+    return {'BUY': buy, 'SELL': sell}
+
+class RuleEvaluator:
+    """Compile a RuleSet into a scalar fast path and a vectorized path
+    
+    With profile=True every rule evaluation is timed into rule_stats
+    (calls, hits, total_ns) so the cost per rule can be measured.
+    """
+    
+    def __init__(self, ruleset: RuleSet, config, profile: bool = False):
+        self.ruleset = ruleset
+        self.config = config
+        self.profile = profile
+        self.rule_stats: Dict[str, List[int]] = {}
+        self._compile()
+    
+    def _compile(self):
+        for rule in self.ruleset.rules:
+            if rule.condition not in FEATURES:
+                raise ValueError(f"Unknown rule condition '{rule.condition}' in rule '{rule.name}'")
+        
+        self._required = tuple(r for r in self.ruleset.rules if r.required)
+        self._scored = tuple(r for r in self.ruleset.rules
+                             if not r.required and not r.leader_bonus and r.weight)
+        self._leader = tuple(r for r in self.ruleset.rules if r.leader_bonus and r.weight)
+        self._reasons = tuple(
+            (r.condition, r.reason, r.reason_group or r.group)
+            for r in self.ruleset.rules if r.reason[0] or r.reason[1]
+        )
+        self.rule_stats = {r.name: [0, 0, 0] for r in self.ruleset.rules}
+        self.rule_stats['_features'] = [0, 0, 0]
+    
+    @property
+    def scored(self) -> bool:
+        return self.ruleset.min_score is not None
+    
+    def _record(self, name: str, hits: int, elapsed_ns: int):
+        stats = self.rule_stats[name]
+        stats[0] += 1
+        stats[1] += hits
+        stats[2] += elapsed_ns
+    
+    def _side_score(self, feats: Dict) -> int:
+        score = 0
+        taken = set()
+        for rule in self._scored:
+            if rule.group is not None and rule.group in taken:
+                continue
+            if self.profile:
+                start = time.perf_counter_ns()
+                hit = bool(feats[rule.condition])
+                self._record(rule.name, int(hit), time.perf_counter_ns() - start)
+            else:
+                hit = feats[rule.condition]
+            if hit:
+                score += rule.weight
+                if rule.group is not None:
+                    taken.add(rule.group)
+        return score
+    
+    def evaluate(self, values: Dict) -> Tuple[Optional[str], int, int, Dict]:
+        """Scalar path for a single candle
+        
+        Returns:
+            (signal, bullish_score, bearish_score, features)
+        """
+        if self.profile:
+            start = time.perf_counter_ns()
+            feats = compute_features(values, self.config)
+            self._record('_features', 0, time.perf_counter_ns() - start)
+        else:
+            feats = compute_features(values, self.config)
+        
+        buy, sell = feats['BUY'], feats['SELL']
+        
+        gate_buy = all(buy[r.condition] for r in self._required)
+        gate_sell = all(sell[r.condition] for r in self._required)
+        
+        if not self.scored:
+            if gate_buy:
+                return 'BUY', 0, 0, feats
+            if gate_sell:
+                return 'SELL', 0, 0, feats
+            return None, 0, 0, feats
+        
+        bullish = self._side_score(buy)
+        bearish = self._side_score(sell)
+        
+        for rule in self._leader:
+            if bullish > bearish:
+                if buy[rule.condition]:
+                    bullish += rule.weight
+            elif bearish > bullish:
+                if sell[rule.condition]:
+                    bearish += rule.weight
+        
+        min_score = self.ruleset.min_score
+        if gate_buy and bullish >= min_score and bullish > bearish:
+            return 'BUY', bullish, bearish, feats
+        if gate_sell and bearish >= min_score and bearish > bullish:
+            return 'SELL', bullish, bearish, feats
+        return None, bullish, bearish, feats
+    
+    def reasons(self, signal: str, feats: Dict) -> List[str]:
+        side = feats[signal]
+        idx = 0 if signal == 'BUY' else 1
+        shown = set()
+        reasons = []
+        for condition, texts, exclusive in self._reasons:
+            if exclusive is not None and exclusive in shown:
+                continue
+            if side[condition]:
+                if texts[idx]:
+                    reasons.append(texts[idx])
+                if exclusive is not None:
+                    shown.add(exclusive)
+        return reasons
+    
+    def _side_score_arrays(self, feats: Dict, n: int) -> np.ndarray:
+        score = np.zeros(n, dtype=np.int32)
+        taken: Dict[str, np.ndarray] = {}
+        for rule in self._scored:
+            start = time.perf_counter_ns() if self.profile else 0
+            hit = np.broadcast_to(np.asarray(feats[rule.condition], dtype=bool), (n,))
+            if rule.group is not None:
+                blocked = taken.get(rule.group)
+                if blocked is not None:
+                    hit = hit & ~blocked
+                    taken[rule.group] = blocked | hit
+                else:
+                    taken[rule.group] = hit
+            score += hit * rule.weight
+            if self.profile:
+                self._record(rule.name, int(hit.sum()), time.perf_counter_ns() - start)
+        return score
+    
+    def evaluate_arrays(self, values: Dict) -> Dict[str, np.ndarray]:
+        """Vectorized path for a whole indicator series
+        
+        Returns:
+            dict with 'direction' (1=BUY, -1=SELL, 0=none), 'bullish_score', 'bearish_score'
+        """
+        n = len(values['close'])
+        
+        start = time.perf_counter_ns() if self.profile else 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            feats = compute_features(values, self.config)
+        if self.profile:
+            self._record('_features', 0, time.perf_counter_ns() - start)
+        
+        buy, sell = feats['BUY'], feats['SELL']
+        
+        gate_buy = np.ones(n, dtype=bool)
+        gate_sell = np.ones(n, dtype=bool)
+        for rule in self._required:
+            gate_buy &= np.asarray(buy[rule.condition], dtype=bool)
+            gate_sell &= np.asarray(sell[rule.condition], dtype=bool)
+        
+        direction = np.zeros(n, dtype=np.int8)
+        
+        if not self.scored:
+            direction[gate_buy] = 1
+            direction[~gate_buy & gate_sell] = -1
+            zeros = np.zeros(n, dtype=np.int32)
+            return {'direction': direction, 'bullish_score': zeros, 'bearish_score': zeros.copy()}
+        
+        bullish = self._side_score_arrays(buy, n)
+        bearish = self._side_score_arrays(sell, n)
+        
+        for rule in self._leader:
+            buy_lead = bullish > bearish
+            sell_lead = bearish > bullish
+            bullish = bullish + (buy_lead & np.asarray(buy[rule.condition], dtype=bool)) * rule.weight
+            bearish = bearish + (sell_lead & np.asarray(sell[rule.condition], dtype=bool)) * rule.weight
+        
+        min_score = self.ruleset.min_score
+        is_buy = gate_buy & (bullish >= min_score) & (bullish > bearish)
+        is_sell = ~is_buy & gate_sell & (bearish >= min_score) & (bearish > bullish)
+        direction[is_buy] = 1
+        direction[is_sell] = -1
+        
+        return {'direction': direction, 'bullish_score': bullish, 'bearish_score': bearish}
+    
+    def get_rule_stats(self) -> Dict[str, Dict]:
+        stats = {}
+        for name, (calls, hits, total_ns) in self.rule_stats.items():
+            stats[name] = {
+                'calls': calls,
+                'hits': hits,
+                'total_ms': total_ns / 1e6,
+                'avg_us': (total_ns / calls / 1e3) if calls else 0.0
+            }
+        return stats
+    
+    def reset_rule_stats(self):
+        self.rule_stats = {name: [0, 0, 0] for name in self.rule_stats}
+
+def _parse_weight_overrides(env_value: str) -> Dict[str, int]:
+    overrides = {}
+    for item in (env_value or '').split(','):
+        if '=' not in item:
+            continue
+        name, weight = item.split('=', 1)
+        try:
+            overrides[name.strip()] = int(weight.strip())
+        except ValueError:
+            logger.warning(f"Invalid rule weight override ignored: {item}")
+    return overrides
+
+def _rule_from_dict(data: Dict) -> SignalRule:
+    reason = data.get('reason', ('', ''))
+    if isinstance(reason, str):
+        reason = (reason, reason)
+    return SignalRule(
+        name=data['name'],
+        condition=data['condition'],
+        weight=int(data.get('weight', 0)),
+        reason=(reason[0], reason[1]),
+        group=data.get('group'),
+        reason_group=data.get('reason_group'),
+        required=bool(data.get('required', False)),
+        leader_bonus=bool(data.get('leader_bonus', False))
+    )
+
+def _merge_rules(rules: Tuple[SignalRule, ...], extra: List[Dict]) -> Tuple[SignalRule, ...]:
+    merged = list(rules)
+    for data in extra:
+        try:
+            rule = _rule_from_dict(data)
+        except (KeyError, TypeError, ValueError, IndexError) as e:
+            logger.warning(f"Invalid rule definition ignored: {data} ({e})")
+            continue
+        if rule.condition not in FEATURES:
+            logger.warning(f"Rule '{rule.name}' ignored: unknown condition '{rule.condition}'")
+            continue
+        for i, existing in enumerate(merged):
+            if existing.name == rule.name:
+                merged[i] = rule
+                break
+        else:
+            merged.append(rule)
+    return tuple(merged)
+
+def load_rulesets(config) -> Dict[str, RuleSet]:
+    """Build the 'auto' and 'manual' RuleSets from the defaults plus configuration
+    
+    STRATEGY_RULE_WEIGHTS: weight override per rule name, e.g. "macd_crossover=3,stoch=2".
+    STRATEGY_RULES_FILE: JSON file {"auto": [...], "manual": [...]} adding or replacing rules.
+    """
+    auto_rules = DEFAULT_AUTO_RULES
+    manual_rules = DEFAULT_MANUAL_RULES
+    
+    rules_file = getattr(config, 'STRATEGY_RULES_FILE', '')
+    if rules_file:
+        if os.path.exists(rules_file):
+            try:
+                with open(rules_file, 'r') as f:
+                    data = json.load(f)
+                auto_rules = _merge_rules(auto_rules, data.get('auto', []))
+                manual_rules = _merge_rules(manual_rules, data.get('manual', []))
+                logger.info(f"Loaded strategy rules from {rules_file}")
+            except (OSError, ValueError, AttributeError) as e:
+                logger.error(f"Error loading strategy rules file {rules_file}: {e}")
+        else:
+            logger.warning(f"Strategy rules file not found: {rules_file}")
+    
+    overrides = _parse_weight_overrides(getattr(config, 'STRATEGY_RULE_WEIGHTS', ''))
+    if overrides:
+        auto_rules = tuple(replace(r, weight=overrides[r.name]) if r.name in overrides else r
+                           for r in auto_rules)
+    
+    return {
+        'auto': RuleSet('auto', auto_rules, min_score=getattr(config, 'SIGNAL_MIN_SCORE', 4)),
+        'manual': RuleSet('manual', manual_rules, min_score=None)
+    }
@@ -0,0 +1,103 @@
+from typing import Awaitable, Callable, Dict, Optional
+from bot.logger import setup_logger
+from bot.clock import Clock
+from bot.notification_queue import NotificationQueue
+
+logger = setup_logger('SLNotifier')
+
+# sender(user_id, update, message_id) -> id of the message now showing the update (None if unknown)
+SLSender = Callable[[int, Dict, Optional[int]], Awaitable[Optional[int]]]
+
+class SLNotificationThrottle:
+    """Coalesces SL-adjustment notifications per position
+    
+    offer() is called from the tick path for every SL move and only keeps the latest
+    one per position. A position gets at most one Telegram call per window: the first
+    move goes out right away, later ones wait for dispatch_due() once the window has
+    passed. After the first message the sender edits it in place. Sends run on the
+    shared NotificationQueue, one in flight per position so edits stay in order.
+    """
+    
+    def __init__(self, queue: NotificationQueue, clock: Clock, sender: SLSender, window_seconds: float = 30.0):
+        self.queue = queue
+        self.clock = clock
+        self.sender = sender
+        self.window = max(window_seconds, 0.0)
+        self._pending: Dict[int, Dict] = {}
+        self._last_sent: Dict[int, float] = {}
+        self._message_ids: Dict[int, int] = {}
+        self._in_flight = set()
+        self.offered = 0
+        self.sent = 0
+        self.edited = 0
+    
+    def offer(self, position_id: int, user_id: int, update: Dict):
+        """Queue the latest SL move of a position; update['old_stop_loss'] of the first unsent move is kept"""
+        self.offered += 1
+        previous = self._pending.get(position_id)
+        update = dict(update, user_id=user_id)
+        if previous is not None:
+            update['old_stop_loss'] = previous['old_stop_loss']
+        self._pending[position_id] = update
+        if self._is_due(position_id, self.clock.time()):
+            self._dispatch(position_id)
+    
+    def _is_due(self, position_id: int, now: float) -> bool:
+        if position_id in self._in_flight:
+            return False
+        last_sent = self._last_sent.get(position_id)
+        return last_sent is None or now - last_sent >= self.window
+    
+    def dispatch_due(self) -> int:
+        """Send every pending update whose window has passed, returning how many were queued"""
+        if not self._pending:
+            return 0
+        now = self.clock.time()
+        due = [position_id for position_id in self._pending if self._is_due(position_id, now)]
+        for position_id in due:
+            self._dispatch(position_id)
+        return len(due)
+    
+    def _dispatch(self, position_id: int):
+        update = self._pending.pop(position_id)
+        message_id = self._message_ids.get(position_id)
+        self._in_flight.add(position_id)
+        self._last_sent[position_id] = self.clock.time()
+        submitted = self.queue.submit(lambda: self._send(position_id, update, message_id),
+                                      f"SL update of position {position_id} for user {update['user_id']}")
+        if not submitted:
+            self._in_flight.discard(position_id)
+            self._pending.setdefault(position_id, update)
+    
+    async def _send(self, position_id: int, update: Dict, message_id: Optional[int]):
+        try:
+            new_message_id = await self.sender(update['user_id'], update, message_id)
+        finally:
+            self._in_flight.discard(position_id)
+        if position_id not in self._last_sent:
+            return
+        self.sent += 1
+        if message_id is not None and new_message_id == message_id:
+            self.edited += 1
+        if new_message_id is not None:
+            self._message_ids[position_id] = new_message_id
+    
+    def forget(self, position_id: int):
+        """Drop a closed position; its exit notification supersedes any pending SL update"""
+        self._pending.pop(position_id, None)
+        self._last_sent.pop(position_id, None)
+        self._message_ids.pop(position_id, None)
+    
+    def clear(self):
+        self._pending.clear()
+        self._last_sent.clear()
+        self._message_ids.clear()
+    
+    def get_stats(self) -> Dict:
+        return {
+            'offered': self.offered,
+            'sent': self.sent,
+            'edited': self.edited,
+            'pending': len(self._pending),
+            'coalesced': self.offered - self.sent - len(self._pending) - len(self._in_flight)
+        }
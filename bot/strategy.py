@@ -1,12 +1,23 @@
 from typing import Optional, Dict
 import json
+import numpy as np
 from bot.logger import setup_logger
+from bot.signal_rules import RuleEvaluator, load_rulesets
 
 logger = setup_logger('Strategy')
 
 class TradingStrategy:
-    def __init__(self, config):
+    def __init__(self, config, rulesets: Optional[Dict] = None):
         self.config = config
+        self.rulesets = rulesets if rulesets is not None else load_rulesets(config)
+        profile = getattr(config, 'STRATEGY_RULE_PROFILING', False)
+        self.evaluators = {
+            source: RuleEvaluator(ruleset, config, profile=profile)
+            for source, ruleset in self.rulesets.items()
+        }
+    
+    def get_rule_stats(self) -> Dict[str, Dict]:
+        return {source: evaluator.get_rule_stats() for source, evaluator in self.evaluators.items()}
     
     def calculate_trend_strength(self, indicators: Dict) -> tuple[float, str]:
         """
@@ -111,160 +122,30 @@ class TradingStrategy:
                 logger.warning("Missing required indicators")
                 return None
             
-            signal = None
-            confidence_reasons = []
-            
-            ema_trend_bullish = ema_short > ema_mid > ema_long
-            ema_trend_bearish = ema_short < ema_mid < ema_long
-            
-            ema_crossover_bullish = (ema_short is not None and ema_mid is not None and 
-                                     ema_short > ema_mid and 
-                                     abs(ema_short - ema_mid) / ema_mid < 0.001)
-            ema_crossover_bearish = (ema_short is not None and ema_mid is not None and 
-                                     ema_short < ema_mid and 
-                                     abs(ema_short - ema_mid) / ema_mid < 0.001)
-            
-            macd_bullish_crossover = False
-            macd_bearish_crossover = False
-            if macd_prev is not None and macd_signal_prev is not None:
-                macd_bullish_crossover = (macd_prev <= macd_signal_prev and macd > macd_signal)
-                macd_bearish_crossover = (macd_prev >= macd_signal_prev and macd < macd_signal)
-            
-            macd_bullish = macd > macd_signal
-            macd_bearish = macd < macd_signal
-            macd_above_zero = macd > 0
-            macd_below_zero = macd < 0
-            
-            rsi_oversold_crossup = False
-            rsi_overbought_crossdown = False
-            if rsi_prev is not None:
-                rsi_oversold_crossup = (rsi_prev < self.config.RSI_OVERSOLD_LEVEL and rsi >= self.config.RSI_OVERSOLD_LEVEL)
-                rsi_overbought_crossdown = (rsi_prev > self.config.RSI_OVERBOUGHT_LEVEL and rsi <= self.config.RSI_OVERBOUGHT_LEVEL)
-            
-            rsi_bullish = rsi is not None and rsi > 50
-            rsi_bearish = rsi is not None and rsi < 50
-            
-            stoch_bullish = False
-            stoch_bearish = False
-            if stoch_k_prev is not None and stoch_d_prev is not None:
-                stoch_bullish = (stoch_k_prev < stoch_d_prev and stoch_k > stoch_d and 
-                                stoch_k < self.config.STOCH_OVERBOUGHT_LEVEL)
-                stoch_bearish = (stoch_k_prev > stoch_d_prev and stoch_k < stoch_d and 
-                                stoch_k > self.config.STOCH_OVERSOLD_LEVEL)
+            values = {
+                'ema_short': ema_short, 'ema_mid': ema_mid, 'ema_long': ema_long,
+                'rsi': rsi, 'rsi_prev': rsi_prev,
+                'stoch_k': stoch_k, 'stoch_d': stoch_d,
+                'stoch_k_prev': stoch_k_prev, 'stoch_d_prev': stoch_d_prev,
+                'macd': macd, 'macd_signal': macd_signal,
+                'macd_prev': macd_prev, 'macd_signal_prev': macd_signal_prev,
+                'volume': volume, 'volume_avg': volume_avg
+            }
+            for key in ('rsi_prev', 'stoch_k_prev', 'stoch_d_prev', 'macd_prev', 'macd_signal_prev'):
+                if values[key] is None:
+                    values[key] = float('nan')
             
-            volume_strong = True
-            if volume is not None and volume_avg is not None:
-                volume_strong = volume > volume_avg * self.config.VOLUME_THRESHOLD_MULTIPLIER
+            evaluator = self.evaluators['auto' if signal_source == 'auto' else 'manual']
+            signal, bullish_score, bearish_score, features = evaluator.evaluate(values)
             
-            if signal_source == 'auto':
-                bullish_score = 0
-                bearish_score = 0
-                
-                if ema_trend_bullish:
-                    bullish_score += 2
-                if ema_trend_bearish:
-                    bearish_score += 2
-                
-                if macd_bullish_crossover:
-                    bullish_score += 2
-                elif macd_bullish:
-                    bullish_score += 1
-                    
-                if macd_bearish_crossover:
-                    bearish_score += 2
-                elif macd_bearish:
-                    bearish_score += 1
-                
-                if rsi_bullish:
-                    bullish_score += 1
-                if rsi_bearish:
-                    bearish_score += 1
-                    
-                if rsi_oversold_crossup:
-                    bullish_score += 1
-                if rsi_overbought_crossdown:
-                    bearish_score += 1
-                
-                if stoch_bullish:
-                    bullish_score += 1
-                if stoch_bearish:
-                    bearish_score += 1
-                
-                if volume_strong:
-                    if bullish_score > bearish_score:
-                        bullish_score += 1
-                    elif bearish_score > bullish_score:
-                        bearish_score += 1
-                
-                min_score_required = 4
-                
-                if bullish_score >= min_score_required and bullish_score > bearish_score:
-                    signal = 'BUY'
-                    if ema_trend_bullish:
-                        confidence_reasons.append("EMA trend bullish")
-                    if macd_bullish_crossover:
-                        confidence_reasons.append("MACD bullish crossover (konfirmasi kuat)")
-                    elif macd_bullish:
-                        confidence_reasons.append("MACD bullish")
-                    if rsi_oversold_crossup:
-                        confidence_reasons.append("RSI keluar dari oversold")
-                    elif rsi_bullish:
-                        confidence_reasons.append("RSI di atas 50 (momentum bullish)")
-                    if stoch_bullish:
-                        confidence_reasons.append("Stochastic konfirmasi bullish")
-                    if volume_strong:
-                        confidence_reasons.append("Volume tinggi konfirmasi")
-                    confidence_reasons.append(f"Signal score: {bullish_score}/{bearish_score}")
-                        
-                elif bearish_score >= min_score_required and bearish_score > bullish_score:
-                    signal = 'SELL'
-                    if ema_trend_bearish:
-                        confidence_reasons.append("EMA trend bearish")
-                    if macd_bearish_crossover:
-                        confidence_reasons.append("MACD bearish crossover (konfirmasi kuat)")
-                    elif macd_bearish:
-                        confidence_reasons.append("MACD bearish")
-                    if rsi_overbought_crossdown:
-                        confidence_reasons.append("RSI keluar dari overbought")
-                    elif rsi_bearish:
-                        confidence_reasons.append("RSI di bawah 50 (momentum bearish)")
-                    if stoch_bearish:
-                        confidence_reasons.append("Stochastic konfirmasi bearish")
-                    if volume_strong:
-                        confidence_reasons.append("Volume tinggi konfirmasi")
-                    confidence_reasons.append(f"Signal score: {bearish_score}/{bullish_score}")
-            else:
-                ema_condition_bullish = ema_trend_bullish or ema_crossover_bullish
-                ema_condition_bearish = ema_trend_bearish or ema_crossover_bearish
-                
-                rsi_condition_bullish = rsi_oversold_crossup or rsi_bullish
-                rsi_condition_bearish = rsi_overbought_crossdown or rsi_bearish
-                
-                if ema_condition_bullish and macd_bullish and rsi_condition_bullish:
-                    signal = 'BUY'
-                    confidence_reasons.append("Manual: EMA bullish")
-                    confidence_reasons.append("MACD bullish (konfirmasi)")
-                    if macd_bullish_crossover:
-                        confidence_reasons.append("MACD fresh crossover")
-                    if rsi_oversold_crossup:
-                        confidence_reasons.append("RSI keluar dari oversold")
-                    elif rsi_bullish:
-                        confidence_reasons.append("RSI bullish")
-                    if stoch_bullish:
-                        confidence_reasons.append("Stochastic konfirmasi bullish")
-                        
-                elif ema_condition_bearish and macd_bearish and rsi_condition_bearish:
-                    signal = 'SELL'
-                    confidence_reasons.append("Manual: EMA bearish")
-                    confidence_reasons.append("MACD bearish (konfirmasi)")
-                    if macd_bearish_crossover:
-                        confidence_reasons.append("MACD fresh crossover")
-                    if rsi_overbought_crossdown:
-                        confidence_reasons.append("RSI keluar dari overbought")
-                    elif rsi_bearish:
-                        confidence_reasons.append("RSI bearish")
-                    if stoch_bearish:
-                        confidence_reasons.append("Stochastic konfirmasi bearish")
+            confidence_reasons = []
+            if signal:
+                confidence_reasons = evaluator.reasons(signal, features)
+                if evaluator.scored:
+                    if signal == 'BUY':
+                        confidence_reasons.append(f"Signal score: {bullish_score}/{bearish_score}")
+                    else:
+                        confidence_reasons.append(f"Signal score: {bearish_score}/{bullish_score}")
             
             if signal:
                 trend_strength, trend_desc = self.calculate_trend_strength(indicators)
@@ -340,6 +221,75 @@ class TradingStrategy:
             logger.error(f"Error detecting signal: {e}")
             return None
     
+    def _rule_values(self, arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        values = {
+            'ema_short': arrays[f'ema_{self.config.EMA_PERIODS[0]}'],
+            'ema_mid': arrays[f'ema_{self.config.EMA_PERIODS[1]}'],
+            'ema_long': arrays[f'ema_{self.config.EMA_PERIODS[2]}'],
+        }
+        for key in ('rsi', 'rsi_prev', 'stoch_k', 'stoch_d', 'stoch_k_prev', 'stoch_d_prev',
+                    'macd', 'macd_signal', 'macd_prev', 'macd_signal_prev',
+                    'volume', 'volume_avg', 'close'):
+            values[key] = arrays[key]
+        return values
+    
+    def calculate_trend_strength_arrays(self, arrays: Dict[str, np.ndarray]) -> np.ndarray:
+        """Vectorized calculate_trend_strength, returns only the strength score per candle"""
+        close = arrays['close']
+        ema_short = arrays[f'ema_{self.config.EMA_PERIODS[0]}']
+        ema_long = arrays[f'ema_{self.config.EMA_PERIODS[2]}']
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ema_separation = np.where(close > 0, np.abs(ema_short - ema_long) / close, np.nan)
+            macd_strength = np.abs(arrays['macd_histogram'])
+            rsi_momentum = np.abs(arrays['rsi'] - 50) / 50
+            volume_avg = arrays['volume_avg']
+            volume_ratio = np.where(volume_avg > 0, arrays['volume'] / volume_avg, np.nan)
+        
+        score = np.zeros(len(close), dtype=np.float64)
+        for value, high, low in ((ema_separation, 0.003, 0.0015), (macd_strength, 0.5, 0.2),
+                                 (rsi_momentum, 0.4, 0.2), (volume_ratio, 1.5, 1.0)):
+            score += np.where(value > high, 0.25, np.where(value > low, 0.15, 0.0))
+        
+        return np.minimum(score, 1.0)
+    
+    def detect_signals_vectorized(self, arrays: Dict[str, np.ndarray], signal_source: str = 'auto') -> Dict[str, np.ndarray]:
+        """Vectorized detect_signal over a whole indicator series
+        
+        arrays comes from IndicatorEngine.get_indicator_arrays. Returns numpy arrays
+        'direction' (1=BUY, -1=SELL, 0=none), 'stop_loss', 'take_profit', 'rr_ratio',
+        'trend_strength', 'bullish_score' and 'bearish_score'; SL/TP are NaN where there is no signal.
+        """
+        evaluator = self.evaluators['auto' if signal_source == 'auto' else 'manual']
+        result = evaluator.evaluate_arrays(self._rule_values(arrays))
+        direction = result['direction']
+        
+        trend_strength = self.calculate_trend_strength_arrays(arrays)
+        dynamic_tp_ratio = np.minimum(np.maximum(1.45 + (trend_strength * 1.05), 1.45), 2.50)
+        
+        atr = arrays['atr']
+        if signal_source == 'auto':
+            sl_distance = np.maximum(atr * self.config.SL_ATR_MULTIPLIER, self.config.DEFAULT_SL_PIPS / self.config.XAUUSD_PIP_VALUE)
+        else:
+            sl_distance = np.maximum(atr * 1.2, 1.0)
+        tp_distance = sl_distance * dynamic_tp_ratio
+        
+        close = arrays['close']
+        side = direction.astype(np.float64)
+        has_signal = direction != 0
+        stop_loss = np.where(has_signal, close - side * sl_distance, np.nan)
+        take_profit = np.where(has_signal, close + side * tp_distance, np.nan)
+        
+        return {
+            'direction': direction,
+            'stop_loss': stop_loss,
+            'take_profit': take_profit,
+            'rr_ratio': dynamic_tp_ratio,
+            'trend_strength': trend_strength,
+            'bullish_score': result['bullish_score'],
+            'bearish_score': result['bearish_score']
+        }
+    
     def validate_signal(self, signal: Dict, current_spread: float = 0) -> tuple[bool, Optional[str]]:
         spread_pips = current_spread * self.config.XAUUSD_PIP_VALUE
         
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from config import ConfigOverride
+from bot.logger import setup_logger
+from bot.strategy import TradingStrategy
+
+logger = setup_logger('StrategyProfiles')
+
+SUPPORTED_TIMEFRAMES = ('M1', 'M5')
+
+@dataclass(frozen=True)
+class StrategyProfile:
+    """Strategy parameters a user can personalize; equal profiles share one evaluation"""
+    timeframe: str
+    min_score: int
+    sl_atr_multiplier: float
+    risk_amount: float
+    
+    @classmethod
+    def default(cls, config) -> 'StrategyProfile':
+        return cls(
+            timeframe='M1',
+            min_score=config.SIGNAL_MIN_SCORE,
+            sl_atr_multiplier=config.SL_ATR_MULTIPLIER,
+            risk_amount=config.FIXED_RISK_AMOUNT
+        )
+    
+    @classmethod
+    def from_preferences(cls, prefs, config) -> 'StrategyProfile':
+        """Build a profile from UserPreferences, unset fields fall back to Config"""
+        default = cls.default(config)
+        if prefs is None:
+            return default
+        
+        timeframe = prefs.preferred_timeframe or default.timeframe
+        if timeframe not in SUPPORTED_TIMEFRAMES:
+            timeframe = default.timeframe
+        
+        return cls(
+            timeframe=timeframe,
+            min_score=prefs.signal_min_score if prefs.signal_min_score is not None else default.min_score,
+            sl_atr_multiplier=(prefs.sl_atr_multiplier if prefs.sl_atr_multiplier is not None
+                               else default.sl_atr_multiplier),
+            risk_amount=prefs.risk_amount if prefs.risk_amount is not None else default.risk_amount
+        )
+    
+    def config_overrides(self) -> Dict:
+        return {
+            'SIGNAL_MIN_SCORE': self.min_score,
+            'SL_ATR_MULTIPLIER': self.sl_atr_multiplier,
+            'FIXED_RISK_AMOUNT': self.risk_amount
+        }
+
+class StrategyProfileEngine:
+    """Resolve per-user profiles and evaluate each distinct profile once per candle
+    
+    Signals are cached per profile against the shared indicator snapshot they were
+    computed from, so every user with the same profile reuses one rule evaluation.
+    """
+    
+    def __init__(self, config, user_manager=None, default_strategy: Optional[TradingStrategy] = None):
+        self.config = config
+        self.user_manager = user_manager
+        self.default_profile = StrategyProfile.default(config)
+        self.strategies: Dict[StrategyProfile, TradingStrategy] = {}
+        if default_strategy is not None:
+            self.strategies[self.default_profile] = default_strategy
+        self.user_profiles: Dict[int, StrategyProfile] = {}
+        self._signal_cache: Dict[Tuple[StrategyProfile, str], Tuple[Dict, Optional[Dict]]] = {}
+        self.evaluations = 0
+        self.cache_hits = 0
+    
+    def get_profile(self, user_id: int) -> StrategyProfile:
+        profile = self.user_profiles.get(user_id)
+        if profile is None:
+            prefs = self.user_manager.get_user_preferences(user_id) if self.user_manager else None
+            profile = StrategyProfile.from_preferences(prefs, self.config)
+            self.user_profiles[user_id] = profile
+        return profile
+    
+    def invalidate(self, user_id: int):
+        """Drop the cached profile after the user's preferences change"""
+        self.user_profiles.pop(user_id, None)
+    
+    def get_strategy(self, profile: StrategyProfile) -> TradingStrategy:
+        strategy = self.strategies.get(profile)
+        if strategy is None:
+            strategy = TradingStrategy(ConfigOverride(self.config, **profile.config_overrides()))
+            self.strategies[profile] = strategy
+        return strategy
+    
+    def group_users(self, user_ids: List[int]) -> Dict[StrategyProfile, List[int]]:
+        groups: Dict[StrategyProfile, List[int]] = {}
+        for user_id in user_ids:
+            groups.setdefault(self.get_profile(user_id), []).append(user_id)
+        return groups
+    
+    def detect_signal(self, profile: StrategyProfile, indicators: Dict,
+                      signal_source: str = 'auto') -> Optional[Dict]:
+        """Signal for a profile, evaluated once per (profile, indicator snapshot)
+        
+        The cache is keyed on the identity of the shared indicator dict, which stays the
+        same object for as long as the candle state does not change. Callers get a copy
+        so per-user handling cannot leak into other users.
+        """
+        cache_key = (profile, signal_source)
+        cached = self._signal_cache.get(cache_key)
+        if cached is not None and cached[0] is indicators:
+            self.cache_hits += 1
+            signal = cached[1]
+        else:
+            self.evaluations += 1
+            signal = self.get_strategy(profile).detect_signal(indicators, profile.timeframe, signal_source)
+            self._signal_cache[cache_key] = (indicators, signal)
+        return dict(signal) if signal else None
+    
+    def get_stats(self, user_ids: Optional[List[int]] = None) -> Dict:
+        user_ids = user_ids if user_ids is not None else list(self.user_profiles.keys())
+        groups = self.group_users(user_ids)
+        return {
+            'users': len(user_ids),
+            'distinct_profiles': len(groups),
+            'evaluations': self.evaluations,
+            'cache_hits': self.cache_hits,
+            'profiles': [
+                {'profile': profile.__dict__.copy(), 'users': len(users)}
+                for profile, users in groups.items()
+            ]
+        }
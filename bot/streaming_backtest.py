@@ -0,0 +1,401 @@
+"""Chunked streaming backtest over candle files too large to load at once
+
+    python -m bot.streaming_backtest data/xauusd_m1.csv --chunk-size 200000 --trades-out trades.csv
+
+Candles are read chunk by chunk (CSV, Parquet, or a directory of .npy columns) on a
+reader thread while the previous chunk is being backtested. Indicator state and the
+open trade are carried across chunk boundaries, so the trades match
+Backtester.run_backtest on the whole file while memory stays bounded by the chunk size
+plus a few numbers per closed trade (see TradeColumns).
+"""
+import argparse
+import csv
+from array import array
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Iterable, Iterator, Optional, Union
+import numpy as np
+import pandas as pd
+from bot.logger import setup_logger
+from bot.indicators import IndicatorEngine, IndicatorStream
+from bot.strategy import TradingStrategy
+from bot.backtester import Backtester, BacktestResult, BacktestTrade, _find_exit, _managed_walk
+from bot import position_engine
+
+logger = setup_logger('StreamingBacktest')
+
+STREAM_CHUNK_SIZE = 100_000
+CANDLE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+TIMESTAMP_COLUMNS = ('timestamp', 'time', 'datetime', 'date')
+
+def _normalize_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    """OHLCV float columns on a UTC DatetimeIndex, whatever the file layout was"""
+    df = df.rename(columns=str.lower)
+    if not isinstance(df.index, pd.DatetimeIndex):
+        column = next((c for c in TIMESTAMP_COLUMNS if c in df.columns), df.columns[0])
+        df = df.set_index(pd.DatetimeIndex(pd.to_datetime(df[column], utc=True), name='timestamp'))
+    elif df.index.tz is None:
+        df.index = df.index.tz_localize('UTC')
+    
+    missing = [c for c in CANDLE_COLUMNS[:4] if c not in df.columns]
+    if missing:
+        raise ValueError(f"Candle data is missing columns: {', '.join(missing)}")
+    if 'volume' not in df.columns:
+        df = df.assign(volume=0.0)
+    return df[list(CANDLE_COLUMNS)].astype(np.float64)
+
+def read_csv_chunks(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    with pd.read_csv(path, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield _normalize_chunk(chunk)
+
+def read_parquet_chunks(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Reading Parquet needs pyarrow (pip install pyarrow)")
+    
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_size):
+        yield _normalize_chunk(batch.to_pandas())
+
+def read_npy_chunks(directory: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Directory with timestamp.npy (ns since epoch, UTC) and one .npy per OHLCV column
+    
+    Same layout as TickData.save; the files are memory-mapped, so only the current
+    chunk is paged in.
+    """
+    timestamp = np.load(os.path.join(directory, 'timestamp.npy'), mmap_mode='r')
+    columns = {}
+    for name in CANDLE_COLUMNS:
+        path = os.path.join(directory, f'{name}.npy')
+        if os.path.exists(path):
+            columns[name] = np.load(path, mmap_mode='r')
+    
+    for start in range(0, len(timestamp), chunk_size):
+        end = min(len(timestamp), start + chunk_size)
+        index = pd.DatetimeIndex(pd.to_datetime(np.asarray(timestamp[start:end], dtype=np.int64), utc=True),
+                                 name='timestamp')
+        yield _normalize_chunk(pd.DataFrame(
+            {name: np.asarray(values[start:end], dtype=np.float64) for name, values in columns.items()},
+            index=index
+        ))
+
+def read_candle_chunks(path: str, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Pick the reader from the path: .npy directory, .parquet, otherwise CSV"""
+    if os.path.isdir(path):
+        return read_npy_chunks(path, chunk_size)
+    if path.lower().endswith(('.parquet', '.pq')):
+        return read_parquet_chunks(path, chunk_size)
+    return read_csv_chunks(path, chunk_size)
+
+class ChunkReader:
+    """Runs a chunk iterator on a background thread, keeping at most `prefetch` chunks queued
+    
+    Parsing the next chunk overlaps with backtesting the current one. Reader errors are
+    re-raised in the consuming thread; close() stops the thread early.
+    """
+    
+    _DONE = object()
+    
+    def __init__(self, chunks: Iterable[pd.DataFrame], prefetch: int = 2):
+        self._chunks = chunks
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read, name='ChunkReader', daemon=True)
+        self._thread.start()
+    
+    def _put(self, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _read(self):
+        try:
+            for chunk in self._chunks:
+                if not self._put(chunk):
+                    return
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(self._DONE)
+    
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
+    
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+class _OpenTrade:
+    """Trade carried from one chunk to the next"""
+    
+    __slots__ = ('trade', 'is_buy', 'stop_loss', 'max_profit')
+    
+    def __init__(self, trade: BacktestTrade):
+        self.trade = trade
+        self.is_buy = trade.signal_type == 'BUY'
+        self.stop_loss = trade.stop_loss
+        self.max_profit = 0.0
+
+class TradeColumns:
+    """The per-trade inputs of the backtest metrics in compact typed columns
+    
+    Holds P/L, duration, entry/exit time (ns) and a result code (1 WIN, -1 LOSS,
+    0 other), 33 bytes per trade, instead of the BacktestTrade objects; apply() feeds
+    them to BacktestResult.calculate_metrics_from_arrays.
+    """
+    
+    RESULT_NAMES = np.array(['', 'WIN', 'LOSS'])
+    
+    def __init__(self):
+        self.profit_loss = array('d')
+        self.duration = array('d')
+        self.entry_time = array('q')
+        self.exit_time = array('q')
+        self.result = array('b')
+    
+    def __len__(self) -> int:
+        return len(self.profit_loss)
+    
+    def append(self, trade: BacktestTrade):
+        exit_time = trade.exit_time if trade.exit_time is not None else trade.entry_time
+        self.profit_loss.append(trade.profit_loss)
+        self.duration.append(trade.duration or 0.0)
+        self.entry_time.append(pd.Timestamp(trade.entry_time).value)
+        self.exit_time.append(pd.Timestamp(exit_time).value)
+        self.result.append(1 if trade.result == 'WIN' else -1 if trade.result == 'LOSS' else 0)
+    
+    def apply(self, result: BacktestResult):
+        """Compute the metrics of result from the collected trades (same as calculate_metrics)"""
+        if not len(self):
+            return
+        results = self.RESULT_NAMES[np.frombuffer(self.result, dtype=np.int8)]
+        result.calculate_metrics_from_arrays(np.frombuffer(self.profit_loss, dtype=np.float64), results,
+                                             np.frombuffer(self.duration, dtype=np.float64),
+                                             np.frombuffer(self.entry_time, dtype=np.int64),
+                                             np.frombuffer(self.exit_time, dtype=np.int64))
+
+class StreamState:
+    """Where a streaming backtest stopped: indicator state, open trade and last candle
+    
+    Feeding more chunks into the same state continues the backtest exactly where it
+    left off (see StreamingBacktester.feed and IncrementalBacktester).
+    """
+    
+    def __init__(self, stream: IndicatorStream):
+        self.stream = stream
+        self.offset = 0
+        self.open_trade: Optional[_OpenTrade] = None
+        self.last_close: Optional[float] = None
+        self.last_time = None
+
+class StreamingBacktester:
+    """Backtester.run_backtest over a stream of candle chunks
+    
+    Signals are detected per chunk with detect_signals_vectorized on IndicatorStream
+    arrays, and SL/TP (or the managed position rules) are resolved with the same
+    helpers as Backtester, resuming an open trade at the start of the next chunk.
+    Indicators match the in-memory run up to floating-point rounding of the rolling
+    means.
+    """
+    
+    def __init__(self, config, chunk_size: int = STREAM_CHUNK_SIZE, prefetch: int = 2):
+        self.config = config
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.backtester = Backtester(config)
+        logger.info(f"Streaming backtester initialized (chunk_size={chunk_size}, prefetch={prefetch})")
+    
+    @staticmethod
+    def position_rules(strategy: TradingStrategy,
+                       manage_positions: Optional[bool] = None) -> Optional[position_engine.PositionRules]:
+        if manage_positions is None:
+            manage_positions = strategy.config.BACKTEST_POSITION_MANAGEMENT
+        return position_engine.PositionRules(strategy.config) if manage_positions else None
+    
+    def new_state(self, strategy: Optional[TradingStrategy] = None) -> StreamState:
+        strategy = strategy or self.backtester.strategy
+        return StreamState(IndicatorStream(IndicatorEngine(strategy.config)))
+    
+    def _advance(self, rules, open_trade: _OpenTrade, high, low, close, start, n):
+        trade = open_trade.trade
+        if rules is None:
+            bar, exit_price = _find_exit(open_trade.is_buy, trade.stop_loss, trade.take_profit,
+                                         high, low, start, n)
+            return bar, exit_price, position_engine.HOLD
+        bar, exit_price, code, open_trade.stop_loss, open_trade.max_profit = _managed_walk(
+            rules, open_trade.is_buy, trade.entry_price, trade.stop_loss, open_trade.stop_loss,
+            trade.take_profit, open_trade.max_profit, high, low, close, start, n
+        )
+        return bar, exit_price, code
+    
+    def _finish(self, open_trade: _OpenTrade, exit_price, exit_time, code) -> BacktestTrade:
+        trade = open_trade.trade
+        trade.close_trade(float(exit_price), exit_time, self.config.XAUUSD_PIP_VALUE)
+        if trade.result == 'UNKNOWN' and code != position_engine.HOLD:
+            trade.result = 'WIN' if trade.profit_loss > 0 else 'LOSS'
+        return trade
+    
+    def feed(self, state: StreamState, chunk: pd.DataFrame, strategy: Optional[TradingStrategy] = None,
+             rules: Optional[position_engine.PositionRules] = None) -> Iterator[BacktestTrade]:
+        """Backtest the next chunk of candles, yielding the trades closed within it"""
+        strategy = strategy or self.backtester.strategy
+        n = len(chunk)
+        if n == 0:
+            return
+        arrays = state.stream.update(chunk)
+        close = arrays['close']
+        high = arrays['high']
+        low = arrays['low']
+        times = chunk.index
+        i = 0
+        
+        if state.open_trade is not None:
+            bar, exit_price, code = self._advance(rules, state.open_trade, high, low, close, 0, n)
+            if bar >= 0:
+                yield self._finish(state.open_trade, exit_price, times[bar], code)
+                state.open_trade = None
+                i = bar + 1
+        
+        if state.open_trade is None and i < n:
+            signals = strategy.detect_signals_vectorized(arrays, 'auto')
+            direction = signals['direction']
+            start = max(0, self.backtester.first_tradable_index(strategy) - state.offset)
+            signal_bars = np.flatnonzero(direction[start:] != 0) + start
+            
+            while True:
+                k = np.searchsorted(signal_bars, i)
+                if k >= len(signal_bars):
+                    break
+                entry = signal_bars[k]
+                state.open_trade = _OpenTrade(BacktestTrade(
+                    signal_type='BUY' if direction[entry] > 0 else 'SELL',
+                    entry_price=float(close[entry]),
+                    entry_time=times[entry],
+                    stop_loss=float(signals['stop_loss'][entry]),
+                    take_profit=float(signals['take_profit'][entry])
+                ))
+                bar, exit_price, code = self._advance(rules, state.open_trade, high, low, close, entry, n)
+                if bar < 0:
+                    break
+                yield self._finish(state.open_trade, exit_price, times[bar], code)
+                state.open_trade = None
+                i = bar + 1
+        
+        state.offset += n
+        state.last_close = float(close[-1])
+        state.last_time = times[-1]
+    
+    def close_open_trade(self, state: StreamState) -> Optional[BacktestTrade]:
+        """The still-open trade closed at the last close, like the end of run_backtest
+        
+        Works on a copy, so the state can still be fed more candles afterwards.
+        """
+        if state.open_trade is None:
+            return None
+        open_trade = state.open_trade
+        trade = open_trade.trade
+        copy = _OpenTrade(BacktestTrade(trade.signal_type, trade.entry_price, trade.entry_time,
+                                        trade.stop_loss, trade.take_profit, trade.symbol, trade.lot_size))
+        copy.stop_loss = open_trade.stop_loss
+        copy.max_profit = open_trade.max_profit
+        return self._finish(copy, state.last_close, state.last_time, position_engine.HOLD)
+    
+    def iter_trades(self, source: Union[str, Iterable[pd.DataFrame]], strategy: Optional[TradingStrategy] = None,
+                    manage_positions: Optional[bool] = None) -> Iterator[BacktestTrade]:
+        """Yield closed trades as soon as they are known
+        
+        source is a file/directory path (see read_candle_chunks) or any iterable of
+        OHLCV DataFrames in time order. A trade still open after the last candle is
+        closed at the final close, like Backtester.run_backtest.
+        """
+        strategy = strategy or self.backtester.strategy
+        rules = self.position_rules(strategy, manage_positions)
+        
+        if isinstance(source, str):
+            source = read_candle_chunks(source, self.chunk_size)
+        state = self.new_state(strategy)
+        for chunk in ChunkReader(source, self.prefetch):
+            yield from self.feed(state, chunk, strategy, rules)
+        
+        trade = self.close_open_trade(state)
+        if trade is not None:
+            yield trade
+    
+    def run(self, source: Union[str, Iterable[pd.DataFrame]], initial_balance: float = 10000.0,
+            strategy: Optional[TradingStrategy] = None,
+            manage_positions: Optional[bool] = None) -> BacktestResult:
+        """Metrics of iter_trades as a BacktestResult
+        
+        Trades are reduced to TradeColumns as they close, so result.trades stays empty;
+        use iter_trades for the trades themselves.
+        """
+        started = time.perf_counter()
+        result = BacktestResult()
+        result.initial_balance = initial_balance
+        columns = TradeColumns()
+        for trade in self.iter_trades(source, strategy, manage_positions):
+            columns.append(trade)
+        columns.apply(result)
+        
+        logger.info(f"Streaming backtest completed: {result.total_trades} trades, "
+                    f"Win Rate: {result.win_rate:.1f}% in {time.perf_counter() - started:.2f}s")
+        return result
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Chunked streaming backtest over a candle file')
+    parser.add_argument('source', help='CSV/Parquet file or directory of .npy columns')
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE, help='candles per chunk')
+    parser.add_argument('--prefetch', type=int, default=2, help='chunks read ahead by the reader thread')
+    parser.add_argument('--balance', type=float, default=10000.0, help='initial balance')
+    parser.add_argument('--manage-positions', choices=('auto', 'on', 'off'), default='auto',
+                        help='dynamic SL / trailing stop (auto: BACKTEST_POSITION_MANAGEMENT)')
+    parser.add_argument('--trades-out', help='write closed trades to this CSV as they are produced')
+    args = parser.parse_args(argv)
+    
+    from config import Config
+    
+    manage_positions = None if args.manage_positions == 'auto' else args.manage_positions == 'on'
+    backtester = StreamingBacktester(Config, chunk_size=args.chunk_size, prefetch=args.prefetch)
+    result = BacktestResult()
+    result.initial_balance = args.balance
+    columns = TradeColumns()
+    
+    out = open(args.trades_out, 'w', newline='') if args.trades_out else None
+    writer = None
+    try:
+        for trade in backtester.iter_trades(args.source, manage_positions=manage_positions):
+            columns.append(trade)
+            if out is not None:
+                row = trade.to_dict()
+                if writer is None:
+                    writer = csv.DictWriter(out, fieldnames=list(row.keys()))
+                    writer.writeheader()
+                writer.writerow(row)
+    finally:
+        if out is not None:
+            out.close()
+    
+    columns.apply(result)
+    print(backtester.backtester.format_backtest_report(result))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,23 @@
 import asyncio
 import gc
-from datetime import datetime, time, timedelta
+from datetime import time, timedelta
 from typing import Callable, Optional, Dict, List
 import pytz
 from bot.logger import setup_logger
+from bot.clock import Clock, RealClock
 
 logger = setup_logger('TaskScheduler')
 
 class ScheduledTask:
     def __init__(self, name: str, func: Callable, interval: Optional[int] = None,
-                 schedule_time: Optional[time] = None, timezone: str = 'Asia/Jakarta'):
+                 schedule_time: Optional[time] = None, timezone: str = 'Asia/Jakarta',
+                 clock: Optional[Clock] = None):
         self.name = name
         self.func = func
         self.interval = interval
         self.schedule_time = schedule_time
         self.timezone = pytz.timezone(timezone)
+        self.clock = clock or RealClock()
         self.last_run = None
         self.next_run = None
         self.enabled = True
@@ -25,7 +28,7 @@ class ScheduledTask:
         self._calculate_next_run()
     
     def _calculate_next_run(self):
-        now = datetime.now(self.timezone)
+        now = self.clock.now(self.timezone)
         
         if self.schedule_time:
             next_run = now.replace(
@@ -53,7 +56,7 @@ class ScheduledTask:
         if self.next_run is None:
             return False
         
-        now = datetime.now(self.timezone)
+        now = self.clock.now(self.timezone)
         return now >= self.next_run
     
     async def execute(self):
@@ -66,7 +69,7 @@ class ScheduledTask:
             else:
                 self.func()
             
-            self.last_run = datetime.now(self.timezone)
+            self.last_run = self.clock.now(self.timezone)
             self.run_count += 1
             self._calculate_next_run()
             
@@ -103,8 +106,9 @@ class ScheduledTask:
         }
 
 class TaskScheduler:
-    def __init__(self, config):
+    def __init__(self, config, clock: Optional[Clock] = None):
         self.config = config
+        self.clock = clock or RealClock()
         self.tasks: Dict[str, ScheduledTask] = {}
         self.running = False
         self.scheduler_task = None
@@ -116,7 +120,7 @@ class TaskScheduler:
         if name in self.tasks:
             logger.warning(f"Task {name} already exists, replacing")
         
-        task = ScheduledTask(name, func, interval, schedule_time, timezone)
+        task = ScheduledTask(name, func, interval, schedule_time, timezone, self.clock)
         self.tasks[name] = task
         
         logger.info(f"Task added: {name} (interval={interval}s, schedule={schedule_time})")
@@ -175,14 +179,14 @@ class TaskScheduler:
                             
                             execution_task.add_done_callback(remove_task)
                     
-                    await asyncio.sleep(1)
+                    await self.clock.sleep(1)
                     
                 except asyncio.CancelledError:
                     logger.info("Scheduler loop cancelled")
                     break
                 except Exception as e:
                     logger.error(f"Error in scheduler loop: {e}")
-                    await asyncio.sleep(5)
+                    await self.clock.sleep(5)
         finally:
             logger.info("Scheduler loop exiting")
     
@@ -300,9 +304,8 @@ def setup_default_tasks(scheduler: TaskScheduler, bot_components: Dict):
             session = db_manager.get_session()
             try:
                 from bot.database import Trade
-                from datetime import datetime, timedelta
                 
-                cutoff = datetime.utcnow() - timedelta(days=90)
+                cutoff = scheduler.clock.utcnow() - timedelta(days=90)
                 old_trades = session.query(Trade).filter(
                     Trade.signal_time < cutoff,
                     Trade.status == 'CLOSED'
@@ -326,12 +329,16 @@ def setup_default_tasks(scheduler: TaskScheduler, bot_components: Dict):
             else:
                 logger.warning("Health check: No price data available")
     
+        position_tracker = bot_components.get('position_tracker')
+        if position_tracker:
+            logger.info(f"Position engine: {position_tracker.format_engine_stats()}")
+    
     async def monitor_positions():
         position_tracker = bot_components.get('position_tracker')
         if position_tracker:
             updated = await position_tracker.monitor_active_positions()
             if updated:
-                logger.info(f"Position monitoring: {len(updated)} positions updated")
+                logger.info(f"Position monitoring: {len(updated)} positions closed")
             else:
                 logger.debug("Position monitoring: Tidak ada active positions")
     
@@ -4,16 +4,20 @@ from telegram.ext import Application, CommandHandler, ContextTypes
 from datetime import datetime, timedelta
 import pytz
 import pandas as pd
-from typing import Optional, List
+from typing import Optional, List, Dict
 from bot.logger import setup_logger, mask_user_id, mask_token, sanitize_log_message
 from bot.database import Trade, Position, Performance
+from bot.indicators import IndicatorEngine
+from bot.strategy_profiles import StrategyProfileEngine, SUPPORTED_TIMEFRAMES
+from bot.clock import Clock, RealClock
 
 logger = setup_logger('TelegramBot')
 
 class TradingBot:
     def __init__(self, config, db_manager, strategy, risk_manager, 
                  market_data, position_tracker, chart_generator,
-                 alert_system=None, error_handler=None, user_manager=None):
+                 alert_system=None, error_handler=None, user_manager=None, shadow_runner=None,
+                 clock: Optional[Clock] = None):
         self.config = config
         self.db = db_manager
         self.strategy = strategy
@@ -24,6 +28,11 @@ class TradingBot:
         self.alert_system = alert_system
         self.error_handler = error_handler
         self.user_manager = user_manager
+        self.shadow_runner = shadow_runner
+        self.clock = clock or RealClock()
+        self.indicator_engine = IndicatorEngine(config)
+        self.profile_engine = StrategyProfileEngine(config, user_manager, strategy)
+        self._indicator_cache = {}
         self.app = None
         self.monitoring = False
         self.monitoring_chats = []
@@ -85,7 +94,7 @@ class TradingBot:
             "/getsignal - Dapatkan sinyal manual\n"
             "/riwayat - Lihat riwayat trading\n"
             "/performa - Statistik performa\n"
-            "/settings - Lihat konfigurasi\n"
+            "/settings - Lihat/ubah konfigurasi & profil strategi\n"
         )
         
         if self.is_admin(update.effective_user.id):
@@ -176,37 +185,55 @@ class TradingBot:
         else:
             await update.message.reply_text("⚠️ Monitoring tidak sedang berjalan untuk Anda.")
     
+    async def get_shared_indicators(self, df: pd.DataFrame, timeframe: str = 'M1') -> Optional[Dict]:
+        """Indicators for the latest candles, computed once per distinct candle state
+        
+        Every monitoring loop, /getsignal and the shadow runner share the result (one
+        entry per timeframe); EMA periods only shadow candidates need are included.
+        """
+        last = df.iloc[-1]
+        cache_key = (len(df), df.index[-1], float(last['close']), float(last['high']),
+                     float(last['low']), float(last.get('volume', 0)))
+        cached = self._indicator_cache.get(timeframe)
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+        
+        extra_ema_periods = self.shadow_runner.extra_ema_periods() if self.shadow_runner else None
+        indicators = self.indicator_engine.get_indicators(df, extra_ema_periods)
+        self._indicator_cache[timeframe] = (cache_key, indicators)
+        return indicators
+    
     async def _monitoring_loop(self, chat_id: int):
         tick_queue = await self.market_data.subscribe_ticks(f'telegram_bot_{chat_id}')
         logger.debug(f"Monitoring started for user {mask_user_id(chat_id)}")
         
-        last_signal_check = datetime.now() - timedelta(seconds=self.config.SIGNAL_COOLDOWN_SECONDS)
+        last_signal_check = self.clock.now() - timedelta(seconds=self.config.SIGNAL_COOLDOWN_SECONDS)
         
         try:
             while self.monitoring and chat_id in self.monitoring_chats:
                 try:
                     tick = await tick_queue.get()
                     
-                    now = datetime.now()
+                    now = self.clock.now()
                     time_since_last_check = (now - last_signal_check).total_seconds()
                     
                     if time_since_last_check < self.config.SIGNAL_COOLDOWN_SECONDS:
                         continue
                     
-                    df_m1 = await self.market_data.get_historical_data('M1', 100)
+                    profile = self.profile_engine.get_profile(chat_id)
+                    strategy = self.profile_engine.get_strategy(profile)
+                    df = await self.market_data.get_historical_data(profile.timeframe, 100)
                     
-                    if df_m1 is None:
+                    if df is None:
                         continue
                     
-                    candle_count = len(df_m1)
+                    candle_count = len(df)
                     
                     if candle_count >= 30:
-                        from bot.indicators import IndicatorEngine
-                        indicator_engine = IndicatorEngine(self.config)
-                        indicators = indicator_engine.get_indicators(df_m1)
+                        indicators = await self.get_shared_indicators(df, profile.timeframe)
                         
                         if indicators:
-                            signal = self.strategy.detect_signal(indicators, 'M1', signal_source='auto')
+                            signal = self.profile_engine.detect_signal(profile, indicators, signal_source='auto')
                             
                             if signal:
                                 can_trade, rejection_reason = self.risk_manager.can_trade(chat_id, signal['signal'])
@@ -216,14 +243,14 @@ class TradingBot:
                                     spread_value = await self.market_data.get_spread()
                                     spread = spread_value if spread_value else 0.5
                                     
-                                    is_valid, validation_msg = self.strategy.validate_signal(signal, spread)
+                                    is_valid, validation_msg = strategy.validate_signal(signal, spread)
                                     
                                     if is_valid:
                                         async with self.signal_lock:
                                             if self.position_tracker.has_active_position(chat_id):
                                                 continue
                                             
-                                            await self._send_signal(chat_id, chat_id, signal, df_m1)
+                                            await self._send_signal(chat_id, chat_id, signal, df)
                                         
                                         self.risk_manager.record_signal(chat_id)
                                         last_signal_check = now
@@ -236,7 +263,7 @@ class TradingBot:
                     break
                 except Exception as e:
                     logger.error(f"Error processing tick dalam monitoring loop: {e}")
-                    await asyncio.sleep(1)
+                    await self.clock.sleep(1)
                     
         finally:
             await self.market_data.unsubscribe_ticks(f'telegram_bot_{chat_id}')
@@ -307,7 +334,7 @@ class TradingBot:
                             await self.app.bot.send_photo(chat_id=chat_id, photo=photo)
                         
                         if self.config.CHART_AUTO_DELETE:
-                            await asyncio.sleep(2)
+                            await self.clock.sleep(2)
                             self.chart_generator.delete_chart(chart_path)
                             logger.info(f"Auto-deleted chart after sending: {chart_path}")
                     else:
@@ -394,7 +421,7 @@ class TradingBot:
             
             win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
             
-            today = datetime.now(pytz.timezone('Asia/Jakarta')).replace(hour=0, minute=0, second=0, microsecond=0)
+            today = self.clock.now(pytz.timezone('Asia/Jakarta')).replace(hour=0, minute=0, second=0, microsecond=0)
             today_utc = today.astimezone(pytz.UTC)
             
             today_trades = session.query(Trade).filter(
@@ -461,16 +488,19 @@ class TradingBot:
                 if not position_db:
                     continue
                 
-                signal_type = pos_data['signal_type']
-                entry_price = pos_data['entry_price']
-                current_sl = pos_data['stop_loss']
-                original_sl = pos_data.get('original_sl', current_sl)
-                take_profit = pos_data['take_profit']
-                sl_count = pos_data.get('sl_adjustment_count', 0)
-                max_profit = pos_data.get('max_profit_reached', 0.0)
+                signal_type = pos_data.signal_type
+                entry_price = pos_data.entry_price
+                current_sl = pos_data.stop_loss
+                original_sl = pos_data.original_sl
+                take_profit = pos_data.take_profit
+                sl_count = pos_data.sl_adjustment_count
+                max_profit = pos_data.max_profit_reached
                 
                 unrealized_pl = position_db.unrealized_pl or 0.0
                 current_price = position_db.current_price or entry_price
+                mark = self.position_tracker.get_mark(pos_id)
+                if mark is not None:
+                    current_price, unrealized_pl = mark
                 
                 pl_emoji = "🟢" if unrealized_pl > 0 else "🔴" if unrealized_pl < 0 else "⚪"
                 
@@ -533,21 +563,21 @@ class TradingBot:
                 )
                 return
             
-            df_m1 = await self.market_data.get_historical_data('M1', 100)
+            profile = self.profile_engine.get_profile(user_id)
+            strategy = self.profile_engine.get_strategy(profile)
+            df = await self.market_data.get_historical_data(profile.timeframe, 100)
             
-            if df_m1 is None or len(df_m1) < 30:
+            if df is None or len(df) < 30:
                 await update.message.reply_text(
                     "⚠️ *Data Tidak Cukup*\n\n"
                     "Belum cukup data candle untuk analisis.\n"
-                    f"Candles: {len(df_m1) if df_m1 is not None else 0}/30\n\n"
+                    f"Candles: {len(df) if df is not None else 0}/30\n\n"
                     "Tunggu beberapa saat dan coba lagi.",
                     parse_mode='Markdown'
                 )
                 return
             
-            from bot.indicators import IndicatorEngine
-            indicator_engine = IndicatorEngine(self.config)
-            indicators = indicator_engine.get_indicators(df_m1)
+            indicators = await self.get_shared_indicators(df, profile.timeframe)
             
             if not indicators:
                 await update.message.reply_text(
@@ -558,7 +588,7 @@ class TradingBot:
                 )
                 return
             
-            signal = self.strategy.detect_signal(indicators, 'M1', signal_source='manual')
+            signal = self.profile_engine.detect_signal(profile, indicators, signal_source='manual')
             
             if not signal:
                 trend_strength = indicators.get('trend_strength', 'UNKNOWN')
@@ -579,7 +609,7 @@ class TradingBot:
             spread_value = await self.market_data.get_spread()
             spread = spread_value if spread_value else 0.5
             
-            is_valid, validation_msg = self.strategy.validate_signal(signal, spread)
+            is_valid, validation_msg = strategy.validate_signal(signal, spread)
             
             if not is_valid:
                 await update.message.reply_text(
@@ -588,7 +618,7 @@ class TradingBot:
                 )
                 return
             
-            await self._send_signal(user_id, update.effective_chat.id, signal, df_m1)
+            await self._send_signal(user_id, update.effective_chat.id, signal, df)
             self.risk_manager.record_signal(user_id)
             
             if self.user_manager:
@@ -599,25 +629,77 @@ class TradingBot:
             await update.message.reply_text("❌ Error membuat sinyal. Coba lagi nanti.")
     
     async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        if not self.is_authorized(update.effective_user.id):
+        user_id = update.effective_user.id
+        if not self.is_authorized(user_id):
             return
         
+        if context.args:
+            await self._update_strategy_profile(update, context.args)
+            return
+        
+        profile = self.profile_engine.get_profile(user_id)
+        
         msg = (
             "⚙️ *Bot Configuration*\n\n"
             f"*Mode:* {'DRY RUN' if self.config.DRY_RUN else 'LIVE'}\n"
             f"*Lot Size:* {self.config.LOT_SIZE:.2f}\n"
-            f"*Fixed Risk:* ${self.config.FIXED_RISK_AMOUNT:.2f}\n"
             f"*Daily Loss Limit:* {self.config.DAILY_LOSS_PERCENT}%\n"
             f"*Signal Cooldown:* {self.config.SIGNAL_COOLDOWN_SECONDS}s\n"
-            f"*Trailing Stop Threshold:* ${self.config.TRAILING_STOP_PROFIT_THRESHOLD:.2f}\n"
-            f"*Breakeven Threshold:* ${self.config.BREAKEVEN_PROFIT_THRESHOLD:.2f}\n\n"
+            f"*Trailing Stop Threshold:* ${self.config.TRAILING_STOP_PROFIT_THRESHOLD:.2f}\n\n"
             f"*EMA Periods:* {', '.join(map(str, self.config.EMA_PERIODS))}\n"
             f"*RSI Period:* {self.config.RSI_PERIOD}\n"
-            f"*ATR Period:* {self.config.ATR_PERIOD}\n"
+            f"*ATR Period:* {self.config.ATR_PERIOD}\n\n"
+            "🎯 *Profil Strategi Anda*\n"
+            f"*Timeframe:* {profile.timeframe}\n"
+            f"*Min Score:* {profile.min_score}\n"
+            f"*SL Multiplier:* {profile.sl_atr_multiplier:.2f}x ATR\n"
+            f"*Fixed Risk:* ${profile.risk_amount:.2f}\n\n"
+            "Ubah: /settings timeframe M5 | minscore 3 | sl 1.5 | risk 2 | reset"
         )
         
         await update.message.reply_text(msg, parse_mode='Markdown')
     
+    async def _update_strategy_profile(self, update: Update, args: List[str]):
+        user_id = update.effective_user.id
+        
+        if not self.user_manager:
+            await update.message.reply_text("⚠️ User management tidak tersedia.")
+            return
+        
+        key = args[0].lower()
+        value = args[1] if len(args) > 1 else None
+        
+        try:
+            if key == 'reset':
+                changes = {'preferred_timeframe': 'M1', 'signal_min_score': None,
+                           'sl_atr_multiplier': None, 'risk_amount': None}
+            elif key == 'timeframe' and value and value.upper() in SUPPORTED_TIMEFRAMES:
+                changes = {'preferred_timeframe': value.upper()}
+            elif key == 'minscore' and value and 1 <= int(value) <= 10:
+                changes = {'signal_min_score': int(value)}
+            elif key == 'sl' and value and 0.1 <= float(value) <= 10:
+                changes = {'sl_atr_multiplier': float(value)}
+            elif key == 'risk' and value and 0 < float(value) <= 1000:
+                changes = {'risk_amount': float(value)}
+            else:
+                raise ValueError(key)
+        except ValueError:
+            await update.message.reply_text(
+                "❌ Format salah.\n\n"
+                f"Contoh: /settings timeframe {'/'.join(SUPPORTED_TIMEFRAMES)}\n"
+                "/settings minscore 3\n"
+                "/settings sl 1.5\n"
+                "/settings risk 2\n"
+                "/settings reset"
+            )
+            return
+        
+        if self.user_manager.update_user_preferences(user_id, **changes):
+            self.profile_engine.invalidate(user_id)
+            await update.message.reply_text("✅ Profil strategi diperbarui. Ketik /settings untuk melihat.")
+        else:
+            await update.message.reply_text("❌ Gagal menyimpan profil strategi.")
+    
     async def langganan_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         
@@ -726,8 +808,8 @@ class TradingBot:
             
             if self.position_tracker:
                 logger.info("Clearing active positions from memory...")
-                active_pos_count = sum(len(positions) for positions in self.position_tracker.active_positions.values())
-                self.position_tracker.active_positions.clear()
+                active_pos_count = self.position_tracker.get_active_position_count()
+                self.position_tracker.clear_positions()
                 self.position_tracker.stop_monitoring()
                 logger.info(f"Cleared {active_pos_count} positions from tracker")
             else:
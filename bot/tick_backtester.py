@@ -0,0 +1,249 @@
+import os
+import time
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from bot.logger import setup_logger
+from bot.indicators import IndicatorEngine
+from bot.strategy import TradingStrategy
+from bot.backtester import Backtester, BacktestResult, BacktestTrade
+from bot import position_engine
+
+logger = setup_logger('TickBacktester')
+
+TICK_CHUNK_SIZE = 1_000_000
+
+class TickData:
+    """Recorded bid/ask ticks as flat arrays (timestamps in ns since epoch, UTC)
+    
+    Saved as one .npy file per column so a month of ticks can be opened with
+    np.load(mmap_mode='r') and paged in lazily instead of read into memory.
+    """
+    
+    COLUMNS = ('timestamp', 'bid', 'ask')
+    
+    def __init__(self, timestamp: np.ndarray, bid: np.ndarray, ask: np.ndarray):
+        if not (len(timestamp) == len(bid) == len(ask)):
+            raise ValueError("timestamp, bid and ask must have the same length")
+        self.timestamp = timestamp
+        self.bid = bid
+        self.ask = ask
+    
+    def __len__(self):
+        return len(self.timestamp)
+    
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'TickData':
+        """Build from a DataFrame with bid/ask columns and a DatetimeIndex (or 'timestamp' column)"""
+        index = pd.DatetimeIndex(df['timestamp'] if 'timestamp' in df.columns else df.index)
+        if index.tz is not None:
+            index = index.tz_convert('UTC').tz_localize(None)
+        return cls(
+            index.as_unit('ns').asi8.copy(),
+            df['bid'].to_numpy(dtype=np.float64),
+            df['ask'].to_numpy(dtype=np.float64)
+        )
+    
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'timestamp.npy'), np.asarray(self.timestamp, dtype=np.int64))
+        np.save(os.path.join(directory, 'bid.npy'), np.asarray(self.bid, dtype=np.float64))
+        np.save(os.path.join(directory, 'ask.npy'), np.asarray(self.ask, dtype=np.float64))
+        logger.info(f"Saved {len(self)} ticks to {directory}")
+    
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'TickData':
+        mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mode) for name in cls.COLUMNS]
+        return cls(*arrays)
+    
+    def to_candles(self, timeframe_minutes: int = 1, chunk_size: int = TICK_CHUNK_SIZE) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Aggregate mid prices into OHLC candles the same way OHLCBuilder does
+        
+        Returns (candles, last_tick) where last_tick[c] is the index of the final tick of
+        candle c. Volume is the tick count. Ticks are processed in chunks so memory-mapped
+        input is never fully materialized.
+        """
+        period_ns = timeframe_minutes * 60 * 1_000_000_000
+        parts = []
+        n = len(self)
+        
+        for start in range(0, n, chunk_size):
+            end = min(n, start + chunk_size)
+            mid = (self.bid[start:end] + self.ask[start:end]) * 0.5
+            bucket = np.asarray(self.timestamp[start:end]) // period_ns
+            starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+            ends = np.r_[starts[1:], len(bucket)] - 1
+            parts.append({
+                'bucket': bucket[starts],
+                'open': mid[starts],
+                'high': np.maximum.reduceat(mid, starts),
+                'low': np.minimum.reduceat(mid, starts),
+                'close': mid[ends],
+                'volume': (ends - starts + 1).astype(np.float64),
+                'last_tick': ends + start
+            })
+        
+        if not parts:
+            return pd.DataFrame(columns=['open', 'high', 'low', 'close', 'volume']), np.empty(0, dtype=np.int64)
+        
+        merged = {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+        
+        # A candle split across two chunks appears twice in a row: fold it into one row
+        split = np.flatnonzero(merged['bucket'][1:] == merged['bucket'][:-1])
+        if len(split):
+            for first in split:
+                second = first + 1
+                merged['high'][second] = max(merged['high'][first], merged['high'][second])
+                merged['low'][second] = min(merged['low'][first], merged['low'][second])
+                merged['open'][second] = merged['open'][first]
+                merged['volume'][second] += merged['volume'][first]
+            keep = np.ones(len(merged['bucket']), dtype=bool)
+            keep[split] = False
+            merged = {key: value[keep] for key, value in merged.items()}
+        
+        index = pd.to_datetime(merged['bucket'] * period_ns, utc=True)
+        candles = pd.DataFrame({
+            'open': merged['open'], 'high': merged['high'], 'low': merged['low'],
+            'close': merged['close'], 'volume': merged['volume']
+        }, index=pd.DatetimeIndex(index, name='timestamp'))
+        return candles, merged['last_tick'].astype(np.int64)
+
+def _find_tick_event(ticks: TickData, low_level: float, high_level: float, start: int) -> Tuple[int, Optional[float]]:
+    """First tick >= start whose mid price is <= low_level or >= high_level
+    
+    Returns (tick_index, mid_price), or (-1, None) if no tick reaches either level.
+    Scans in growing vectorized chunks.
+    """
+    n = len(ticks)
+    chunk = 256
+    while start < n:
+        end = min(n, start + chunk)
+        mid = (ticks.bid[start:end] + ticks.ask[start:end]) * 0.5
+        hits = np.flatnonzero((mid <= low_level) | (mid >= high_level))
+        if len(hits):
+            j = int(hits[0])
+            return start + j, float(mid[j])
+        start = end
+        chunk = min(chunk * 4, TICK_CHUNK_SIZE)
+    return -1, None
+
+def _tick_exit(ticks: TickData, rules: Optional[position_engine.PositionRules], is_buy: bool,
+               entry_price: float, stop_loss: float, take_profit: float, start: int) -> Tuple[int, Optional[float], int]:
+    """Resolve a trade on ticks, returning (tick_index, mid_price, exit_code) or (-1, None, HOLD)
+    
+    Without rules only SL/TP are checked. With rules every tick that can change the
+    position (see position_engine.event_levels) goes through position_engine.step,
+    exactly as PositionTracker.update_position would process it live.
+    """
+    original_sl = stop_loss
+    max_profit = 0.0
+    while True:
+        if rules is None:
+            low_level, high_level = (stop_loss, take_profit) if is_buy else (take_profit, stop_loss)
+        else:
+            low_level, high_level = position_engine.event_levels(
+                rules, is_buy, entry_price, original_sl, stop_loss, take_profit, max_profit
+            )
+        tick, price = _find_tick_event(ticks, low_level, high_level, start)
+        if tick < 0:
+            return -1, None, position_engine.HOLD
+        
+        if rules is None:
+            code = position_engine.exit_code(is_buy, price, stop_loss, take_profit, False)
+        else:
+            stop_loss, max_profit, _, code, _ = position_engine.step(
+                rules, is_buy, entry_price, original_sl, stop_loss, take_profit, max_profit, price
+            )
+        if code != position_engine.HOLD:
+            return tick, price, code
+        start = tick + 1
+
+class TickBacktester:
+    """Backtest that resolves SL/TP on recorded ticks instead of candle ranges
+    
+    Signals are still produced on candles (built from the same ticks, like the live
+    OHLCBuilder). A trade opens at the last tick of its signal candle and is closed at
+    the first later tick whose mid price crosses SL or TP, at that tick's price, the
+    way PositionTracker closes live positions. Which level was hit first is therefore
+    known exactly. With position management on, dynamic SL and trailing stops are
+    applied tick by tick through position_engine.
+    """
+    
+    def __init__(self, config):
+        self.config = config
+        self.backtester = Backtester(config)
+        logger.info("Tick backtester initialized")
+    
+    def run(self, ticks: TickData, timeframe_minutes: int = 1, initial_balance: float = 10000.0,
+            strategy: Optional[TradingStrategy] = None,
+            manage_positions: Optional[bool] = None) -> BacktestResult:
+        strategy = strategy or self.backtester.strategy
+        if manage_positions is None:
+            manage_positions = strategy.config.BACKTEST_POSITION_MANAGEMENT
+        rules = position_engine.PositionRules(strategy.config) if manage_positions else None
+        started = time.perf_counter()
+        
+        candles, last_tick = ticks.to_candles(timeframe_minutes)
+        result = BacktestResult()
+        result.initial_balance = initial_balance
+        if candles.empty:
+            return result
+        
+        arrays = IndicatorEngine(strategy.config).get_indicator_arrays(candles)
+        signals = strategy.detect_signals_vectorized(arrays, 'auto')
+        direction = signals['direction']
+        stop_losses = signals['stop_loss']
+        take_profits = signals['take_profit']
+        
+        start = self.backtester.first_tradable_index(strategy)
+        signal_candles = np.flatnonzero(direction[start:] != 0) + start
+        signal_ticks = last_tick[signal_candles]
+        
+        pip_value = self.config.XAUUSD_PIP_VALUE
+        n_ticks = len(ticks)
+        
+        def tick_time(i):
+            return pd.Timestamp(int(ticks.timestamp[i]), tz='UTC')
+        
+        last_exit = -1
+        exits: Dict[str, int] = {'TP_HIT': 0, 'SL_HIT': 0, 'DYNAMIC_SL_HIT': 0, 'END': 0}
+        while True:
+            k = np.searchsorted(signal_ticks, last_exit, side='right')
+            if k >= len(signal_candles):
+                break
+            c = signal_candles[k]
+            entry_tick = signal_ticks[k]
+            is_buy = direction[c] > 0
+            
+            trade = BacktestTrade(
+                signal_type='BUY' if is_buy else 'SELL',
+                entry_price=float(arrays['close'][c]),
+                entry_time=tick_time(entry_tick),
+                stop_loss=float(stop_losses[c]),
+                take_profit=float(take_profits[c])
+            )
+            
+            exit_tick, exit_price, code = _tick_exit(ticks, rules, is_buy, trade.entry_price, trade.stop_loss,
+                                                     trade.take_profit, entry_tick + 1)
+            if exit_tick < 0:
+                exit_tick = n_ticks - 1
+                exit_price = float((ticks.bid[exit_tick] + ticks.ask[exit_tick]) * 0.5)
+                reason = 'END'
+            else:
+                reason = position_engine.EXIT_REASONS[code]
+            
+            trade.close_trade(exit_price, tick_time(exit_tick), pip_value)
+            if trade.result == 'UNKNOWN' and reason != 'END':
+                trade.result = 'WIN' if trade.profit_loss > 0 else 'LOSS'
+            result.trades.append(trade)
+            exits[reason] += 1
+            last_exit = exit_tick
+        
+        result.calculate_metrics()
+        
+        logger.info(f"Tick backtest: {n_ticks} ticks, {len(candles)} candles, {result.total_trades} trades "
+                    f"(TP {exits['TP_HIT']}, SL {exits['SL_HIT']}, dynamic SL {exits['DYNAMIC_SL_HIT']}, "
+                    f"open at end {exits['END']}) "
+                    f"in {time.perf_counter() - started:.2f}s")
+        return result
@@ -0,0 +1,74 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Hashable, List, Tuple
+
+class PriceTriggerIndex:
+    """Positions keyed by the price levels at which they next need evaluating
+    
+    Each position has a low trigger (evaluate when price <= level) and a high trigger
+    (evaluate when price >= level), e.g. the band from position_engine.event_levels:
+    SL and TP, plus the dynamic-SL and trailing-stop thresholds. Both sides are kept
+    as sorted level arrays with the keys alongside, so a tick finds the crossed
+    positions with one bisect per side: O(log n + k) instead of touching all n.
+    """
+    
+    def __init__(self):
+        self._low_levels: List[float] = []
+        self._low_keys: List[Hashable] = []
+        self._high_levels: List[float] = []
+        self._high_keys: List[Hashable] = []
+        self._levels: Dict[Hashable, Tuple[float, float]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._levels)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._levels
+    
+    def get(self, key) -> Tuple[float, float]:
+        return self._levels[key]
+    
+    @staticmethod
+    def _remove(levels: List[float], keys: List[Hashable], level: float, key):
+        i = bisect_left(levels, level)
+        while keys[i] != key:
+            i += 1
+        del levels[i]
+        del keys[i]
+    
+    def set(self, key, low_level: float, high_level: float):
+        """Insert or move a position's triggers"""
+        if key in self._levels:
+            if self._levels[key] == (low_level, high_level):
+                return
+            self.discard(key)
+        i = bisect_right(self._low_levels, low_level)
+        self._low_levels.insert(i, low_level)
+        self._low_keys.insert(i, key)
+        i = bisect_right(self._high_levels, high_level)
+        self._high_levels.insert(i, high_level)
+        self._high_keys.insert(i, key)
+        self._levels[key] = (low_level, high_level)
+    
+    def discard(self, key):
+        levels = self._levels.pop(key, None)
+        if levels is None:
+            return
+        self._remove(self._low_levels, self._low_keys, levels[0], key)
+        self._remove(self._high_levels, self._high_keys, levels[1], key)
+    
+    def clear(self):
+        self._low_levels.clear()
+        self._low_keys.clear()
+        self._high_levels.clear()
+        self._high_keys.clear()
+        self._levels.clear()
+    
+    def triggered(self, price: float) -> List[Hashable]:
+        """Keys whose low level is >= price or whose high level is <= price"""
+        low_hits = self._low_keys[bisect_left(self._low_levels, price):]
+        high_hits = self._high_keys[:bisect_right(self._high_levels, price)]
+        if not high_hits:
+            return low_hits
+        if not low_hits:
+            return high_hits
+        return list(dict.fromkeys(low_hits + high_hits))
@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import pytz
 from bot.logger import setup_logger
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, create_engine
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -39,6 +39,9 @@ class UserPreferences(Base):
     preferred_timeframe = Column(String(10), default='M1')
     max_daily_signals = Column(Integer, default=999999)
     timezone = Column(String(50), default='Asia/Jakarta')
+    signal_min_score = Column(Integer)
+    sl_atr_multiplier = Column(Float)
+    risk_amount = Column(Float)
 
 class UserManager:
     def __init__(self, config, db_path: str = 'data/users.db'):
@@ -47,6 +50,7 @@ class UserManager:
         
         engine = create_engine(f'sqlite:///{self.db_path}')
         Base.metadata.create_all(engine)
+        self._migrate_database(engine)
         
         Session = sessionmaker(bind=engine)
         self.session_factory = Session
@@ -54,6 +58,26 @@ class UserManager:
         self.active_users = {}
         logger.info("User manager initialized")
     
+    def _migrate_database(self, engine):
+        """Add strategy profile columns to existing user_preferences tables"""
+        new_columns = {
+            'signal_min_score': 'INTEGER',
+            'sl_atr_multiplier': 'REAL',
+            'risk_amount': 'REAL'
+        }
+        with engine.connect() as conn:
+            try:
+                result = conn.execute(text("PRAGMA table_info(user_preferences)"))
+                columns = [row[1] for row in result]
+                
+                for name, column_type in new_columns.items():
+                    if name not in columns:
+                        conn.execute(text(f"ALTER TABLE user_preferences ADD COLUMN {name} {column_type}"))
+                        conn.commit()
+                        logger.info(f"Database migrated: Added {name} column to user_preferences table")
+            except Exception as e:
+                logger.warning(f"Migration check for user_preferences table: {e}")
+    
     def get_session(self):
         return self.session_factory()
     
@@ -302,7 +326,10 @@ class UserManager:
                 'daily_summary': prefs.daily_summary_enabled,
                 'risk_alerts': prefs.risk_alerts_enabled,
                 'timeframe': prefs.preferred_timeframe,
-                'timezone': prefs.timezone
+                'timezone': prefs.timezone,
+                'signal_min_score': prefs.signal_min_score,
+                'sl_atr_multiplier': prefs.sl_atr_multiplier,
+                'risk_amount': prefs.risk_amount
             }
         
         return info
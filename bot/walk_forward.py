@@ -0,0 +1,186 @@
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from bot.logger import setup_logger
+from bot.backtester import BacktestResult
+from bot.parameter_sweep import ParameterSweep, SweepPool
+
+logger = setup_logger('WalkForward')
+
+@dataclass
+class WalkForwardWindow:
+    index: int
+    is_start: int
+    is_end: int
+    oos_start: int
+    oos_end: int
+    best_params: Optional[Dict] = None
+    in_sample_metrics: Dict = field(default_factory=dict)
+    out_of_sample_metrics: Dict = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict:
+        return {
+            'window': self.index,
+            'is_start': self.is_start,
+            'is_end': self.is_end,
+            'oos_start': self.oos_start,
+            'oos_end': self.oos_end,
+            'best_params': self.best_params,
+            'in_sample_net_profit': self.in_sample_metrics.get('net_profit'),
+            'out_of_sample_net_profit': self.out_of_sample_metrics.get('net_profit'),
+            'out_of_sample_trades': self.out_of_sample_metrics.get('total_trades'),
+            'out_of_sample_win_rate': self.out_of_sample_metrics.get('win_rate')
+        }
+
+class WalkForwardResult:
+    def __init__(self, windows: List[WalkForwardWindow], oos_result: BacktestResult):
+        self.windows = windows
+        self.oos_result = oos_result
+    
+    @property
+    def walk_forward_efficiency(self) -> float:
+        """Mean out-of-sample net profit relative to mean in-sample net profit"""
+        is_profit = [w.in_sample_metrics.get('net_profit', 0.0) for w in self.windows]
+        oos_profit = [w.out_of_sample_metrics.get('net_profit', 0.0) for w in self.windows]
+        if not is_profit or np.mean(is_profit) == 0:
+            return 0.0
+        return float(np.mean(oos_profit) / np.mean(is_profit))
+    
+    def windows_table(self) -> pd.DataFrame:
+        return pd.DataFrame([w.to_dict() for w in self.windows])
+    
+    def to_dict(self) -> Dict:
+        return {
+            'windows': [w.to_dict() for w in self.windows],
+            'out_of_sample': self.oos_result.to_dict(),
+            'walk_forward_efficiency': self.walk_forward_efficiency
+        }
+    
+    def format_report(self) -> str:
+        oos = self.oos_result
+        report = "🔁 *Walk-Forward Results*\n\n"
+        report += f"Windows: {len(self.windows)}\n"
+        report += f"OOS Trades: {oos.total_trades}\n"
+        report += f"OOS Net Profit: ${oos.net_profit:,.2f}\n"
+        report += f"OOS Win Rate: {oos.win_rate:.1f}%\n"
+        report += f"OOS Profit Factor: {oos.profit_factor:.2f}\n"
+        report += f"OOS Max Drawdown: {oos.max_drawdown:.2f}%\n"
+        report += f"WF Efficiency: {self.walk_forward_efficiency:.2f}\n\n"
+        
+        for w in self.windows:
+            report += (f"#{w.index}: IS ${w.in_sample_metrics.get('net_profit', 0.0):.2f} → "
+                       f"OOS ${w.out_of_sample_metrics.get('net_profit', 0.0):.2f} "
+                       f"({w.out_of_sample_metrics.get('total_trades', 0)} trades)\n")
+        
+        return report
+
+class WalkForwardOptimizer:
+    """Rolling in-sample optimization with out-of-sample validation
+    
+    Indicator arrays are computed once over the whole history and every window is a
+    view into them, so overlapping windows reuse the same indicator values (and keep
+    their warm-up) instead of recomputing them per window. All (window, parameter set)
+    evaluations are scheduled on one shared-memory process pool.
+    """
+    
+    def __init__(self, config, max_workers: Optional[int] = None):
+        self.config = config
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.sweep = ParameterSweep(config, max_workers=self.max_workers)
+        logger.info(f"Walk-forward optimizer initialized (max_workers={self.max_workers})")
+    
+    @staticmethod
+    def split_windows(n_bars: int, in_sample_bars: int, out_of_sample_bars: int,
+                      step_bars: Optional[int] = None, anchored: bool = False) -> List[WalkForwardWindow]:
+        """Rolling (or anchored/expanding) in-sample + out-of-sample windows over n_bars
+        
+        step_bars (default out_of_sample_bars) may not be shorter than the out-of-sample
+        window, otherwise the stitched out-of-sample results would count bars twice.
+        """
+        if in_sample_bars <= 0 or out_of_sample_bars <= 0:
+            raise ValueError("in_sample_bars and out_of_sample_bars must be positive")
+        
+        step = step_bars or out_of_sample_bars
+        if step < out_of_sample_bars:
+            raise ValueError(f"step_bars ({step}) must be at least out_of_sample_bars ({out_of_sample_bars}), "
+                             f"overlapping out-of-sample windows would count trades twice")
+        windows = []
+        offset = 0
+        while offset + in_sample_bars + out_of_sample_bars <= n_bars:
+            is_start = 0 if anchored else offset
+            is_end = offset + in_sample_bars
+            windows.append(WalkForwardWindow(
+                index=len(windows),
+                is_start=is_start,
+                is_end=is_end,
+                oos_start=is_end,
+                oos_end=is_end + out_of_sample_bars
+            ))
+            offset += step
+        return windows
+    
+    def run(self, df: pd.DataFrame, param_sets: List[Dict], in_sample_bars: int, out_of_sample_bars: int,
+            step_bars: Optional[int] = None, anchored: bool = False, rank_by: str = 'net_profit',
+            min_trades: int = 1, initial_balance: float = 10000.0) -> WalkForwardResult:
+        """Optimize each in-sample window, then stitch the out-of-sample results
+        
+        The best parameter set of a window is the one with the highest rank_by among sets
+        with at least min_trades in-sample trades. Trades still open at the end of an
+        out-of-sample window are closed at that window's last close.
+        """
+        windows = self.split_windows(len(df), in_sample_bars, out_of_sample_bars, step_bars, anchored)
+        if not windows or not param_sets:
+            logger.warning("Walk-forward: not enough data or no parameter sets")
+            return WalkForwardResult([], BacktestResult())
+        
+        self.sweep._validate(param_sets)
+        
+        started = time.perf_counter()
+        arrays = self.sweep.compute_arrays(df, param_sets)
+        logger.info(f"Walk-forward: {len(windows)} windows x {len(param_sets)} parameter sets "
+                    f"over {len(df)} candles (indicators in {time.perf_counter() - started:.2f}s)")
+        
+        in_sample_tasks = [
+            {'params': params, 'start': w.is_start, 'end': w.is_end, 'initial_balance': initial_balance}
+            for w in windows for params in param_sets
+        ]
+        
+        workers = min(self.max_workers, len(in_sample_tasks))
+        with SweepPool(self.config, arrays, df.index, workers) as pool:
+            rows = pool.map(in_sample_tasks)
+            
+            oos_tasks = []
+            for w in windows:
+                window_rows = rows[w.index * len(param_sets):(w.index + 1) * len(param_sets)]
+                candidates = [r for r in window_rows
+                              if 'error' not in r and r.get('total_trades', 0) >= min_trades]
+                if not candidates:
+                    logger.warning(f"Walk-forward window {w.index}: no parameter set reached {min_trades} trades")
+                    continue
+                
+                best = max(candidates, key=lambda r: r.get(rank_by, float('-inf')))
+                w.best_params = {k: best[k] for k in param_sets[0].keys()}
+                w.in_sample_metrics = {k: v for k, v in best.items() if k not in w.best_params}
+                oos_tasks.append({
+                    'params': w.best_params, 'start': w.oos_start, 'end': w.oos_end,
+                    'initial_balance': initial_balance, 'include_trades': True, 'window': w.index
+                })
+            
+            oos_rows = pool.map(oos_tasks)
+        
+        oos_result = BacktestResult()
+        oos_result.initial_balance = initial_balance
+        for task, row in zip(oos_tasks, oos_rows):
+            window = windows[task['window']]
+            trades = row.pop('trades', [])
+            window.out_of_sample_metrics = {k: v for k, v in row.items() if k not in window.best_params}
+            oos_result.trades.extend(trades)
+        oos_result.calculate_metrics()
+        
+        logger.info(f"Walk-forward completed in {time.perf_counter() - started:.2f}s: "
+                    f"OOS {oos_result.total_trades} trades, net ${oos_result.net_profit:.2f}")
+        
+        return WalkForwardResult(windows, oos_result)
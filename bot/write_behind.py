@@ -0,0 +1,129 @@
+from typing import Dict
+from sqlalchemy import bindparam, case, func
+from bot.logger import setup_logger
+from bot.database import Position
+
+logger = setup_logger('WriteBehind')
+
+WRITE_DURABILITY_MODES = ('relaxed', 'sl', 'full')
+
+class PositionWriteBuffer:
+    """Write-behind buffer for the per-tick price state of open positions
+    
+    record() only keeps the latest current_price / unrealized_pl / SL state per
+    position in memory; flush() writes all of them in one transaction with a single
+    executemany UPDATE. Durability modes:
+      relaxed - everything waits for the next flush
+      sl      - an SL adjustment flushes immediately, price updates are batched
+      full    - write-through, every record() is flushed (the old behaviour)
+    max_profit_reached only ever grows, and closed rows are never touched.
+    """
+    
+    def __init__(self, db_manager, durability: str = 'sl'):
+        if durability not in WRITE_DURABILITY_MODES:
+            logger.warning(f"Unknown write durability '{durability}', using 'sl'")
+            durability = 'sl'
+        self.db = db_manager
+        self.durability = durability
+        self._pending: Dict[int, Dict] = {}
+        self.updates = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        
+        table = Position.__table__
+        new_max_profit = bindparam('b_max_profit')
+        self._statement = table.update().where(
+            table.c.id == bindparam('b_id'),
+            table.c.status == 'ACTIVE'
+        ).values(
+            current_price=bindparam('b_current_price'),
+            unrealized_pl=bindparam('b_unrealized_pl'),
+            last_price_update=bindparam('b_last_price_update'),
+            stop_loss=bindparam('b_stop_loss'),
+            sl_adjustment_count=bindparam('b_sl_adjustment_count'),
+            max_profit_reached=case(
+                (new_max_profit > func.coalesce(table.c.max_profit_reached, 0.0), new_max_profit),
+                else_=table.c.max_profit_reached
+            )
+        )
+    
+    def __len__(self) -> int:
+        return len(self._pending)
+    
+    def record(self, position_id: int, current_price: float, unrealized_pl: float, last_price_update,
+               stop_loss: float, sl_adjustment_count: int, sl_adjusted: bool = False):
+        max_profit = unrealized_pl if unrealized_pl > 0 else 0.0
+        previous = self._pending.get(position_id)
+        if previous is not None and previous['b_max_profit'] > max_profit:
+            max_profit = previous['b_max_profit']
+        
+        self._pending[position_id] = {
+            'b_id': position_id,
+            'b_current_price': current_price,
+            'b_unrealized_pl': unrealized_pl,
+            'b_last_price_update': last_price_update,
+            'b_stop_loss': stop_loss,
+            'b_sl_adjustment_count': sl_adjustment_count,
+            'b_max_profit': max_profit
+        }
+        self.updates += 1
+        
+        if self.durability == 'full' or (sl_adjusted and self.durability == 'sl'):
+            self.flush()
+    
+    def merge_into(self, position: Position):
+        """Move this position's pending row onto an ORM object, e.g. inside its close transaction"""
+        row = self._pending.pop(position.id, None)
+        if row is None:
+            return
+        position.current_price = row['b_current_price']
+        position.unrealized_pl = row['b_unrealized_pl']
+        position.last_price_update = row['b_last_price_update']
+        position.stop_loss = row['b_stop_loss']
+        position.sl_adjustment_count = row['b_sl_adjustment_count']
+        if row['b_max_profit'] > (position.max_profit_reached or 0.0):
+            position.max_profit_reached = row['b_max_profit']
+        self.rows_written += 1
+    
+    def discard(self, position_id: int):
+        self._pending.pop(position_id, None)
+    
+    def clear(self):
+        self._pending.clear()
+    
+    def flush(self) -> int:
+        """Write every pending row in one transaction, returning the number of rows"""
+        if not self._pending:
+            return 0
+        rows = list(self._pending.values())
+        self._pending = {}
+        
+        session = self.db.get_session()
+        try:
+            session.execute(self._statement, rows)
+            session.commit()
+        except Exception as e:
+            logger.error(f"Error flushing {len(rows)} position updates: {e}")
+            session.rollback()
+            self.failed_flushes += 1
+            for row in rows:
+                self._pending.setdefault(row['b_id'], row)
+            return 0
+        finally:
+            session.close()
+        
+        self.flushes += 1
+        self.rows_written += len(rows)
+        return len(rows)
+    
+    def get_stats(self) -> Dict:
+        return {
+            'durability': self.durability,
+            'pending': len(self._pending),
+            'updates': self.updates,
+            'rows_written': self.rows_written,
+            'flushes': self.flushes,
+            'failed_flushes': self.failed_flushes,
+            'coalesced': self.updates - self.rows_written - len(self._pending)
+        }
@@ -55,6 +55,25 @@ def _parse_int_list(env_value: str, default_list: list) -> list:
     except (ValueError, AttributeError):
         return default_list
 
+class ConfigOverride:
+    """Config view with some attributes replaced, used for per-run parameter sets"""
+    
+    def __init__(self, base, **overrides):
+        self._base = base
+        self._overrides = overrides
+    
+    def __getattr__(self, name):
+        overrides = self.__dict__.get('_overrides', {})
+        if name in overrides:
+            return overrides[name]
+        return getattr(self.__dict__['_base'], name)
+    
+    def __getstate__(self):
+        return self.__dict__
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
 class Config:
     TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
     TELEGRAM_WEBHOOK_MODE = os.getenv('TELEGRAM_WEBHOOK_MODE', 'false').lower() == 'true'
@@ -133,6 +152,14 @@ class Config:
     VOLUME_THRESHOLD_MULTIPLIER = _get_float_env('VOLUME_THRESHOLD_MULTIPLIER', '0.5')
     MAX_SPREAD_PIPS = _get_float_env('MAX_SPREAD_PIPS', '10.0')
     
+    SIGNAL_MIN_SCORE = _get_int_env('SIGNAL_MIN_SCORE', '4')
+    STRATEGY_RULE_WEIGHTS = os.getenv('STRATEGY_RULE_WEIGHTS', '')
+    STRATEGY_RULES_FILE = os.getenv('STRATEGY_RULES_FILE', '')
+    STRATEGY_RULE_PROFILING = os.getenv('STRATEGY_RULE_PROFILING', 'false').lower() == 'true'
+    
+    SHADOW_MODE_ENABLED = os.getenv('SHADOW_MODE_ENABLED', 'false').lower() == 'true'
+    SHADOW_STRATEGIES_FILE = os.getenv('SHADOW_STRATEGIES_FILE', '')
+    
     SL_ATR_MULTIPLIER = _get_float_env('SL_ATR_MULTIPLIER', '1.0')
     DEFAULT_SL_PIPS = _get_float_env('DEFAULT_SL_PIPS', '20.0')
     TP_RR_RATIO = _get_float_env('TP_RR_RATIO', '1.5')
@@ -148,16 +175,35 @@ class Config:
     DYNAMIC_SL_TIGHTENING_MULTIPLIER = _get_float_env('DYNAMIC_SL_TIGHTENING_MULTIPLIER', '0.5')
     TRAILING_STOP_PROFIT_THRESHOLD = _get_float_env('TRAILING_STOP_PROFIT_THRESHOLD', '1.0')
     TRAILING_STOP_DISTANCE_PIPS = _get_float_env('TRAILING_STOP_DISTANCE_PIPS', '5.0')
+    BACKTEST_POSITION_MANAGEMENT = os.getenv('BACKTEST_POSITION_MANAGEMENT', 'true').lower() == 'true'
+    BACKTEST_CACHE_ENABLED = os.getenv('BACKTEST_CACHE_ENABLED', 'true').lower() == 'true'
+    BACKTEST_CACHE_DIR = os.getenv('BACKTEST_CACHE_DIR', 'data/backtest_cache')
+    BACKTEST_CACHE_MAX_MB = _get_int_env('BACKTEST_CACHE_MAX_MB', '500')
+    BACKTEST_CACHE_MAX_AGE_HOURS = _get_int_env('BACKTEST_CACHE_MAX_AGE_HOURS', '168')
+    BACKTEST_CHECKPOINT_DIR = os.getenv('BACKTEST_CHECKPOINT_DIR', 'data/backtest_checkpoints')
+    PORTFOLIO_MAX_OPEN_POSITIONS = _get_int_env('PORTFOLIO_MAX_OPEN_POSITIONS', '0')
     
     CHART_AUTO_DELETE = os.getenv('CHART_AUTO_DELETE', 'true').lower() == 'true'
     CHART_EXPIRY_MINUTES = _get_int_env('CHART_EXPIRY_MINUTES', '60')
+    NOTIFICATION_WORKERS = _get_int_env('NOTIFICATION_WORKERS', '2')
+    NOTIFICATION_QUEUE_SIZE = _get_int_env('NOTIFICATION_QUEUE_SIZE', '100')
+    SL_NOTIFICATION_WINDOW_SECONDS = _get_float_env('SL_NOTIFICATION_WINDOW_SECONDS', '30.0')
     
     WS_DISCONNECT_ALERT_SECONDS = _get_int_env('WS_DISCONNECT_ALERT_SECONDS', '30')
     
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'data/bot.db')
+    POSITION_FLUSH_INTERVAL_MS = _get_int_env('POSITION_FLUSH_INTERVAL_MS', '1000')
+    POSITION_WRITE_DURABILITY = os.getenv('POSITION_WRITE_DURABILITY', 'sl').lower()
+    POSITION_EVAL_INTERVAL_MS = _get_int_env('POSITION_EVAL_INTERVAL_MS', '0')
+    POSITION_EVENT_LOG = os.getenv('POSITION_EVENT_LOG', 'true').lower() == 'true'
+    POSITION_SNAPSHOT_EVERY = _get_int_env('POSITION_SNAPSHOT_EVERY', '1000')
     
     DRY_RUN = os.getenv('DRY_RUN', 'false').lower() == 'true'
     
+    CLOCK_MODE = os.getenv('CLOCK_MODE', 'real').lower()
+    CLOCK_SPEED = _get_float_env('CLOCK_SPEED', '60.0')
+    REPLAY_TICKS_DIR = os.getenv('REPLAY_TICKS_DIR', '')
+    
     HEALTH_CHECK_PORT = _get_int_env('PORT', '8080')
     
     XAUUSD_PIP_VALUE = 10.0
@@ -2,6 +2,8 @@ import asyncio
 import signal
 import sys
 import os
+from datetime import datetime
+import pytz
 from aiohttp import web
 from typing import Optional
 from sqlalchemy import text
@@ -19,6 +21,9 @@ from bot.alert_system import AlertSystem
 from bot.error_handler import ErrorHandler
 from bot.user_manager import UserManager
 from bot.task_scheduler import TaskScheduler, setup_default_tasks
+from bot.shadow import ShadowRunner
+from bot.clock import create_clock
+from bot.tick_backtester import TickData
 
 logger = setup_logger('Main')
 
@@ -44,6 +49,15 @@ class TradingBotOrchestrator:
         self.health_server = None
         self.tracked_tasks = []
         
+        self.replay_ticks = None
+        clock_start = None
+        if self.config.REPLAY_TICKS_DIR:
+            self.replay_ticks = TickData.load(self.config.REPLAY_TICKS_DIR)
+            if len(self.replay_ticks):
+                clock_start = datetime.fromtimestamp(int(self.replay_ticks.timestamp[0]) / 1e9, tz=pytz.UTC)
+            logger.info(f"Replay mode: {len(self.replay_ticks)} ticks from {self.config.REPLAY_TICKS_DIR}")
+        self.clock = create_clock(self.config, clock_start)
+        
         self.db_manager = DatabaseManager(self.config.DATABASE_PATH)
         logger.info("Database initialized")
         
@@ -59,6 +73,7 @@ class TradingBotOrchestrator:
             self.position_tracker = None
             self.telegram_bot = None
             self.task_scheduler = None
+            self.shadow_runner = None
             logger.info("Limited mode: Only database and health server will be initialized")
             return
         
@@ -70,13 +85,13 @@ class TradingBotOrchestrator:
         self.user_manager = UserManager(self.config)
         logger.info("User manager initialized")
         
-        self.market_data = MarketDataClient(self.config)
+        self.market_data = MarketDataClient(self.config, self.clock)
         logger.info("Market data client initialized")
         
         self.strategy = TradingStrategy(self.config)
         logger.info("Trading strategy initialized")
         
-        self.risk_manager = RiskManager(self.config, self.db_manager)
+        self.risk_manager = RiskManager(self.config, self.db_manager, self.clock)
         logger.info("Risk manager initialized")
         
         self.chart_generator = ChartGenerator(self.config)
@@ -92,10 +107,16 @@ class TradingBotOrchestrator:
             self.alert_system,
             self.user_manager,
             self.chart_generator,
-            self.market_data
+            self.market_data,
+            clock=self.clock
         )
         logger.info("Position tracker initialized")
         
+        self.shadow_runner = None
+        if self.config.SHADOW_MODE_ENABLED:
+            self.shadow_runner = ShadowRunner(self.config, self.db_manager, clock=self.clock)
+            logger.info("Shadow strategy runner initialized")
+        
         self.telegram_bot = TradingBot(
             self.config,
             self.db_manager,
@@ -106,11 +127,13 @@ class TradingBotOrchestrator:
             self.chart_generator,
             self.alert_system,
             self.error_handler,
-            self.user_manager
+            self.user_manager,
+            self.shadow_runner,
+            self.clock
         )
         logger.info("Telegram bot initialized")
         
-        self.task_scheduler = TaskScheduler(self.config)
+        self.task_scheduler = TaskScheduler(self.config, self.clock)
         logger.info("Task scheduler initialized")
         
         logger.info("All components initialized successfully")
@@ -365,21 +388,27 @@ class TradingBotOrchestrator:
             logger.info("Starting health check server...")
             await self.start_health_server()
             
-            logger.info("Connecting to market data feed...")
-            market_task = asyncio.create_task(self.market_data.connect_websocket())
-            self.tracked_tasks.append(market_task)
-            
-            logger.info("Waiting for initial market data...")
-            for i in range(30):
-                await asyncio.sleep(1)
-                if self.market_data.is_connected():
-                    logger.info("Market data connection established")
-                    break
-                if i % 5 == 0:
-                    logger.info(f"Still waiting for market data... ({i}s)")
-            
-            if not self.market_data.is_connected():
-                logger.warning("Market data not connected yet, but continuing startup...")
+            logger.info("Restoring active positions...")
+            self.position_tracker.load_active_positions()
+            
+            if self.replay_ticks is None:
+                logger.info("Connecting to market data feed...")
+                market_task = asyncio.create_task(self.market_data.connect_websocket())
+                self.tracked_tasks.append(market_task)
+            
+                logger.info("Waiting for initial market data...")
+                for i in range(30):
+                    await asyncio.sleep(1)
+                    if self.market_data.is_connected():
+                        logger.info("Market data connection established")
+                        break
+                    if i % 5 == 0:
+                        logger.info(f"Still waiting for market data... ({i}s)")
+            
+                if not self.market_data.is_connected():
+                    logger.warning("Market data not connected yet, but continuing startup...")
+            else:
+                logger.info("Replay mode: recorded ticks start once all components are running")
             
             logger.info("Setting up scheduled tasks...")
             await self.setup_scheduled_tasks()
@@ -393,6 +422,13 @@ class TradingBotOrchestrator:
             )
             self.tracked_tasks.append(position_task)
             
+            if self.shadow_runner:
+                logger.info("Starting shadow strategy runner...")
+                shadow_task = asyncio.create_task(
+                    self.shadow_runner.run(self.market_data, self.telegram_bot.get_shared_indicators)
+                )
+                self.tracked_tasks.append(shadow_task)
+            
             logger.info("Initializing Telegram bot...")
             bot_initialized = await self.telegram_bot.initialize()
             
@@ -442,15 +478,16 @@ class TradingBotOrchestrator:
             bot_task = asyncio.create_task(self.telegram_bot.run())
             self.tracked_tasks.append(bot_task)
             
-            logger.info("Waiting for candles to build (minimal 30 candles)...")
-            for i in range(60):
-                await asyncio.sleep(1)
-                df_check = await self.market_data.get_historical_data('M1', 100)
-                if df_check is not None and len(df_check) >= 30:
-                    logger.info(f"✅ Got {len(df_check)} candles, ready for trading!")
-                    break
-                if i % 10 == 0:
-                    logger.info(f"Building candles... {i}s elapsed")
+            if self.replay_ticks is None:
+                logger.info("Waiting for candles to build (minimal 30 candles)...")
+                for i in range(60):
+                    await asyncio.sleep(1)
+                    df_check = await self.market_data.get_historical_data('M1', 100)
+                    if df_check is not None and len(df_check) >= 30:
+                        logger.info(f"✅ Got {len(df_check)} candles, ready for trading!")
+                        break
+                    if i % 10 == 0:
+                        logger.info(f"Building candles... {i}s elapsed")
             
             if self.telegram_bot.app and self.config.AUTHORIZED_USER_IDS:
                 startup_msg = (
@@ -494,6 +531,11 @@ class TradingBotOrchestrator:
                 else:
                     logger.warning("No valid user IDs found - all IDs are either bots or invalid")
             
+            if self.replay_ticks is not None:
+                logger.info("Starting recorded tick replay...")
+                replay_task = asyncio.create_task(self.market_data.replay_ticks(self.replay_ticks))
+                self.tracked_tasks.append(replay_task)
+            
             logger.info("=" * 60)
             logger.info("BOT IS NOW RUNNING")
             logger.info("=" * 60)
@@ -547,6 +589,10 @@ class TradingBotOrchestrator:
                 except asyncio.TimeoutError:
                     logger.warning("Some tasks did not complete within timeout")
             
+            if self.position_tracker:
+                logger.info("Sending pending exit notifications...")
+                await self.position_tracker.notifications.stop(timeout=5)
+            
             logger.info("Stopping Telegram bot...")
             if self.telegram_bot:
                 try:
@@ -563,6 +609,9 @@ class TradingBotOrchestrator:
                 except Exception as e:
                     logger.error(f"Error stopping position tracker: {e}")
             
+            if self.shadow_runner:
+                self.shadow_runner.stop()
+            
             logger.info("Stopping task scheduler...")
             if self.task_scheduler:
                 try: